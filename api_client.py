@@ -0,0 +1,219 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+# Códigos de respuesta que indican un fallo transitorio del servidor
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Métodos que se pueden repetir sin efectos duplicados
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Respuestas con las que el servidor rechaza la petición sin procesarla: las únicas que se
+# reintentan en un POST, porque un 500/502/504 puede llegar con el trabajo ya creado
+UNPROCESSED_STATUS_CODES = {429, 503}
+
+# Códigos de submit_job cuando no hay respuesta HTTP que devolver
+NOT_SENT = 0     # la petición no salió del cliente: el trabajo no existe
+MAYBE_SENT = -1  # pudo llegar al servidor (timeout de lectura, conexión cortada...): el trabajo puede existir
+
+
+def _sent(error):
+    """Si la petición pudo llegar al servidor antes del error de conexión o del timeout"""
+    if isinstance(error, requests.ConnectTimeout):
+        return False
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return not isinstance(reason, NewConnectionError)
+
+
+class ScraperAPIClient:
+    """Cliente para la API /api/v1/jobs del Google Maps Scraper.
+
+    Mantiene una sesión HTTP con conexiones reutilizables, aplica timeouts de
+    conexión y lectura, y reintenta con backoff exponencial (con jitter) los
+    errores de conexión y las respuestas 429/5xx. Un POST (envío de trabajo)
+    solo se reintenta si no llegó a enviarse o el servidor respondió 429/503,
+    para no crear el mismo trabajo dos veces.
+    """
+
+    def __init__(self, host, connect_timeout=5, read_timeout=30, max_retries=4,
+                 backoff_base=0.5, backoff_max=30, pool_size=10, on_submit_response=None):
+        self.host = host.rstrip('/')
+        self.jobs_url = f"{self.host}/api/v1/jobs"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # on_submit_response(código, latencia) se llama tras cada intento de envío de un trabajo
+        # (código None = error de conexión); las consultas de estado y descargas no cuentan
+        self.on_submit_response = on_submit_response
+
+        # Los reintentos los gestionamos nosotros para poder contarlos
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0
+        }
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Calcula la espera antes del siguiente intento (full jitter)"""
+        if retry_after is not None:
+            try:
+                return max(0.0, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, latency, retried=False, failed=False):
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["total_latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+            if retried:
+                self._stats["retries"] += 1
+            if failed:
+                self._stats["errors"] += 1
+
+    def request(self, method, url, on_response=None, **kwargs):
+        """Realiza una petición con reintentos. Lanza la última excepción si se agotan.
+
+        Si se indica, on_response(código, latencia) se llama tras cada intento.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_status_codes = RETRY_STATUS_CODES if idempotent else UNPROCESSED_STATUS_CODES
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                latency = time.perf_counter() - start_time
+                if on_response:
+                    on_response(None, latency)
+                if attempt >= self.max_retries or (not idempotent and _sent(e)):
+                    self._record(latency, failed=True)
+                    raise
+                self._record(latency, retried=True)
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            latency = time.perf_counter() - start_time
+            if on_response:
+                on_response(response.status_code, latency)
+            if response.status_code in retry_status_codes and attempt < self.max_retries:
+                self._record(latency, retried=True)
+                delay = self._backoff_delay(attempt, response.headers.get('Retry-After'))
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self._record(latency, failed=response.status_code >= 400)
+            return response
+
+    def submit_job(self, payload):
+        """Envía un trabajo a la API. Devuelve (id, código, respuesta).
+
+        Sin respuesta HTTP, el código es NOT_SENT si la petición no llegó a
+        salir y MAYBE_SENT si el servidor pudo recibirla.
+        """
+        try:
+            response = self.request('POST', self.jobs_url, on_response=self.on_submit_response, json=payload)
+            if response.status_code in [200, 201]:
+                result = response.json()
+                return result.get('id'), response.status_code, result
+            else:
+                return None, response.status_code, response.text
+        except Exception as e:
+            return None, MAYBE_SENT if _sent(e) else NOT_SENT, str(e)
+
+    def check_job_status(self, job_id):
+        """Verifica el estado de un trabajo"""
+        try:
+            response = self.request('GET', f"{self.jobs_url}/{job_id}")
+            if response.status_code == 200:
+                return response.json()
+            else:
+                return {"status": "error", "message": f"Error {response.status_code}"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def list_jobs(self):
+        """Devuelve todos los trabajos del servidor, o None si la API no ofrece el listado.
+
+        Un fallo transitorio devuelve una lista vacía para no perder el listado.
+        """
+        try:
+            response = self.request('GET', self.jobs_url)
+            if response.status_code in [404, 405]:
+                return None
+            if response.status_code != 200:
+                return []
+            jobs = response.json()
+        except ValueError:
+            return None
+        except Exception:
+            return []
+        return jobs if isinstance(jobs, list) else None
+
+    def download_results(self, job_id, dest_path, chunk_size=64 * 1024):
+        """Descarga el CSV de resultados de un trabajo a disco, por bloques.
+
+        Escribe primero en un archivo temporal para no dejar descargas a medias.
+        Devuelve el número de bytes escritos; lanza una excepción si falla.
+        """
+        response = self.request('GET', f"{self.jobs_url}/{job_id}/download", stream=True)
+        tmp_path = f"{dest_path}.part"
+        try:
+            with response:
+                response.raise_for_status()
+                written = 0
+                with open(tmp_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            written += len(chunk)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            # Sin el archivo a medias, para que no ocupe disco ni se confunda con una descarga
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return written
+
+    def ping(self):
+        """Comprueba si el servidor responde, con un solo intento y sin descargar la respuesta"""
+        try:
+            response = self.session.get(f"{self.host}/", timeout=self.timeout, stream=True)
+            response.close()
+            return response.status_code < 500
+        except requests.RequestException:
+            return False
+
+    def get_stats(self):
+        """Devuelve una copia de los contadores de latencia y reintentos"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["avg_latency"] = stats["total_latency"] / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,177 @@
+"""Ajuste de depth y max_time de cada trabajo según lo que rindieron los anteriores.
+
+Con los mismos depth y max_time para todo, una categoría densa en una ciudad
+(abogados en Valencia) se queda corta y una escasa en un pueblo gasta tiempo
+sin encontrar nada nuevo. Con el historial del registro (JobLedger.yield_history,
+solo búsquedas del mismo tipo y fast_mode que el plan) se calcula para cada
+categoría y localización:
+
+- el rendimiento: lugares nuevos (según el índice de duplicados) por minuto
+  de trabajo en la API, y segundos por keyword (medianas de los últimos
+  trabajos con el depth actual);
+- si los trabajos se cortaron por max_time (duraron al menos el 90 %);
+- si están saturados por depth: sus filas por keyword llegan al techo que ese
+  depth permite, estimado como el percentil 90 de todos los trabajos con ese
+  depth. Si están cerca del techo, más depth daría más lugares.
+
+Con eso, un par saturado dobla su depth, uno que no llega ni a un tercio del
+techo lo reduce, y el max_time de cada trabajo se calcula con los segundos por
+keyword del par (escalados al nuevo depth) para no pagar minutos de más. Los
+pares sin historial usan los ajustes de su categoría en otras localizaciones
+y, si tampoco hay, los parámetros del plan.
+
+Si el par ya se buscó con otro depth, se compara: si el depth mayor no dio más
+lugares nuevos por minuto que el menor, se vuelve al menor (o no se sube).
+"""
+import math
+import statistics
+
+from keyword_batcher import DEFAULT_FILL, job_keyword_categories
+
+DEPTH_LIMITS = (2, 50)
+MAX_TIME_LIMITS = (3, 60)  # minutos
+
+# Trabajos con resultados necesarios para ajustar un par y para estimar el techo de un depth
+MIN_JOBS = 1
+MIN_CEILING_JOBS = 5
+
+# Parte de max_time a partir de la cual un trabajo se considera cortado
+TIME_SATURATION = 0.9
+# Parte del techo de su depth a partir de la cual un par se considera saturado
+DEPTH_SATURATION = 0.9
+# Parte del techo que se busca al reducir depth
+TARGET_FILL = 0.7
+
+# Clave de los ajustes por categoría (en cualquier localización)
+ANY_LOCATION = "*"
+
+
+def _rows_per_keyword(row):
+    return row['result_rows'] / row['keyword_count']
+
+
+def _seconds_per_keyword(row):
+    return row['duration'] / row['keyword_count']
+
+
+def _new_places_per_minute(row):
+    return row['new_places'] / row['duration'] * 60
+
+
+def depth_ceilings(history):
+    """{depth: filas por keyword que ese depth permite como mucho (percentil 90)}"""
+    by_depth = {}
+    for row in history:
+        by_depth.setdefault(row['depth'], []).append(_rows_per_keyword(row))
+    ceilings = {}
+    for depth, values in by_depth.items():
+        if len(values) >= MIN_CEILING_JOBS:
+            values.sort()
+            ceilings[depth] = values[min(len(values) - 1, int(len(values) * 0.9))]
+    return ceilings
+
+
+def _recommend_group(rows, ceilings, depth_limits):
+    by_depth = {}
+    for row in rows:
+        by_depth.setdefault(row['depth'], []).append(_new_places_per_minute(row))
+    yields = {depth: statistics.median(values) for depth, values in by_depth.items()}
+    depth = rows[0]['depth']  # el más reciente
+    rows = [row for row in rows if row['depth'] == depth]
+    if len(rows) < MIN_JOBS:
+        return None
+    lower = max((d for d in yields if d < depth), default=None)
+    higher = min((d for d in yields if d > depth), default=None)
+    rows_per_keyword = statistics.median(_rows_per_keyword(row) for row in rows)
+    places_per_minute = yields[depth]
+    seconds_per_keyword = statistics.median(_seconds_per_keyword(row) for row in rows)
+    cut = sum(1 for row in rows if row['max_time'] and row['duration'] >= TIME_SATURATION * row['max_time'] * 60)
+    ceiling = ceilings.get(depth)
+
+    new_depth, reason = depth, "sin cambios"
+    if lower is not None and places_per_minute < yields[lower]:
+        new_depth, reason = lower, f"depth {depth} no dio más lugares nuevos por minuto"
+    elif cut * 2 >= len(rows):
+        # Cortados por tiempo: la duración observada se queda corta y más depth no llegaría a usarse
+        seconds_per_keyword *= 1.5
+        reason = "cortado por max_time"
+    elif ceiling and rows_per_keyword >= DEPTH_SATURATION * ceiling:
+        if higher is not None and yields[higher] <= places_per_minute:
+            reason = f"saturado, pero depth {higher} no dio más lugares nuevos por minuto"
+        else:
+            new_depth, reason = min(depth_limits[1], depth * 2), "saturado"
+    elif ceiling and rows_per_keyword < TARGET_FILL / 2 * ceiling:
+        new_depth = max(depth_limits[0], math.ceil(depth * rows_per_keyword / (TARGET_FILL * ceiling)))
+        reason = "escaso"
+    # El tiempo de cada búsqueda crece con el número de desplazamientos (depth)
+    seconds_per_keyword *= new_depth / depth
+    return {
+        "depth": new_depth,
+        "seconds_per_keyword": seconds_per_keyword,
+        "rows_per_keyword": rows_per_keyword,
+        "places_per_minute": places_per_minute,
+        "reason": reason,
+        "jobs": len(rows),
+    }
+
+
+def recommend(history, depth_limits=DEPTH_LIMITS):
+    """{(categoría, localización): ajuste} con depth y segundos por keyword recomendados.
+
+    Incluye (categoría, ANY_LOCATION) con los trabajos de la categoría en
+    todas las localizaciones. history va del trabajo más reciente al más antiguo.
+    """
+    ceilings = depth_ceilings(history)
+    groups = {}
+    for row in history:
+        if "+" in row['category']:
+            continue  # trabajos que agrupan varias categorías
+        groups.setdefault((row['category'], row['location']), []).append(row)
+        groups.setdefault((row['category'], ANY_LOCATION), []).append(row)
+    tuning = {}
+    for key, rows in groups.items():
+        values = _recommend_group(rows, ceilings, depth_limits)
+        if values is not None:
+            tuning[key] = values
+    return tuning
+
+
+def tune_jobs(jobs, tuning, time_limits=MAX_TIME_LIMITS, fill=DEFAULT_FILL, log=print):
+    """Aplica los ajustes al payload de cada trabajo. Devuelve la lista nueva"""
+    tuned = []
+    changed = 0
+    for job in jobs:
+        keyword_categories = job_keyword_categories(job)
+        values = {}
+        for category in set(keyword_categories.values()):
+            values[category] = (tuning.get((category, job['location']))
+                                or tuning.get((category, ANY_LOCATION)))
+        if not values or None in values.values():
+            tuned.append(job)
+            continue
+        depth = max(value['depth'] for value in values.values())
+        seconds = sum(values[category]['seconds_per_keyword'] for category in keyword_categories.values())
+        max_time = min(time_limits[1], max(time_limits[0], math.ceil(seconds / 60 / fill)))
+        payload = dict(job['payload'], depth=depth, max_time=max_time)
+        if payload != job['payload']:
+            changed += 1
+        tuned.append(dict(job, payload=payload))
+
+    depths = sorted({job['payload'].get('depth') for job in tuned if job['payload'].get('depth') is not None})
+    times = sorted({job['payload'].get('max_time') for job in tuned if job['payload'].get('max_time') is not None})
+    log(f"Ajuste automático: {changed} de {len(jobs)} trabajos cambian de depth o max_time"
+        + (f" (depth {depths[0]}-{depths[-1]}, max_time {times[0]}-{times[-1]} min)" if depths and times else ""))
+    return tuned
+
+
+def format_tuning(tuning, limit=20):
+    """Resumen de los ajustes por par, los que más cambian primero"""
+    pairs = [(key, value) for key, value in tuning.items() if key[1] != ANY_LOCATION]
+    pairs.sort(key=lambda item: item[1]['reason'] == "sin cambios")
+    lines = []
+    for (category, location), value in pairs[:limit]:
+        observed = (f", {value['rows_per_keyword']:.1f} filas/keyword y ~{value['places_per_minute']:.1f} "
+                    f"lugares nuevos/min hasta ahora" if value.get('places_per_minute') is not None else "")
+        lines.append(f"  {category} en {location}: depth {value['depth']} ({value['reason']}), "
+                     f"{value['seconds_per_keyword']:.1f} s/keyword{observed}")
+    return "\n".join(lines)
@@ -0,0 +1,201 @@
+"""Reparto de trabajos entre varias instancias de la API del scraper.
+
+Cada host es una instancia de google-maps-scraper (en otra máquina o detrás
+de otro proxy). El grupo comprueba periódicamente qué hosts responden, elige
+el host de cada trabajo según su carga (o por turnos ponderados) y, si un
+envío no llegó a procesarse (no salió del cliente o el servidor respondió
+429/503), lo reintenta en otro host. Cada trabajo enviado guarda su host
+para que el seguimiento y las descargas vayan al servidor correcto.
+"""
+import threading
+
+from api_client import MAYBE_SENT, NOT_SENT, RETRY_STATUS_CODES, UNPROCESSED_STATUS_CODES, ScraperAPIClient
+
+# Estrategias de reparto
+PLACEMENTS = ("least-loaded", "round-robin")
+
+
+def parse_hosts(hosts):
+    """'http://a:8080, http://b:8080*2' -> [('http://a:8080', 1), ('http://b:8080', 2)]
+
+    Acepta una cadena separada por comas o una lista. El sufijo '*N' da peso N al host.
+    """
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+    result = []
+    for item in hosts:
+        item = item.strip()
+        if not item:
+            continue
+        host, _, weight = item.partition('*')
+        try:
+            weight = int(weight) if weight else 1
+        except ValueError:
+            raise ValueError(f"Peso no válido en el host '{item}'")
+        if weight < 1:
+            raise ValueError(f"El peso del host '{host}' debe ser mayor que 0")
+        result.append((host.strip().rstrip('/'), weight))
+    if not result:
+        raise ValueError("Hay que indicar al menos un host de la API")
+    return result
+
+
+class Backend:
+    """Una instancia de la API con su cliente y su carga actual"""
+
+    def __init__(self, host, weight, client):
+        self.host = host
+        self.weight = weight
+        self.client = client
+        self.healthy = True
+        self.failures = 0
+        self.active = 0    # trabajos asignados que aún no han terminado
+        self.assigned = 0  # trabajos asignados en total
+        self._current = 0  # turno ponderado suave
+
+
+class BackendPool:
+    """Grupo de hosts de la API con comprobación de salud y reparto de trabajos"""
+
+    def __init__(self, hosts, placement="least-loaded", pool_size=10, on_submit_response=None,
+                 max_failures=2, log=print):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Reparto no válido: {placement}")
+        self.placement = placement
+        self.max_failures = max_failures
+        self.log = log
+        self.backends = [Backend(host, weight, ScraperAPIClient(host, pool_size=pool_size,
+                                                                on_submit_response=on_submit_response))
+                         for host, weight in parse_hosts(hosts)]
+        self._by_host = {backend.host: backend for backend in self.backends}
+        self._died = []  # hosts que han dejado de responder desde la última comprobación
+        self._lock = threading.Lock()
+
+    @property
+    def hosts(self):
+        return [backend.host for backend in self.backends]
+
+    def _mark_failed(self, backend):
+        """Cuenta un fallo del host y, al llegar a max_failures, lo da por caído (con el lock tomado)"""
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.max_failures:
+            backend.healthy = False
+            self._died.append(backend)
+
+    def check_health(self):
+        """Comprueba todos los hosts. Devuelve los que han dejado de responder desde la última vez.
+
+        Incluye los que se dieron por caídos al fallar los envíos, aunque
+        ahora respondan: sus trabajos pueden no terminar nunca.
+        """
+        for backend in self.backends:
+            alive = backend.client.ping()
+            with self._lock:
+                if alive:
+                    if backend in self._died:
+                        continue  # caído por los envíos: se vuelve a probar en la siguiente comprobación
+                    if not backend.healthy:
+                        self.log(f"El host {backend.host} vuelve a responder")
+                    backend.healthy = True
+                    backend.failures = 0
+                    continue
+                self._mark_failed(backend)
+        with self._lock:
+            died, self._died = self._died, []
+        for backend in died:
+            self.log(f"El host {backend.host} no responde o falla al enviar; "
+                     "sus trabajos se repartirán entre los demás")
+        return died
+
+    def _choose(self, exclude=()):
+        candidates = [b for b in self.backends if b.healthy and b not in exclude]
+        if not candidates:
+            # Sin hosts sanos se prueba con los demás antes de rendirse
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        if self.placement == "round-robin":
+            # Turno ponderado suave (el de nginx): reparte según el peso sin ráfagas
+            total = sum(b.weight for b in candidates)
+            for b in candidates:
+                b._current += b.weight
+            chosen = max(candidates, key=lambda b: b._current)
+            chosen._current -= total
+            return chosen
+        return min(candidates, key=lambda b: (b.active / b.weight, b.assigned / b.weight))
+
+    def submit(self, payload, exclude_hosts=()):
+        """Envía el trabajo a un host; si no llegó a procesarse, lo intenta en otro.
+
+        Un 500/502/504 o un envío sin respuesta pueden llegar con el trabajo ya
+        creado, así que no se reenvían para no duplicarlo. Devuelve (id,
+        código, respuesta, host).
+        """
+        tried = [self._by_host[host] for host in exclude_hosts if host in self._by_host]
+        job_id, status_code, result, host = None, NOT_SENT, "No hay hosts disponibles", None
+        while True:
+            with self._lock:
+                backend = self._choose(tried)
+                if backend is None:
+                    return job_id, status_code, result, host
+                # Se cuenta antes de enviar para que los envíos simultáneos se repartan
+                backend.active += 1
+                backend.assigned += 1
+            job_id, status_code, result = backend.client.submit_job(payload)
+            host = backend.host
+            if job_id:
+                return job_id, status_code, result, host
+
+            with self._lock:
+                backend.active -= 1
+                backend.assigned -= 1
+                # Un 429 es el servidor pidiendo calma, no un host caído
+                if status_code in (NOT_SENT, MAYBE_SENT) or (status_code in RETRY_STATUS_CODES
+                                                             and status_code != 429):
+                    self._mark_failed(backend)
+            # Un error del propio trabajo (4xx) no se arregla cambiando de host
+            if status_code != NOT_SENT and status_code not in UNPROCESSED_STATUS_CODES:
+                return job_id, status_code, result, host
+            tried.append(backend)
+
+    def client_for(self, info):
+        """Cliente del host que tiene el trabajo (el primero si no consta)"""
+        backend = self._by_host.get(info.get('host')) or self.backends[0]
+        return backend.client
+
+    def add_active(self, infos):
+        """Cuenta trabajos que ya estaban en los servidores (por ejemplo, al reanudar)"""
+        with self._lock:
+            for info in infos:
+                backend = self._by_host.get(info.get('host')) or self.backends[0]
+                backend.active += 1
+
+    def job_finished(self, info):
+        with self._lock:
+            backend = self._by_host.get(info.get('host')) or self.backends[0]
+            backend.active = max(0, backend.active - 1)
+
+    def get_stats(self):
+        """Suma los contadores de los clientes de todos los hosts"""
+        totals = {"requests": 0, "retries": 0, "errors": 0, "total_latency": 0.0, "max_latency": 0.0}
+        for backend in self.backends:
+            stats = backend.client.get_stats()
+            for key in ("requests", "retries", "errors", "total_latency"):
+                totals[key] += stats[key]
+            totals["max_latency"] = max(totals["max_latency"], stats["max_latency"])
+        totals["avg_latency"] = totals["total_latency"] / totals["requests"] if totals["requests"] else 0.0
+        return totals
+
+    def describe(self):
+        return ", ".join(f"{b.host}: {b.assigned} trabajos{'' if b.healthy else ' (caído)'}"
+                         for b in self.backends)
+
+    def close(self):
+        for backend in self.backends:
+            backend.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,204 @@
+"""Mide el envío, el seguimiento y la descarga de trabajos contra la API simulada.
+
+Para cada tamaño de plan arranca mock_server.py en otro proceso, envía los
+trabajos con JobPipeline (con registro, índice de duplicados y descargas,
+como una ejecución normal) y anota:
+
+- envío: trabajos por segundo y latencia media de cada envío;
+- seguimiento: consultas de estado y su duración media;
+- descarga: MB y filas descargados y su ritmo;
+- memoria: pico de tracemalloc durante la ejecución.
+
+Ejemplos:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 10 100 10000 --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 100 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_client import ScraperAPIClient  # noqa: E402
+from job_ledger import JobLedger  # noqa: E402
+from metrics import default_metrics  # noqa: E402
+from scraper_core import JobPipeline, build_payload  # noqa: E402
+
+DEFAULT_SIZES = (10, 100, 10000)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(args):
+    """Arranca la API simulada en otro proceso y espera a que responda. Devuelve (proceso, url)"""
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, "mock_server.py"), "--port", str(port),
+               "--workers", str(args.server_workers), "--job-seconds", str(args.job_seconds),
+               "--keyword-seconds", "0", "--rows-per-keyword", str(args.rows_per_keyword),
+               "--latency", str(args.latency), "--error-rate", str(args.error_rate), "--seed", "1"]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    with ScraperAPIClient(url) as client:
+        for _ in range(100):
+            if client.ping():
+                return process, url
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("La API simulada no arrancó")
+
+
+def synthetic_jobs(count, keywords_per_job, radius=10000, depth=10, max_time=15):
+    """Plan de trabajos sin leer el catálogo: 20 categorías por localización"""
+    jobs = []
+    for i in range(count):
+        category, location = f"cat{i % 20}", f"loc{i // 20}"
+        location_data = {"lat": 38.0 + (i // 20) * 0.01, "lon": -0.5 + (i % 20) * 0.01, "zoom": 13}
+        name = f"bench_{category}_{location}"
+        keywords = [f"{category} keyword {k}" for k in range(keywords_per_job)]
+        jobs.append({
+            "name": name,
+            "category": category,
+            "location": location,
+            "payload": build_payload(name, keywords, location_data, radius, depth, max_time),
+        })
+    return jobs
+
+
+def _histogram(data, name):
+    found = [h for h in data['histograms'] if h['name'] == name]
+    count = sum(h['count'] for h in found)
+    total = sum(h['sum'] for h in found)
+    return count, total
+
+
+def _counter(data, name):
+    return sum(c['value'] for c in data['counters'] if c['name'] == name)
+
+
+def run_size(size, args, url):
+    """Ejecuta un plan de 'size' trabajos y devuelve sus medidas"""
+    metrics = default_metrics()
+    metrics.reset(f"bench_{size}")
+    jobs = synthetic_jobs(size, args.keywords_per_job)
+    log = print if args.verbose else (lambda message: None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = JobLedger(os.path.join(tmp, "ledger.sqlite3"))
+        if args.memory:
+            tracemalloc.start()
+        try:
+            pipeline = JobPipeline(url, args.max_in_flight, wait_time=args.wait_time, log=log,
+                                   ledger=ledger, download_dir=os.path.join(tmp, "results"),
+                                   download_workers=args.download_workers,
+                                   dedup_index_path=os.path.join(tmp, "index.sqlite3"))
+            start = time.perf_counter()
+            jobs_info = pipeline.submit(jobs)
+            submitted = time.perf_counter()
+            tracker = pipeline.track(jobs_info)
+            finished = time.perf_counter()
+            peak = tracemalloc.get_traced_memory()[1] if args.memory else None
+        finally:
+            if args.memory:
+                tracemalloc.stop()
+            ledger.close()
+
+    data = metrics.to_dict()
+    submits, submit_time = _histogram(data, "submit_seconds")
+    polls, poll_time = _histogram(data, "status_poll_seconds")
+    downloads, download_time = _histogram(data, "download_seconds")
+    merges, merge_time = _histogram(data, "merge_seconds")
+    download_mb = _counter(data, "download_bytes_total") / 1024 / 1024
+    rows = _counter(data, "result_rows_total")
+    submit_seconds = submitted - start
+    return {
+        "jobs": size,
+        "ok": tracker.summary().get("ok", 0),
+        "submit_seconds": submit_seconds,
+        "submit_jobs_per_second": size / submit_seconds if submit_seconds else None,
+        "submit_latency_avg": submit_time / submits if submits else None,
+        "polls": polls,
+        "poll_avg": poll_time / polls if polls else None,
+        "track_seconds": finished - submitted,
+        "downloads": downloads,
+        "download_mb": download_mb,
+        # Ritmo de cada descarga y de la unión en el consolidado (sin contar esperas)
+        "download_mb_per_second": download_mb / download_time if download_time else None,
+        "merge_rows_per_second": rows / merge_time if merge_time else None,
+        "total_seconds": finished - start,
+        "peak_memory_mb": peak / 1024 / 1024 if peak is not None else None,
+    }
+
+
+def format_table(results):
+    columns = [("jobs", "trabajos", "{:d}"), ("ok", "ok", "{:d}"),
+               ("submit_jobs_per_second", "envíos/s", "{:.1f}"), ("submit_latency_avg", "envío ms", "{:.1f}", 1000),
+               ("polls", "consultas", "{:d}"), ("poll_avg", "consulta ms", "{:.1f}", 1000),
+               ("download_mb_per_second", "MB/s desc.", "{:.1f}"), ("merge_rows_per_second", "filas/s", "{:.0f}"),
+               ("total_seconds", "total s", "{:.1f}"), ("peak_memory_mb", "pico MB", "{:.1f}")]
+    widths = [max(len(title), 6) for _, title, *_ in columns]
+    header = " | ".join(title.rjust(width) for (_, title, *_), width in zip(columns, widths))
+    lines = [header, "-" * len(header)]
+    for result in results:
+        cells = []
+        for (key, title, fmt, *scale), width in zip(columns, widths):
+            value = result[key]
+            cell = "-" if value is None else fmt.format(value * scale[0] if scale else value)
+            cells.append(cell.rjust(width))
+        lines.append(" | ".join(cells))
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark del envío, seguimiento y descarga de trabajos")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help="Tamaños de plan (número de trabajos)")
+    parser.add_argument('--keywords-per-job', type=int, default=5)
+    parser.add_argument('--rows-per-keyword', type=int, default=20, help="Filas del CSV por keyword")
+    parser.add_argument('--max-in-flight', type=int, default=4, help="Envíos simultáneos")
+    parser.add_argument('--download-workers', type=int, default=4, help="Descargas simultáneas")
+    parser.add_argument('--wait-time', type=int, default=60, help="Tiempo máximo de seguimiento (minutos)")
+    parser.add_argument('--server-workers', type=int, default=64, help="Trabajos simultáneos en la API simulada")
+    parser.add_argument('--job-seconds', type=float, default=0.2, help="Duración de cada trabajo simulado")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latencia de cada petición a la API simulada")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Parte de peticiones que responden 503")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="No mide la memoria (tracemalloc ralentiza la ejecución)")
+    parser.add_argument('--output', default=None, help="Guarda los resultados en un archivo JSON")
+    parser.add_argument('--verbose', action='store_true', help="Muestra el log del proceso")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = []
+    for size in args.sizes:
+        # Un servidor nuevo por tamaño para que el listado de trabajos no arrastre los anteriores
+        process, url = start_mock_server(args)
+        try:
+            print(f"Ejecutando {size} trabajos contra {url}...", flush=True)
+            results.append(run_size(size, args, url))
+        finally:
+            process.terminate()
+            process.wait()
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"settings": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
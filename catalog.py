@@ -0,0 +1,349 @@
+"""Catálogo en memoria de los archivos de keywords y de localizaciones.
+
+Los archivos se leen una sola vez y se guardan ya interpretados. Solo se
+vuelven a leer si cambia su fecha de modificación, y el listado de cada
+carpeta solo se repite si cambia la fecha de la carpeta. Además mantiene
+índices por nombre y de keyword -> categorías.
+
+Las localizaciones de los archivos y las importadas en bloque (ver
+location_index.py) se reúnen en un LocationIndex con índice espacial.
+"""
+import os
+import re
+import threading
+import time
+
+from coverage_planner import DEFAULT_ZOOM
+from keyword_planner import normalize_keyword
+from location_index import (IMPORTED_LOCATIONS_FILE, ZOOM_LIMITS, LocationIndex, append_to_store, plan_import,
+                            read_import_file, read_location_store)
+from metrics import default_metrics
+
+KEYWORDS_DIR = 'keywords'
+LOCATIONS_DIR = 'location'
+
+# '8_keywords_fontaneria.txt', '4_location_denia' (la extensión es opcional)
+_FILENAME_RE = re.compile(r'^(\d+)_(keywords|location)_(.+?)(\.[^.]*)?$')
+
+
+def parse_filename(filename):
+    """Devuelve (prefijo, tipo, nombre) o None si el archivo no sigue el formato"""
+    match = _FILENAME_RE.match(filename)
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2), match.group(3)
+
+
+def parse_zoom(text):
+    """Zoom entero para la API; admite decimales ('13.5' -> 14)"""
+    return int(float(text) + 0.5)
+
+
+def parse_location_lines(lines):
+    """Interpreta las líneas de un archivo de localización: zoom, latitud y longitud.
+
+    Ignora las líneas vacías y lanza ValueError si faltan datos, no son
+    números o están fuera de rango.
+    """
+    values = [line.strip() for line in lines if line.strip()]
+    if len(values) < 3:
+        raise ValueError("se esperaban zoom, latitud y longitud")
+    zoom = parse_zoom(values[0])
+    if not ZOOM_LIMITS[0] <= zoom <= ZOOM_LIMITS[1]:
+        raise ValueError(f"zoom fuera de rango ({ZOOM_LIMITS[0]}-{ZOOM_LIMITS[1]})")
+    lat, lon = values[1], values[2]
+    if not -90 <= float(lat) <= 90 or not -180 <= float(lon) <= 180:
+        raise ValueError("coordenadas fuera de rango")
+    return {'zoom': zoom, 'lat': lat, 'lon': lon}
+
+
+class CatalogEntry:
+    """Archivo del catálogo con su contenido ya interpretado"""
+
+    def __init__(self, filename, prefix, name, mtime, data):
+        self.filename = filename
+        self.prefix = prefix
+        self.name = name
+        self.mtime = mtime
+        self.data = data
+
+
+class _Folder:
+    """Archivos de una carpeta de un tipo, con caché por fecha de modificación"""
+
+    def __init__(self, path, kind, parse):
+        self.path = path
+        self.kind = kind
+        self.parse = parse
+        self.entries = []
+        self.by_filename = {}
+        self.by_name = {}
+        self.errors = {}
+        self._dir_mtime = None
+        self._files = []
+
+    def refresh(self):
+        """Relee lo que haya cambiado. Devuelve True si cambió algo"""
+        try:
+            dir_mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            changed = bool(self.entries)
+            self.entries, self.by_filename, self.by_name, self._files = [], {}, {}, []
+            self._dir_mtime = None
+            return changed
+
+        if dir_mtime != self._dir_mtime:
+            files = []
+            for filename in os.listdir(self.path):
+                parsed = parse_filename(filename)
+                if parsed and parsed[1] == self.kind and os.path.isfile(os.path.join(self.path, filename)):
+                    files.append((parsed[0], parsed[2], filename))
+            files.sort()
+            self._files = files
+            self._dir_mtime = dir_mtime
+
+        changed = False
+        entries = []
+        for prefix, name, filename in self._files:
+            file_path = os.path.join(self.path, filename)
+            try:
+                mtime = os.stat(file_path).st_mtime_ns
+            except FileNotFoundError:
+                changed = True
+                continue
+            entry = self.by_filename.get(filename)
+            if entry is None or entry.mtime != mtime:
+                # Un archivo erróneo no se vuelve a leer hasta que cambie
+                if filename in self.errors and self.errors[filename][0] == mtime:
+                    continue
+                changed = True
+                try:
+                    with default_metrics().timer("catalog_read_seconds", kind=self.kind):
+                        with open(file_path, 'r', encoding='utf-8') as f:
+                            data = self.parse(f.readlines())
+                except (OSError, UnicodeDecodeError, ValueError) as e:
+                    self.errors[filename] = (mtime, str(e))
+                    continue
+                self.errors.pop(filename, None)
+                entry = CatalogEntry(filename, prefix, name, mtime, data)
+            entries.append(entry)
+
+        if changed or len(entries) != len(self.entries):
+            self.entries = entries
+            self.by_filename = {entry.filename: entry for entry in entries}
+            self.by_name = {}
+            for entry in entries:
+                self.by_name.setdefault(entry.name, entry)
+            return True
+        return False
+
+
+class _LocationStore:
+    """Almacén de localizaciones importadas (un CSV), releído solo si cambia"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = []
+        self.error = None
+        self._mtime = None
+
+    def refresh(self):
+        """Relee el archivo si cambió. Devuelve True si cambió algo"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            changed = bool(self.rows) or self._mtime is not None
+            self.rows, self.error, self._mtime = [], None, None
+            return changed
+        if mtime == self._mtime:
+            return False
+        try:
+            with default_metrics().timer("catalog_read_seconds", kind="location_store"):
+                rows, invalid = read_location_store(self.path)
+        except (OSError, UnicodeDecodeError) as e:
+            rows, invalid = [], 0
+            self.error = str(e)
+        else:
+            self.error = f"{invalid} filas no válidas" if invalid else None
+        self.rows = rows
+        self._mtime = mtime
+        return True
+
+
+class Catalog:
+    """Categorías de keywords y localizaciones, cargadas una vez y cacheadas.
+
+    Las consultas comprueban cambios en disco como mucho cada check_interval
+    segundos; refresh() fuerza la comprobación (por ejemplo, tras crear un archivo).
+    """
+
+    def __init__(self, keywords_dir=KEYWORDS_DIR, locations_dir=LOCATIONS_DIR, check_interval=2.0):
+        self.check_interval = check_interval
+        self._keywords = _Folder(keywords_dir, 'keywords',
+                                 lambda lines: [line.strip() for line in lines if line.strip()])
+        self._locations = _Folder(locations_dir, 'location', parse_location_lines)
+        self._store = _LocationStore(os.path.join(locations_dir, IMPORTED_LOCATIONS_FILE))
+        self._location_index = LocationIndex()
+        self._keyword_index = {}
+        self._lock = threading.RLock()
+        self._last_check = None
+
+    def refresh(self):
+        with self._lock:
+            if self._keywords.refresh():
+                self._rebuild_keyword_index()
+            # Las dos fuentes se comprueban siempre
+            files_changed = self._locations.refresh()
+            if self._store.refresh() or files_changed:
+                self._rebuild_location_index()
+            self._last_check = time.monotonic()
+
+    def _maybe_refresh(self):
+        if self._last_check is None or time.monotonic() - self._last_check >= self.check_interval:
+            self.refresh()
+
+    def _rebuild_location_index(self):
+        # Se crea uno nuevo en lugar de modificar el actual, que puede estar en uso en otro hilo
+        locations = [(entry.prefix, entry.name, entry.filename, entry.data['zoom'], float(entry.data['lat']),
+                      float(entry.data['lon'])) for entry in self._locations.entries]
+        locations += [(prefix, name, f"{prefix}_location_{name}", zoom, lat, lon)
+                      for prefix, name, zoom, lat, lon in self._store.rows]
+        locations.sort(key=lambda location: location[:2])
+        index = LocationIndex()
+        for _, name, key, zoom, lat, lon in locations:
+            index.add(key, name, zoom, lat, lon)
+        self._location_index = index
+
+    def _rebuild_keyword_index(self):
+        index = {}
+        for entry in self._keywords.entries:
+            for keyword in entry.data:
+                categories = index.setdefault(normalize_keyword(keyword), [])
+                if entry.name not in categories:
+                    categories.append(entry.name)
+        self._keyword_index = index
+
+    # Categorías
+    def categories(self):
+        with self._lock:
+            self._maybe_refresh()
+            return list(self._keywords.entries)
+
+    def category(self, key):
+        """Busca una categoría por nombre de archivo o por nombre"""
+        with self._lock:
+            self._maybe_refresh()
+            return self._keywords.by_filename.get(key) or self._keywords.by_name.get(key)
+
+    def keywords(self, key):
+        entry = self.category(key)
+        if entry is None:
+            raise FileNotFoundError(f"No existe la categoría '{key}'")
+        return list(entry.data)
+
+    def next_category_prefix(self):
+        """Prefijo numérico para una categoría nueva: el mayor que existe + 1"""
+        with self._lock:
+            self.refresh()
+            return max((prefix for prefix, _, _ in self._keywords._files), default=0) + 1
+
+    def categories_for_keyword(self, keyword):
+        """Categorías que contienen la keyword (sin distinguir mayúsculas)"""
+        with self._lock:
+            self._maybe_refresh()
+            return list(self._keyword_index.get(normalize_keyword(keyword), []))
+
+    def search_keywords(self, text, limit=None):
+        """Keywords (normalizadas) que contienen el texto, con sus categorías"""
+        needle = normalize_keyword(text)
+        with self._lock:
+            self._maybe_refresh()
+            matches = [(keyword, list(categories)) for keyword, categories in self._keyword_index.items()
+                       if needle in keyword]
+        return matches[:limit] if limit else matches
+
+    # Localizaciones
+    def locations(self):
+        with self._lock:
+            self._maybe_refresh()
+            return list(self._locations.entries)
+
+    def location(self, key):
+        """Busca una localización por nombre de archivo o por nombre"""
+        with self._lock:
+            self._maybe_refresh()
+            return self._locations.by_filename.get(key) or self._locations.by_name.get(key)
+
+    def location_keys(self):
+        """Claves de todas las localizaciones (archivos e importadas) por prefijo numérico"""
+        with self._lock:
+            self._maybe_refresh()
+            return list(self._location_index.keys)
+
+    def location_index(self):
+        """Índice espacial de todas las localizaciones (no cambia; tras una importación hay uno nuevo)"""
+        with self._lock:
+            self._maybe_refresh()
+            return self._location_index
+
+    def location_data(self, key):
+        """Datos de una localización (archivo o importada) por clave o por nombre"""
+        index = self.location_index()
+        i = index.find(key)
+        if i is None:
+            raise FileNotFoundError(f"No existe la localización '{key}'")
+        return index.data(i)
+
+    def next_location_prefix(self):
+        """Prefijo numérico para una localización nueva: el mayor que existe + 1.
+
+        Cuenta también los archivos con errores y las importadas, para que un
+        prefijo no se repita aunque se hayan borrado archivos.
+        """
+        with self._lock:
+            self.refresh()
+            prefixes = [prefix for prefix, _, _ in self._locations._files]
+            prefixes += [row[0] for row in self._store.rows]
+            return max(prefixes, default=0) + 1
+
+    def import_locations(self, path, zoom=DEFAULT_ZOOM, name_field=None):
+        """Importa municipios de un CSV o un GeoJSON al almacén de importadas.
+
+        Devuelve (añadidas, omitidas por existir ya, no válidas).
+        """
+        places, invalid = read_import_file(path, name_field)
+        with self._lock:
+            # Se planifica sobre una copia para no tocar el índice en uso
+            next_prefix = self.next_location_prefix()
+            index = LocationIndex()
+            current = self._location_index
+            for i in range(len(current)):
+                index.add(current.keys[i], current.names[i], current.zooms[i], current.lats[i], current.lons[i])
+            rows, skipped = plan_import(places, index, next_prefix, zoom)
+            if rows:
+                os.makedirs(os.path.dirname(self._store.path) or ".", exist_ok=True)
+                append_to_store(self._store.path, rows)
+                self.refresh()
+        return len(rows), skipped, invalid
+
+    def errors(self):
+        """Archivos que no se pudieron interpretar: {archivo: motivo}"""
+        with self._lock:
+            self._maybe_refresh()
+            errors = {**self._keywords.errors, **self._locations.errors}
+            if self._store.error:
+                errors[IMPORTED_LOCATIONS_FILE] = (None, self._store.error)
+        return {filename: message for filename, (_, message) in errors.items()}
+
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+
+def default_catalog():
+    """Catálogo compartido de las carpetas keywords/ y location/"""
+    global _default_catalog
+    with _default_lock:
+        if _default_catalog is None:
+            _default_catalog = Catalog()
+        return _default_catalog
@@ -0,0 +1,241 @@
+"""Planificación de la cobertura geográfica con celdas hexagonales.
+
+Cada localización es un centro con un radio global, así que los círculos de
+pueblos vecinos se solapan (la misma zona se busca dos veces) y entre ellos
+quedan huecos sin cubrir. Este módulo divide la zona (un rectángulo de
+coordenadas o la unión de los círculos de varios centros) en una rejilla
+hexagonal: el círculo circunscrito a cada hexágono es la consulta, lo que da
+la cobertura completa con el menor solape posible entre círculos iguales.
+Después un recubrimiento voraz elige, entre esas celdas y los centros
+originales, las que cubren la zona con menos consultas.
+"""
+import heapq
+import math
+
+# Kilómetros por grado de latitud (aproximación esférica)
+KM_PER_DEG_LAT = 111.32
+
+DEFAULT_ZOOM = 13
+
+
+class _Projection:
+    """Proyección equirectangular local en kilómetros alrededor de una latitud"""
+
+    def __init__(self, lat0):
+        self.km_per_deg_lon = KM_PER_DEG_LAT * math.cos(math.radians(lat0))
+
+    def to_xy(self, lat, lon):
+        return lon * self.km_per_deg_lon, lat * KM_PER_DEG_LAT
+
+    def to_latlon(self, x, y):
+        return y / KM_PER_DEG_LAT, x / self.km_per_deg_lon
+
+
+class Region:
+    """Zona a cubrir: un rectángulo (min_lat, min_lon, max_lat, max_lon) o la unión de círculos"""
+
+    def __init__(self, bbox=None, centres=None, radius_m=None):
+        if bbox is None and not centres:
+            raise ValueError("Hay que indicar un rectángulo o al menos un centro")
+        self.bbox = bbox
+        self.centres = centres or []
+        self.radius_km = (radius_m or 0) / 1000
+
+        if bbox is not None:
+            lat0 = (bbox[0] + bbox[2]) / 2
+        else:
+            lat0 = sum(lat for _, lat, _ in self.centres) / len(self.centres)
+        self.projection = _Projection(lat0)
+        self._circles = [self.projection.to_xy(lat, lon) for _, lat, lon in self.centres]
+
+    def bounds_xy(self):
+        """Rectángulo envolvente en kilómetros: (min_x, min_y, max_x, max_y)"""
+        if self.bbox is not None:
+            min_x, min_y = self.projection.to_xy(self.bbox[0], self.bbox[1])
+            max_x, max_y = self.projection.to_xy(self.bbox[2], self.bbox[3])
+            return min_x, min_y, max_x, max_y
+        r = self.radius_km
+        xs = [x for x, _ in self._circles]
+        ys = [y for _, y in self._circles]
+        return min(xs) - r, min(ys) - r, max(xs) + r, max(ys) + r
+
+    def contains(self, x, y):
+        if self.bbox is not None:
+            min_x, min_y, max_x, max_y = self.bounds_xy()
+            return min_x <= x <= max_x and min_y <= y <= max_y
+        r2 = self.radius_km ** 2
+        return any((x - cx) ** 2 + (y - cy) ** 2 <= r2 for cx, cy in self._circles)
+
+
+def _sample_grid(bounds, step):
+    """Puntos de muestra en el centro de cada casilla de una rejilla anclada en el origen.
+
+    Al anclarla, dos rectángulos distintos comparten los mismos puntos y sus
+    medidas son comparables.
+    """
+    min_x, min_y, max_x, max_y = bounds
+    for i in range(int(math.floor(min_x / step)), int(math.ceil(max_x / step))):
+        for j in range(int(math.floor(min_y / step)), int(math.ceil(max_y / step))):
+            yield (i + 0.5) * step, (j + 0.5) * step
+
+
+def _hex_centres(bounds, r):
+    """Centros de una rejilla hexagonal (hexágonos de circunradio r) que cubre el rectángulo"""
+    min_x, min_y, max_x, max_y = bounds
+    dx = math.sqrt(3) * r
+    dy = 1.5 * r
+    row = 0
+    y = min_y
+    while y <= max_y + dy:
+        offset = dx / 2 if row % 2 else 0.0
+        x = min_x - offset
+        while x <= max_x + dx:
+            yield x, y
+            x += dx
+        y += dy
+        row += 1
+
+
+class _CircleBuckets:
+    """Índice de rejilla para saber qué círculos cubren un punto sin recorrerlos todos"""
+
+    def __init__(self, circles, r):
+        self.circles = circles
+        self.r2 = r * r
+        self.size = 2 * r
+        self.buckets = {}
+        for index, (x, y) in enumerate(circles):
+            self.buckets.setdefault((int(x // self.size), int(y // self.size)), []).append(index)
+
+    def covering(self, x, y):
+        bx, by = int(x // self.size), int(y // self.size)
+        result = []
+        for i in (bx - 1, bx, bx + 1):
+            for j in (by - 1, by, by + 1):
+                for index in self.buckets.get((i, j), ()):
+                    cx, cy = self.circles[index]
+                    if (x - cx) ** 2 + (y - cy) ** 2 <= self.r2:
+                        result.append(index)
+        return result
+
+
+def _sample_step(region, r, resolution):
+    bounds = region.bounds_xy()
+    # Al menos 'resolution' muestras por radio, y no más de ~250.000 en total
+    area = (bounds[2] - bounds[0]) * (bounds[3] - bounds[1])
+    return max(r / resolution, math.sqrt(area / 250000))
+
+
+def plan_cells(region, cell_radius_m, resolution=4):
+    """Devuelve las celdas que cubren la región como (x, y, nombre) en km.
+
+    Si el radio de las celdas es el de los centros originales, estos también
+    son candidatos (con su nombre), de modo que el resultado nunca necesita
+    más consultas que los centros para cubrir la misma zona.
+    """
+    r = cell_radius_m / 1000
+    bounds = region.bounds_xy()
+    candidates = [(x, y, None) for x, y in _hex_centres(bounds, r)]
+    if region.centres and math.isclose(region.radius_km, r):
+        candidates = [(x, y, name) for (x, y), (name, _, _) in zip(region._circles, region.centres)] + candidates
+    buckets = _CircleBuckets([(x, y) for x, y, _ in candidates], r)
+
+    # Para cada punto de muestra de la región, qué celdas lo cubren
+    step = _sample_step(region, r, resolution)
+    covers = {}
+    for x, y in _sample_grid(bounds, step):
+        if region.contains(x, y):
+            for index in buckets.covering(x, y):
+                covers.setdefault(index, set()).add((x, y))
+
+    # Recubrimiento voraz: la celda que más puntos sin cubrir añade, hasta cubrirlos todos.
+    # En caso de empate se prefiere el índice menor (los centros originales van primero).
+    # Voraz perezoso: la ganancia de una celda solo baja, así que la del montículo es
+    # una cota superior y solo se recalcula la de la celda que sale primero
+    uncovered = set().union(*covers.values()) if covers else set()
+    heap = [(-len(points), index) for index, points in covers.items()]
+    heapq.heapify(heap)
+    chosen = []
+    while uncovered and heap:
+        bound, best = heapq.heappop(heap)
+        gained = covers[best] & uncovered
+        if not gained:
+            continue
+        if len(gained) < -bound:
+            heapq.heappush(heap, (-len(gained), best))
+            continue
+        chosen.append(best)
+        uncovered -= gained
+
+    # Orden estable: de norte a sur y de oeste a este
+    cells = [candidates[index] for index in chosen]
+    cells.sort(key=lambda c: (-round(c[1], 6), c[0]))
+    return cells
+
+
+def coverage_report(region, circles_xy, radius_m, resolution=4):
+    """Mide cuánto de la región cubren los círculos y cuánto se solapan entre sí.
+
+    overlap_pct es la parte del área consultada que se busca más de una vez y
+    outside_pct la parte del área cubierta que queda fuera de la región.
+    """
+    r = radius_m / 1000
+    bounds = region.bounds_xy()
+    if circles_xy:
+        xs = [x for x, _ in circles_xy]
+        ys = [y for _, y in circles_xy]
+        bounds = (min(bounds[0], min(xs) - r), min(bounds[1], min(ys) - r),
+                  max(bounds[2], max(xs) + r), max(bounds[3], max(ys) + r))
+    step = _sample_step(region, r, resolution)
+    buckets = _CircleBuckets(circles_xy, r)
+
+    region_samples = covered_samples = union_samples = 0
+    for x, y in _sample_grid(bounds, step):
+        hits = len(buckets.covering(x, y))
+        inside = region.contains(x, y)
+        region_samples += inside
+        covered_samples += inside and hits > 0
+        union_samples += hits > 0
+
+    cell_area = step * step
+    queried_area = len(circles_xy) * math.pi * r * r
+    union_area = union_samples * cell_area
+    return {
+        "cells": len(circles_xy),
+        "region_km2": region_samples * cell_area,
+        "covered_km2": covered_samples * cell_area,
+        "covered_pct": 100.0 * covered_samples / region_samples if region_samples else 0.0,
+        "queried_km2": queried_area,
+        "overlap_pct": max(0.0, 100.0 * (queried_area - union_area) / queried_area) if queried_area else 0.0,
+        "outside_pct": 100.0 * (union_samples - covered_samples) / union_samples if union_samples else 0.0
+    }
+
+
+def format_coverage_report(report):
+    return (f"{report['cells']} celdas, zona {report['region_km2']:.0f} km², "
+            f"cubierto {report['covered_pct']:.1f}%, solape {report['overlap_pct']:.1f}%, "
+            f"fuera de la zona {report['outside_pct']:.1f}% ({report['queried_km2']:.0f} km² consultados)")
+
+
+def plan_coverage(region, cell_radius_m, zoom=DEFAULT_ZOOM, name_prefix="celda"):
+    """Genera las localizaciones de las celdas y el informe de cobertura.
+
+    Devuelve (localizaciones, informe); cada localización es (nombre, datos) con
+    el mismo formato que read_location.
+    """
+    cells = plan_cells(region, cell_radius_m)
+    locations = []
+    for index, (x, y, name) in enumerate(cells, start=1):
+        lat, lon = region.projection.to_latlon(x, y)
+        locations.append((name or f"{name_prefix}_{index:03d}", {
+            'zoom': zoom,
+            'lat': f"{lat:.7f}",
+            'lon': f"{lon:.7f}"
+        }))
+    return locations, coverage_report(region, [(x, y) for x, y, _ in cells], cell_radius_m)
+
+
+def centres_report(region, radius_m):
+    """Informe de cobertura de los centros originales, para comparar con las celdas"""
+    circles = [region.projection.to_xy(lat, lon) for _, lat, lon in region.centres]
+    return coverage_report(region, circles, radius_m)
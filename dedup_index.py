@@ -0,0 +1,162 @@
+"""Índice persistente de lugares ya vistos para detectar duplicados entre trabajos.
+
+El mismo negocio aparece en varios CSV cuando las keywords de distintas
+categorías se solapan o cuando los radios de localizaciones vecinas se cruzan.
+El índice guarda solo un hash de 16 bytes por lugar (no el registro completo),
+así que escala a millones de filas sin cargarlas en memoria.
+
+Para el modo en dos fases (enrichment.py) guarda también cuándo se buscaron
+por última vez los emails de cada lugar y cuáles eran.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_INDEX_PATH = 'places_index.sqlite3'
+
+# Columnas del CSV que identifican un lugar, por orden de preferencia
+PLACE_ID_COLUMNS = ("place_id", "data_id", "cid")
+
+# Resultado de clasificar una fila
+NEW = "new"              # primera vez que se ve
+DUPLICATE = "duplicate"  # ya apareció en esta misma ejecución
+KNOWN = "known"          # ya apareció en una ejecución anterior
+
+# SQLite limita el número de parámetros por consulta
+_QUERY_CHUNK = 500
+
+# Columnas añadidas después de la primera versión del índice
+_ADDED_COLUMNS = (
+    ("enriched_at", "REAL"),
+    ("emails", "TEXT"),
+)
+
+
+def normalize_text(text):
+    """Minúsculas, sin acentos y sin signos de puntuación"""
+    text = unicodedata.normalize('NFKD', text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def place_key(row, precision=4):
+    """Clave binaria de un lugar: su ID si existe, si no nombre + teléfono + coordenadas.
+
+    Con precision=4 las coordenadas se redondean a unos 10 metros.
+    """
+    for column in PLACE_ID_COLUMNS:
+        value = (row.get(column) or "").strip()
+        if value:
+            raw = f"id:{value}"
+            break
+    else:
+        name = normalize_text(row.get('title') or row.get('name'))
+        phone = re.sub(r'\D', '', row.get('phone') or "")
+        try:
+            lat = round(float(row.get('latitude')), precision)
+            lon = round(float(row.get('longitude')), precision)
+        except (TypeError, ValueError):
+            lat = lon = ""
+        raw = f"np:{name}|{phone}|{lat}|{lon}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+
+class DedupIndex:
+    """Índice de lugares en SQLite que se amplía a medida que se unen resultados"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, run_id=""):
+        self.path = path
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS places (
+                    key BLOB PRIMARY KEY,
+                    first_run TEXT NOT NULL,
+                    first_category TEXT,
+                    first_location TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    times_seen INTEGER NOT NULL DEFAULT 1
+                ) WITHOUT ROWID
+            """)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(places)")}
+            for column, column_type in _ADDED_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE places ADD COLUMN {column} {column_type}")
+
+    def classify(self, keys, category="", location=""):
+        """Clasifica un lote de claves como NEW, DUPLICATE o KNOWN y las registra.
+
+        Devuelve una lista con la clasificación de cada clave, en el mismo orden.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            first_runs = {}
+            unique_keys = list(dict.fromkeys(keys))
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for key, first_run in self._conn.execute(
+                        f"SELECT key, first_run FROM places WHERE key IN ({placeholders})", chunk):
+                    first_runs[key] = first_run
+
+            result = []
+            seen_in_batch = set()
+            for key in keys:
+                if key in first_runs:
+                    result.append(DUPLICATE if first_runs[key] == self.run_id else KNOWN)
+                elif key in seen_in_batch:
+                    result.append(DUPLICATE)
+                else:
+                    result.append(NEW)
+                seen_in_batch.add(key)
+
+            self._conn.executemany("""
+                INSERT INTO places (key, first_run, first_category, first_location, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET last_seen = excluded.last_seen,
+                                               times_seen = times_seen + 1
+            """, [(key, self.run_id, category, location, now, now) for key in keys])
+        return result
+
+    def enrichment(self, keys):
+        """{clave: (enriched_at, emails)} de los lugares cuyos emails ya se buscaron"""
+        result = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), _QUERY_CHUNK):
+                chunk = unique_keys[start:start + _QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                for key, enriched_at, emails in self._conn.execute(
+                        f"SELECT key, enriched_at, emails FROM places "
+                        f"WHERE key IN ({placeholders}) AND enriched_at IS NOT NULL", chunk):
+                    result[key] = (enriched_at, emails or "")
+        return result
+
+    def record_enrichment(self, emails_by_key):
+        """Guarda los emails encontrados para cada lugar ({clave: emails}, vacío si no tenía)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO places (key, first_run, first_seen, last_seen, enriched_at, emails)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET enriched_at = excluded.enriched_at, emails = excluded.emails
+            """, [(key, self.run_id, now, now, now, emails) for key, emails in emails_by_key.items()])
+
+    def contains(self, key):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM places WHERE key = ?", (key,)).fetchone() is not None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
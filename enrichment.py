@@ -0,0 +1,215 @@
+"""Modo en dos fases: descubrimiento rápido y búsqueda de emails solo donde hace falta.
+
+Buscar emails obliga al scraper a visitar la web de cada lugar, lo que hace
+lentos todos los trabajos aunque los lugares ya se conozcan o no tengan web.
+En dos fases:
+
+1. Descubrimiento: el plan se envía con fast_mode=True y email=False, y los
+   resultados se descargan y pasan por el índice de duplicados como siempre.
+2. Emails: del consolidado se toman los lugares con web cuyos emails nunca se
+   buscaron o se buscaron hace más de ttl horas (según el índice de lugares).
+   Cada uno se busca por nombre y dirección, con email=True y depth 1, en
+   trabajos de batch_size lugares agrupados por localización. Cada fila de
+   los resultados se asigna a su lugar por el input_id de su búsqueda (ver
+   keyword_batcher.tag_keywords). Los emails encontrados se guardan en el
+   índice y se copian al consolidado, junto con los que ya se conocían de
+   ejecuciones anteriores.
+"""
+import csv
+import math
+import os
+import time
+from itertools import islice
+
+from coverage_planner import KM_PER_DEG_LAT
+from dedup_index import DedupIndex, normalize_text, place_key
+from keyword_batcher import keyword_lookup
+from keyword_planner import normalize_keyword
+from results_downloader import keyword_column
+from scraper_core import build_payload, payload_template
+
+DEFAULT_ENRICH_TTL = 720  # horas
+DEFAULT_ENRICH_BATCH = 20  # lugares por trabajo
+
+# Parámetros de los trabajos de la segunda fase
+ENRICH_ZOOM = 15
+ENRICH_DEPTH = 1
+MIN_ENRICH_RADIUS = 1000  # metros
+# Tipo de los trabajos de la segunda fase en el registro, para no mezclar su historial con el de búsquedas
+ENRICH_KIND = "emails"
+
+EMAIL_COLUMN = "emails"
+
+
+def discovery_jobs(jobs):
+    """Trabajos de la primera fase: el mismo plan con fast_mode y sin emails"""
+    return [dict(job, payload=dict(job['payload'], fast_mode=True, email=False)) for job in jobs]
+
+
+def place_query(row):
+    """Búsqueda que encuentra un lugar concreto: 'nombre, dirección'"""
+    title = (row.get('title') or "").strip()
+    address = (row.get('address') or "").strip()
+    return f"{title}, {address}" if address else title
+
+
+def select_for_enrichment(csv_path, index, ttl_hours=DEFAULT_ENRICH_TTL, now=None):
+    """Lugares del consolidado con web y coordenadas cuyos emails no se han buscado o caducaron.
+
+    Devuelve (lugares, conocidos): cada lugar es un diccionario con key, query,
+    title, location, lat y lon; conocidos es cuántos tenían emails recientes.
+    """
+    candidates = {}
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if not (row.get('website') or "").strip() or not (row.get('title') or "").strip():
+                continue
+            try:
+                lat, lon = float(row.get('latitude')), float(row.get('longitude'))
+            except (TypeError, ValueError):
+                continue
+            key = place_key(row)
+            if key not in candidates:
+                candidates[key] = {"key": key, "query": place_query(row), "title": row['title'],
+                                   "location": row.get('job_location') or "", "lat": lat, "lon": lon}
+    since = (time.time() if now is None else now) - ttl_hours * 3600
+    enriched = index.enrichment(list(candidates))
+    places = [place for key, place in candidates.items() if key not in enriched or enriched[key][0] < since]
+    return places, len(candidates) - len(places)
+
+
+def _distance_m(lat1, lon1, lat2, lon2):
+    dy = (lat2 - lat1) * KM_PER_DEG_LAT
+    dx = (lon2 - lon1) * KM_PER_DEG_LAT * math.cos(math.radians((lat1 + lat2) / 2))
+    return math.hypot(dx, dy) * 1000
+
+
+def enrichment_jobs(places, job_prefix, max_time, batch_size=DEFAULT_ENRICH_BATCH):
+    """Trabajos de la segunda fase: cada keyword es el nombre y la dirección de un lugar.
+
+    Los lugares se agrupan por localización y, dentro de ella, por cercanía;
+    cada trabajo se centra en sus lugares con el radio justo para cubrirlos.
+    """
+    template = payload_template(MIN_ENRICH_RADIUS, ENRICH_DEPTH, max_time)
+    by_location = {}
+    for place in places:
+        by_location.setdefault(place['location'], []).append(place)
+
+    jobs = []
+    for location, group in by_location.items():
+        group.sort(key=lambda place: (round(place['lat'], 2), place['lon']))
+        for i, start in enumerate(range(0, len(group), batch_size), 1):
+            chunk = group[start:start + batch_size]
+            lat = sum(place['lat'] for place in chunk) / len(chunk)
+            lon = sum(place['lon'] for place in chunk) / len(chunk)
+            radius = max(MIN_ENRICH_RADIUS, math.ceil(
+                max(_distance_m(lat, lon, place['lat'], place['lon']) for place in chunk) + 500))
+            name = f"{job_prefix}_emails_{location or 'sin_localizacion'}_{i}"
+            keywords = list(dict.fromkeys(place['query'] for place in chunk))
+            payload = build_payload(name, keywords, {"lat": lat, "lon": lon, "zoom": ENRICH_ZOOM},
+                                    template=template)
+            payload['radius'] = radius
+            jobs.append({"name": name, "category": "emails", "location": location, "kind": ENRICH_KIND,
+                         "payload": payload})
+    return jobs
+
+
+def _found_emails(places, enrichment_csv, log=print):
+    """{clave: emails} de los lugares buscados que aparecen en los resultados de la segunda fase"""
+    targets = {normalize_keyword(place['query']): place for place in places}
+    lookup = keyword_lookup(place['query'] for place in places)
+    found = {}
+    with open(enrichment_csv, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        column = keyword_column(reader.fieldnames)
+        if column is None:
+            log("Aviso: los resultados de la segunda fase no indican la búsqueda de cada fila (sin input_id); "
+                "no se puede saber de qué lugar es cada email")
+            return found
+        for row in reader:
+            query = lookup.get(normalize_keyword(row.get(column) or ""))
+            target = targets.get(normalize_keyword(query)) if query is not None else None
+            if target is None:
+                continue
+            # Una búsqueda puede devolver lugares parecidos: solo cuenta el mismo lugar
+            if place_key(row) == target['key'] or normalize_text(row.get('title')) == normalize_text(target['title']):
+                emails = (row.get(EMAIL_COLUMN) or "").strip()
+                if emails or target['key'] not in found:
+                    found[target['key']] = emails
+    return found
+
+
+def apply_enrichment(csv_path, places, enrichment_csv, index, log=print, batch_size=1000):
+    """Guarda en el índice los emails de la segunda fase y rellena la columna emails del consolidado.
+
+    Devuelve cuántas filas del consolidado quedaron con email.
+    """
+    found = (_found_emails(places, enrichment_csv, log)
+             if enrichment_csv and os.path.exists(enrichment_csv) else {})
+    index.record_enrichment(found)
+    if places:
+        log(f"Emails: {sum(1 for emails in found.values() if emails)} encontrados de {len(places)} lugares "
+            f"buscados ({len(places) - len(found)} sin respuesta, se volverán a buscar)")
+
+    tmp_path = f"{csv_path}.tmp"
+    with_email = 0
+    with open(csv_path, 'r', encoding='utf-8', newline='') as src:
+        reader = csv.DictReader(src)
+        fieldnames = list(reader.fieldnames or [])
+        if EMAIL_COLUMN not in fieldnames:
+            fieldnames.append(EMAIL_COLUMN)
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+            writer = csv.DictWriter(dst, fieldnames=fieldnames, restval='', extrasaction='ignore')
+            writer.writeheader()
+            while True:
+                batch = list(islice(reader, batch_size))
+                if not batch:
+                    break
+                keys = [place_key(row) for row in batch]
+                known = index.enrichment(keys)
+                for row, key in zip(batch, keys):
+                    if not (row.get(EMAIL_COLUMN) or "").strip() and key in known:
+                        row[EMAIL_COLUMN] = known[key][1]
+                    if (row.get(EMAIL_COLUMN) or "").strip():
+                        with_email += 1
+                    writer.writerow(row)
+    os.replace(tmp_path, csv_path)
+    return with_email
+
+
+def run_enrichment(make_pipeline, merged_path, index_path, run_id, job_prefix, max_time,
+                   ttl_hours=DEFAULT_ENRICH_TTL, batch_size=DEFAULT_ENRICH_BATCH, log=print,
+                   should_continue=None):
+    """Segunda fase sobre el consolidado de la primera. Devuelve el seguimiento de sus trabajos o None.
+
+    make_pipeline(run_id) crea el JobPipeline de la segunda fase (con
+    descargas y sin índice de duplicados).
+    """
+    should_continue = should_continue or (lambda: True)
+    if not os.path.exists(merged_path):
+        log("Segunda fase: la primera no descargó resultados; no hay emails que buscar")
+        return None
+    index = DedupIndex(index_path, run_id=run_id)
+    try:
+        places, known = select_for_enrichment(merged_path, index, ttl_hours)
+        log(f"Segunda fase: {len(places)} lugares con web necesitan emails "
+            f"({known} ya se buscaron en las últimas {ttl_hours:g} horas)")
+        tracker = None
+        enrichment_csv = None
+        if places:
+            jobs = enrichment_jobs(places, job_prefix, max_time, batch_size)
+            pipeline = make_pipeline(f"{run_id}_emails")
+            jobs_info = pipeline.submit(jobs)
+            if not should_continue():
+                pipeline.close()
+                return None
+            tracker = pipeline.track(jobs_info)
+            if not should_continue():
+                return tracker
+            if pipeline.downloader is not None:
+                enrichment_csv = pipeline.downloader.merged_path
+        rows = apply_enrichment(merged_path, places, enrichment_csv, index, log=log)
+        log(f"Consolidado con emails: {rows} filas con email en {merged_path}")
+        return tracker
+    finally:
+        index.close()
@@ -0,0 +1,151 @@
+"""Registro de frescura de los datos por categoría, localización y keyword.
+
+Para cada keyword buscada en una localización se guarda cuándo se obtuvo por
+última vez, cuántos lugares devolvió y qué lugares eran (sus claves de 16
+bytes). Al comparar una ejecución con la anterior se obtiene qué parte de los
+resultados cambió y, dividiendo por los días transcurridos, un ritmo de
+cambio. El modo incremental solo vuelve a buscar las keywords cuyos datos han
+superado el TTL o que, por su ritmo de cambio, probablemente ya han cambiado.
+"""
+import csv
+import sqlite3
+import threading
+import time
+
+from dedup_index import place_key
+from keyword_batcher import keyword_lookup
+from keyword_planner import normalize_keyword
+from results_downloader import keyword_column
+
+DEFAULT_FRESHNESS_PATH = 'freshness.sqlite3'
+
+_KEY_SIZE = 16
+_DAY = 86400.0
+
+
+def _pack(keys):
+    return b"".join(sorted(keys))
+
+
+def _unpack(blob):
+    return {blob[i:i + _KEY_SIZE] for i in range(0, len(blob or b""), _KEY_SIZE)}
+
+
+def change_fraction(previous, current):
+    """Parte de los lugares que cambió entre dos resultados (1 - Jaccard)"""
+    union = previous | current
+    if not union:
+        return 0.0
+    return 1.0 - len(previous & current) / len(union)
+
+
+class FreshnessStore:
+    """Frescura de los resultados en SQLite, segura para usar desde varios hilos"""
+
+    def __init__(self, path=DEFAULT_FRESHNESS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS freshness (
+                    category TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    keyword TEXT NOT NULL,
+                    last_scraped REAL NOT NULL,
+                    result_count INTEGER NOT NULL,
+                    change_rate REAL,
+                    runs INTEGER NOT NULL DEFAULT 1,
+                    places BLOB,
+                    PRIMARY KEY (category, location, keyword)
+                ) WITHOUT ROWID
+            """)
+
+    def get(self, category, location, keyword):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM freshness WHERE category = ? AND location = ? AND keyword = ?",
+                (category, location, normalize_keyword(keyword))
+            ).fetchone()
+        return dict(row) if row else None
+
+    def record(self, category, location, keyword_keys, now=None):
+        """Guarda los lugares obtenidos para cada keyword ({keyword: claves}) y actualiza su ritmo de cambio"""
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            for keyword, keys in keyword_keys.items():
+                keyword = normalize_keyword(keyword)
+                row = self._conn.execute(
+                    "SELECT last_scraped, change_rate, runs, places FROM freshness "
+                    "WHERE category = ? AND location = ? AND keyword = ?",
+                    (category, location, keyword)
+                ).fetchone()
+                change_rate, runs = None, 1
+                if row is not None:
+                    runs = row['runs'] + 1
+                    change_rate = row['change_rate']
+                    days = (now - row['last_scraped']) / _DAY
+                    if days > 0:
+                        rate = change_fraction(_unpack(row['places']), set(keys)) / days
+                        # Media móvil para que una ejecución atípica no decida sola
+                        change_rate = rate if change_rate is None else 0.5 * change_rate + 0.5 * rate
+                self._conn.execute("""
+                    INSERT OR REPLACE INTO freshness
+                        (category, location, keyword, last_scraped, result_count, change_rate, runs, places)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (category, location, keyword, now, len(keys), change_rate, runs, _pack(keys)))
+
+    def record_csv(self, location, keyword_categories, csv_path, now=None):
+        """Registra los resultados de un CSV descargado, repartidos por keyword.
+
+        keyword_categories es {keyword: categoría} (un trabajo puede agrupar
+        varias categorías). Si el CSV no indica la keyword de cada fila (ni
+        su ID en input_id), todas las keywords del trabajo reciben el conjunto
+        completo de lugares.
+        """
+        categories = {normalize_keyword(keyword): category for keyword, category in keyword_categories.items()}
+        lookup = keyword_lookup(keyword_categories)
+        by_keyword = {keyword: set() for keyword in categories}
+        all_keys = set()
+        matched = False
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            column = keyword_column(reader.fieldnames)
+            for row in reader:
+                key = place_key(row)
+                all_keys.add(key)
+                keyword = lookup.get(normalize_keyword(row.get(column) or "")) if column else None
+                if keyword is not None:
+                    by_keyword[normalize_keyword(keyword)].add(key)
+                    matched = True
+        if not matched:
+            by_keyword = {keyword: all_keys for keyword in by_keyword}
+        by_category = {}
+        for keyword, keys in by_keyword.items():
+            by_category.setdefault(categories[keyword], {})[keyword] = keys
+        for category, keyword_keys in by_category.items():
+            self.record(category, location, keyword_keys, now)
+
+    def due(self, category, location, keyword, ttl_seconds, change_threshold=0.2, now=None):
+        """Decide si hay que volver a buscar una keyword. Devuelve (sí/no, motivo)"""
+        now = time.time() if now is None else now
+        row = self.get(category, location, keyword)
+        if row is None:
+            return True, "sin datos"
+        age = now - row['last_scraped']
+        if age >= ttl_seconds:
+            return True, f"datos de hace {age / _DAY:.1f} días"
+        if row['change_rate'] and row['change_rate'] * age / _DAY >= change_threshold:
+            return True, f"cambia un {100 * row['change_rate']:.0f}% al día"
+        return False, f"actualizado hace {age / _DAY:.1f} días"
+
+    def due_keywords(self, category, location, keywords, ttl_seconds, change_threshold=0.2, now=None):
+        """Keywords de la lista que hay que volver a buscar"""
+        return [keyword for keyword in keywords
+                if self.due(category, location, keyword, ttl_seconds, change_threshold, now)[0]]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,166 @@
+"""Regulación del ritmo de envío según la capacidad del servidor.
+
+Enviar todos los trabajos de golpe llena la cola del scraper (los trabajos
+se quedan en 'pending' y los últimos vencen antes de empezar), y enviarlos
+de uno en uno con una pausa fija deja el servidor parado. El regulador
+combina dos límites:
+
+- un cubo de fichas (token bucket) que fija cuántos envíos por segundo se hacen;
+- un máximo de trabajos activos (pending + working) en el servidor.
+
+Ambos se ajustan con AIMD: suben poco a poco mientras el servidor responde
+bien y se reducen a la mitad ante un 429/5xx, una latencia de envío que se
+dispara o una cola de trabajos pendientes que crece. Los valores indicados
+por el usuario son el máximo; el regulador nunca los supera.
+"""
+import threading
+import time
+
+from api_client import RETRY_STATUS_CODES
+
+
+class TokenBucket:
+    """Cubo de fichas: permite ráfagas de hasta 'capacity' envíos y 'rate' por segundo de media"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self, now=None):
+        """Toma una ficha si hay. Devuelve 0 si se tomó o los segundos que faltan para la siguiente"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def set_rate(self, rate):
+        self._refill(time.monotonic())
+        self.rate = rate
+
+
+class SubmitGovernor:
+    """Decide cuándo se puede enviar el siguiente trabajo.
+
+    Los hilos de envío llaman a acquire() antes de cada envío. Cada envío
+    ocupa un hueco de trabajo activo que se libera con release() cuando el
+    trabajo termina (o si el envío falla). observe_response() recibe cada
+    respuesta HTTP a un envío (el POST de submit_job, no las consultas de
+    estado ni las descargas) y observe_counts() el resumen de estados de
+    cada ciclo del seguimiento.
+    """
+
+    def __init__(self, max_active=20, rate=2.0, min_active=1, min_rate=0.1,
+                 queue_target=None, latency_factor=3.0, cooldown=10.0, log=print):
+        if max_active < 1 or rate <= 0:
+            raise ValueError("El máximo de trabajos activos y el ritmo de envío deben ser mayores que 0")
+        self.max_active = max_active
+        self.max_rate = rate
+        self.min_active = min_active
+        self.min_rate = min_rate
+        # Trabajos en 'pending' que se admiten en la cola del servidor antes de frenar
+        self.queue_target = queue_target if queue_target is not None else max(1, max_active // 4)
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.log = log
+
+        self.limit = float(max_active)
+        self.active = 0
+        self.backoffs = 0
+        self.waits = 0
+        self._bucket = TokenBucket(rate)
+        self._latency_avg = None
+        self._latency_base = None
+        self._last_backoff = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, should_continue=None, poll=0.5):
+        """Espera a que haya hueco y ficha. Devuelve False si se cancela mientras espera"""
+        should_continue = should_continue or (lambda: True)
+        waited = False
+        with self._cond:
+            while True:
+                if not should_continue():
+                    return False
+                if self.active < int(self.limit):
+                    delay = self._bucket.try_take()
+                    if delay == 0:
+                        self.active += 1
+                        if waited:
+                            self.waits += 1
+                        return True
+                    timeout = min(delay, poll)
+                else:
+                    timeout = poll
+                waited = True
+                self._cond.wait(timeout)
+
+    def release(self, count=1):
+        """Libera huecos de trabajos que han terminado o cuyo envío falló"""
+        with self._cond:
+            self.active = max(0, self.active - count)
+            self._cond.notify_all()
+
+    def add_active(self, count):
+        """Cuenta trabajos que ya estaban en el servidor (por ejemplo, al reanudar)"""
+        with self._cond:
+            self.active += count
+
+    def observe_response(self, status_code, latency):
+        """Ajusta el ritmo con cada respuesta HTTP a un envío (status_code None = error de conexión)"""
+        with self._cond:
+            if status_code is None or status_code in RETRY_STATUS_CODES:
+                self._back_off(f"respuesta {status_code or 'sin conexión'} del servidor")
+                return
+
+            # Media móvil de la latencia y la mejor media vista como referencia
+            if self._latency_avg is None:
+                self._latency_avg = latency
+            else:
+                self._latency_avg = 0.8 * self._latency_avg + 0.2 * latency
+            if self._latency_base is None or self._latency_avg < self._latency_base:
+                self._latency_base = self._latency_avg
+
+            if self._latency_avg > self._latency_base * self.latency_factor:
+                self._back_off(f"latencia de envío {self._latency_avg:.2f} s "
+                               f"(referencia {self._latency_base:.2f} s)")
+            elif self._bucket.rate < self.max_rate:
+                # Subida aditiva: una décima del máximo por respuesta correcta
+                self._bucket.set_rate(min(self.max_rate, self._bucket.rate + self.max_rate / 10))
+
+    def observe_counts(self, counts):
+        """Ajusta el máximo de activos con el resumen de estados del seguimiento"""
+        with self._cond:
+            pending = counts.get("pending", 0)
+            if pending > self.queue_target:
+                self._back_off(f"{pending} trabajos en cola en el servidor", rate=False)
+            elif self.limit < self.max_active:
+                self.limit = min(float(self.max_active), self.limit + 1)
+                self._cond.notify_all()
+
+    def _back_off(self, reason, rate=True):
+        """Reducción multiplicativa, como mucho una vez por periodo de enfriamiento"""
+        now = time.monotonic()
+        if now - self._last_backoff < self.cooldown:
+            return
+        self._last_backoff = now
+        self.backoffs += 1
+        self.limit = max(float(self.min_active), self.limit / 2)
+        if rate:
+            self._bucket.set_rate(max(self.min_rate, self._bucket.rate / 2))
+        # La latencia de referencia se vuelve a aprender tras frenar
+        self._latency_base = self._latency_avg = None
+        self.log(f"Regulador: {reason}; se reduce a {int(self.limit)} trabajos activos "
+                 f"y {self._bucket.rate:.2f} envíos/s")
+
+    def describe(self):
+        return (f"límite {int(self.limit)}/{self.max_active} trabajos activos, "
+                f"{self._bucket.rate:.2f}/{self.max_rate:.2f} envíos/s, "
+                f"{self.backoffs} reducciones, {self.waits} envíos en espera")
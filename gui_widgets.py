@@ -0,0 +1,218 @@
+"""Widgets de la interfaz pensados para catálogos grandes.
+
+Con miles de categorías no se puede crear un Checkbutton por archivo ni volver
+a llenar la lista de keywords entera en cada clic. VirtualCheckList solo crea
+widgets para las filas visibles y los reutiliza al desplazarse; KeywordListView
+añade o quita únicamente el bloque de keywords de la categoría que cambia.
+"""
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualCheckList(ttk.Frame):
+    """Lista de casillas virtualizada: el estado de cada fila se guarda en una lista
+    y solo existen tantos Checkbutton como filas caben en pantalla.
+
+    on_toggle(índice, marcado) se llama cuando el usuario cambia una casilla.
+    """
+
+    def __init__(self, parent, on_toggle=None, row_height=24, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.on_toggle = on_toggle
+        self.row_height = row_height
+        self._labels = []
+        self._checked = []
+        self._visible = []  # índices de los elementos que pasan el filtro
+        self._offset = 0
+        self._rows = []  # (variable, checkbutton) reutilizados
+
+        self._body = ttk.Frame(self)
+        self._body.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self._scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self._body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self._body)
+
+    # Datos
+    def set_items(self, labels):
+        self._labels = list(labels)
+        self._checked = [False] * len(self._labels)
+        self._visible = list(range(len(self._labels)))
+        self._offset = 0
+        self._render()
+
+    def append(self, label, checked=False):
+        """Añade un elemento al final y devuelve su índice"""
+        self._labels.append(label)
+        self._checked.append(checked)
+        self._visible.append(len(self._labels) - 1)
+        self._render()
+        return len(self._labels) - 1
+
+    def is_checked(self, index):
+        return self._checked[index]
+
+    def set_checked(self, index, value):
+        self._checked[index] = bool(value)
+        self._render()
+
+    def set_checked_many(self, indices, value=True):
+        """Marca o desmarca varios elementos y redibuja una sola vez"""
+        for index in indices:
+            self._checked[index] = bool(value)
+        self._render()
+
+    def set_all(self, value):
+        self._checked = [bool(value)] * len(self._labels)
+        self._render()
+
+    def checked_indices(self):
+        return [i for i, checked in enumerate(self._checked) if checked]
+
+    def set_filter(self, indices=None):
+        """Muestra solo los índices indicados (None muestra todos)"""
+        if indices is None:
+            self._visible = list(range(len(self._labels)))
+        else:
+            self._visible = sorted(i for i in indices if 0 <= i < len(self._labels))
+        self._offset = 0
+        self._render()
+
+    # Dibujo
+    def _on_resize(self, event):
+        needed = max(1, event.height // self.row_height)
+        while len(self._rows) < needed:
+            row = len(self._rows)
+            var = tk.BooleanVar()
+            button = ttk.Checkbutton(self._body, variable=var,
+                                     command=lambda row=row: self._on_row_toggled(row))
+            self._bind_wheel(button)
+            self._rows.append((var, button))
+        while len(self._rows) > needed:
+            _, button = self._rows.pop()
+            button.destroy()
+        self._offset = self._clamp(self._offset)
+        self._render()
+
+    def _render(self):
+        for row, (var, button) in enumerate(self._rows):
+            position = self._offset + row
+            if position < len(self._visible):
+                index = self._visible[position]
+                button.configure(text=self._labels[index])
+                var.set(self._checked[index])
+                button.grid(row=row, column=0, sticky=tk.W, padx=5)
+            else:
+                button.grid_remove()
+
+        total = len(self._visible)
+        if total and self._rows:
+            self._scrollbar.set(self._offset / total, min(1.0, (self._offset + len(self._rows)) / total))
+        else:
+            self._scrollbar.set(0.0, 1.0)
+
+    def _on_row_toggled(self, row):
+        position = self._offset + row
+        if position >= len(self._visible):
+            return
+        index = self._visible[position]
+        self._checked[index] = self._rows[row][0].get()
+        if self.on_toggle:
+            self.on_toggle(index, self._checked[index])
+
+    # Desplazamiento
+    def _clamp(self, offset):
+        return max(0, min(offset, len(self._visible) - len(self._rows)))
+
+    def _scroll_to(self, offset):
+        offset = self._clamp(offset)
+        if offset != self._offset:
+            self._offset = offset
+            self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * len(self._visible)))
+        elif action == "scroll":
+            step = len(self._rows) if unit == "pages" else 1
+            self._scroll_to(self._offset + int(amount) * step)
+
+    def _on_wheel(self, event):
+        if getattr(event, 'num', None) == 4 or event.delta > 0:
+            self._scroll_to(self._offset - 3)
+        else:
+            self._scroll_to(self._offset + 3)
+        return "break"
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
+
+
+class KeywordListView:
+    """Listbox de keywords organizada en bloques por categoría.
+
+    Al marcar o desmarcar una categoría solo se inserta o borra su bloque, con
+    una única llamada a Tk. Un filtro opcional (función sobre cada keyword)
+    limita las keywords que se muestran.
+    """
+
+    def __init__(self, listbox):
+        self.listbox = listbox
+        self._keywords = {}  # categoría -> todas sus keywords
+        self._shown = {}     # categoría -> keywords que pasan el filtro
+        self._order = []     # categorías mostradas, en orden
+        self._filter = None
+
+    def _start(self, key):
+        """Posición en la Listbox donde empieza el bloque de la categoría"""
+        return sum(len(self._shown[k]) for k in self._order[:bisect.bisect_left(self._order, key)])
+
+    def _filtered(self, keywords):
+        if self._filter is None:
+            return list(keywords)
+        return [keyword for keyword in keywords if self._filter(keyword)]
+
+    def add(self, key, keywords):
+        if key in self._keywords:
+            self.remove(key)
+        self._keywords[key] = list(keywords)
+        self._shown[key] = self._filtered(keywords)
+        start = self._start(key)
+        bisect.insort(self._order, key)
+        if self._shown[key]:
+            self.listbox.insert(start, *self._shown[key])
+
+    def remove(self, key):
+        if key not in self._keywords:
+            return
+        start = self._start(key)
+        count = len(self._shown[key])
+        if count:
+            self.listbox.delete(start, start + count - 1)
+        self._order.remove(key)
+        del self._keywords[key]
+        del self._shown[key]
+
+    def set_blocks(self, blocks):
+        """Sustituye todo el contenido por [(categoría, keywords)] en una sola operación"""
+        self._keywords = {key: list(keywords) for key, keywords in blocks}
+        self._order = sorted(self._keywords)
+        self._redraw()
+
+    def set_filter(self, predicate=None):
+        self._filter = predicate
+        self._redraw()
+
+    def _redraw(self):
+        self._shown = {key: self._filtered(self._keywords[key]) for key in self._order}
+        self.listbox.delete(0, tk.END)
+        items = [keyword for key in self._order for keyword in self._shown[key]]
+        if items:
+            self.listbox.insert(tk.END, *items)
+
+    def __contains__(self, key):
+        return key in self._keywords
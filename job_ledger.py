@@ -0,0 +1,291 @@
+"""Registro persistente de trabajos (SQLite) para poder reanudar ejecuciones.
+
+Cada trabajo planificado se guarda con su par categoría/localización, el hash
+de su payload, el ID asignado por la API y su último estado. Si la aplicación
+se cierra a mitad de un lote, el modo reanudar omite los pares que ya se
+enviaron o terminaron con los mismos parámetros.
+
+Además se guarda un hash del contenido de la búsqueda (content_hash) para
+reutilizar un trabajo idéntico que sigue en curso o terminó hace poco, sea
+cual sea su categoría o ejecución.
+
+Con depth, max_time, duración, filas y lugares nuevos obtenidos de cada
+trabajo, el registro sirve de historial para ajustar esos parámetros (ver
+auto_tuner.py); los valores elegidos en cada plan se guardan en la tabla
+run_tuning, por ejecución y fast_mode, para que al reanudar se repitan los
+mismos payloads. Cada trabajo guarda también su tipo (kind) y si usó
+fast_mode: una búsqueda de emails de la segunda fase o un descubrimiento
+rápido no rinden ni tardan lo mismo que una búsqueda completa, así que el
+historial solo compara trabajos del mismo tipo.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from keyword_planner import normalize_keyword
+
+DEFAULT_LEDGER_PATH = 'jobs_ledger.sqlite3'
+
+# Estados que no hace falta volver a enviar al reanudar
+SUBMITTED_STATUSES = {"pending", "working", "ok"}
+
+# Columnas añadidas después de la primera versión del registro
+_ADDED_COLUMNS = (
+    ("host", "TEXT"),
+    ("keyword_count", "INTEGER"),
+    ("submitted_at", "REAL"),
+    ("started_at", "REAL"),
+    ("finished_at", "REAL"),
+    ("content_hash", "TEXT"),
+    ("depth", "INTEGER"),
+    ("max_time", "REAL"),
+    ("result_rows", "INTEGER"),
+    ("new_places", "INTEGER"),
+    ("kind", "TEXT"),
+    ("fast_mode", "INTEGER"),
+)
+
+# Tipo de los trabajos que no indican otro (ver enrichment.ENRICH_KIND)
+SEARCH_KIND = "search"
+
+# Campos del payload que determinan los resultados de una búsqueda
+CONTENT_FIELDS = ("zoom", "radius", "depth", "fast_mode")
+
+
+def payload_hash(payload):
+    """Hash estable del payload, sin el nombre (que lleva fecha y hora)"""
+    data = {key: value for key, value in payload.items() if key != "name"}
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def content_hash(payload):
+    """Hash de lo que se busca, sin el nombre ni los parámetros que no cambian los resultados.
+
+    Cubre las keywords (sin orden ni mayúsculas), las coordenadas, el zoom, el
+    radio, la profundidad y fast_mode.
+    """
+    data = {field: payload.get(field) for field in CONTENT_FIELDS}
+    data["keywords"] = sorted({normalize_keyword(keyword) for keyword in payload.get('keywords', [])})
+    data["lat"] = round(float(payload['lat']), 6)
+    data["lon"] = round(float(payload['lon']), 6)
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def pair_key(category, location):
+    return f"{category}|{location}"
+
+
+def job_kind(job):
+    return job.get('kind') or SEARCH_KIND
+
+
+class JobLedger:
+    """Registro de trabajos en SQLite, seguro para usar desde varios hilos"""
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    pair_key TEXT NOT NULL,
+                    payload_hash TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    name TEXT,
+                    backend_id TEXT,
+                    status TEXT NOT NULL,
+                    run_id TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (pair_key, payload_hash)
+                )
+            """)
+            # Los registros creados por versiones anteriores no tienen todas las columnas
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in _ADDED_COLUMNS:
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_backend_id ON jobs (backend_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_content_hash ON jobs (content_hash)")
+            # La primera versión guardaba un solo ajuste por par, sin ejecución ni fast_mode:
+            # no sirve para repetir los payloads de una ejecución concreta
+            self._conn.execute("DROP TABLE IF EXISTS tuning")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS run_tuning (
+                    run_id TEXT NOT NULL,
+                    fast_mode INTEGER NOT NULL,
+                    category TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    seconds_per_keyword REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, fast_mode, category, location)
+                )
+            """)
+
+    def record_planned(self, jobs, run_id):
+        """Registra los trabajos del plan que aún no estaban en el registro"""
+        now = time.time()
+        rows = [(pair_key(job['category'], job['location']), payload_hash(job['payload']),
+                 job['category'], job['location'], job['name'], len(job['payload'].get('keywords', [])),
+                 content_hash(job['payload']), job['payload'].get('depth'), job['payload'].get('max_time'),
+                 job_kind(job), int(bool(job['payload'].get('fast_mode'))), run_id, now, now)
+                for job in jobs]
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT OR IGNORE INTO jobs
+                    (pair_key, payload_hash, category, location, name, keyword_count, content_hash, depth,
+                     max_time, kind, fast_mode, status, run_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'planned', ?, ?, ?)
+            """, rows)
+
+    def record_submitted(self, job, backend_id, status, host=None):
+        """Guarda el ID de la API, el host y el estado inicial de un trabajo enviado"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                UPDATE jobs SET name = ?, backend_id = ?, status = ?, host = ?, updated_at = ?,
+                                submitted_at = ?, started_at = NULL, finished_at = NULL
+                WHERE pair_key = ? AND payload_hash = ?
+            """, (job['name'], backend_id, status, host, now, now,
+                  pair_key(job['category'], job['location']), payload_hash(job['payload'])))
+
+    def find_reusable(self, job, window_seconds, now=None):
+        """Trabajo idéntico (mismo content_hash) en curso o terminado en 'ok' dentro de la ventana, o None"""
+        since = (time.time() if now is None else now) - window_seconds
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT * FROM jobs
+                WHERE content_hash = ? AND backend_id IS NOT NULL
+                      AND ((status IN ('pending', 'working') AND submitted_at >= ?)
+                           OR (status = 'ok' AND finished_at >= ?))
+                ORDER BY COALESCE(finished_at, submitted_at) DESC LIMIT 1
+            """, (content_hash(job['payload']), since, since)).fetchone()
+        return dict(row) if row else None
+
+    def record_reused(self, job, source):
+        """Asigna al trabajo el ID de un trabajo idéntico (fila 'source'), con sus mismos tiempos"""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                UPDATE jobs SET name = ?, backend_id = ?, status = ?, host = ?, updated_at = ?,
+                                submitted_at = ?, started_at = ?, finished_at = ?
+                WHERE pair_key = ? AND payload_hash = ?
+            """, (job['name'], source['backend_id'], source['status'], source['host'], time.time(),
+                  source['submitted_at'], source['started_at'], source['finished_at'],
+                  pair_key(job['category'], job['location']), payload_hash(job['payload'])))
+
+    def update_status(self, backend_id, status):
+        """Actualiza el último estado conocido de un trabajo por su ID de la API.
+
+        Guarda también cuándo empezó y terminó, para estimar la duración de los siguientes.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                UPDATE jobs SET status = ?, updated_at = ?,
+                    started_at = CASE WHEN ? = 'working' AND started_at IS NULL THEN ? ELSE started_at END,
+                    finished_at = CASE WHEN ? IN ('ok', 'failed') THEN ? ELSE finished_at END
+                WHERE backend_id = ?
+            """, (status, now, status, now, status, now, backend_id))
+
+    def seconds_per_keyword(self, limit=200, kind=SEARCH_KIND, fast_mode=False):
+        """Mediana de segundos por keyword de los últimos trabajos de ese tipo terminados en 'ok', o None"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT (finished_at - COALESCE(started_at, submitted_at)) / keyword_count AS seconds
+                FROM jobs
+                WHERE status = 'ok' AND kind = ? AND fast_mode = ? AND keyword_count > 0
+                      AND finished_at IS NOT NULL AND COALESCE(started_at, submitted_at) IS NOT NULL
+                ORDER BY finished_at DESC LIMIT ?
+            """, (kind, int(bool(fast_mode)), limit)).fetchall()
+        values = sorted(row['seconds'] for row in rows if row['seconds'] > 0)
+        if not values:
+            return None
+        return values[len(values) // 2]
+
+    def record_results(self, backend_id, rows, new_places=None):
+        """Guarda cuántas filas devolvió un trabajo y cuántos lugares nuevos aportó (None si no se sabe)"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET result_rows = ?, new_places = ? WHERE backend_id = ?",
+                               (rows, new_places, backend_id))
+
+    def yield_history(self, limit=5000, kind=SEARCH_KIND, fast_mode=False):
+        """Últimos trabajos de ese tipo terminados en 'ok', del más reciente al más antiguo.
+
+        Solo cuentan los que tienen filas, lugares nuevos, depth y duración
+        conocidos. Los trabajos reutilizados comparten ID con el original y
+        solo cuentan una vez.
+        """
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT category, location, depth, max_time, keyword_count, result_rows, new_places,
+                       MAX(finished_at) AS finished_at,
+                       finished_at - COALESCE(started_at, submitted_at) AS duration
+                FROM jobs
+                WHERE status = 'ok' AND kind = ? AND fast_mode = ?
+                      AND result_rows IS NOT NULL AND new_places IS NOT NULL AND depth IS NOT NULL
+                      AND keyword_count > 0 AND finished_at IS NOT NULL
+                      AND COALESCE(started_at, submitted_at) IS NOT NULL
+                GROUP BY backend_id
+                ORDER BY finished_at DESC LIMIT ?
+            """, (kind, int(bool(fast_mode)), limit)).fetchall()
+        return [dict(row) for row in rows if row['duration'] > 0]
+
+    def save_tuning(self, tuning, run_id, fast_mode=False):
+        """Guarda los ajustes {(categoría, localización): {'depth', 'seconds_per_keyword', ...}} de una ejecución"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT OR REPLACE INTO run_tuning
+                    (run_id, fast_mode, category, location, depth, seconds_per_keyword, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(run_id, int(bool(fast_mode)), category, location, values['depth'],
+                   values['seconds_per_keyword'], now)
+                  for (category, location), values in tuning.items()])
+
+    def load_tuning(self, fast_mode=False):
+        """Ajustes de la última ejecución que los guardó con ese fast_mode, o {} si no hay"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT * FROM run_tuning
+                WHERE fast_mode = ? AND run_id = (SELECT run_id FROM run_tuning WHERE fast_mode = ?
+                                                  ORDER BY updated_at DESC, rowid DESC LIMIT 1)
+            """, (int(bool(fast_mode)), int(bool(fast_mode)))).fetchall()
+        return {(row['category'], row['location']): {"depth": row['depth'],
+                                                      "seconds_per_keyword": row['seconds_per_keyword']}
+                for row in rows}
+
+    def get(self, job):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE pair_key = ? AND payload_hash = ?",
+                (pair_key(job['category'], job['location']), payload_hash(job['payload']))
+            ).fetchone()
+        return dict(row) if row else None
+
+    def split_for_resume(self, jobs):
+        """Separa los trabajos que hay que enviar de los que ya se enviaron.
+
+        Devuelve (por_enviar, ya_enviados); los ya enviados son filas del registro.
+        """
+        to_submit, already_submitted = [], []
+        for job in jobs:
+            row = self.get(job)
+            if row and row['backend_id'] and row['status'] in SUBMITTED_STATUSES:
+                already_submitted.append(row)
+            else:
+                to_submit.append(job)
+        return to_submit, already_submitted
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,106 @@
+"""Cola de trabajos con prioridad por categoría y por localización.
+
+El plan se genera en orden categoría -> localización, así que si una
+ejecución se corta (cancelación, tiempo de espera) las combinaciones del
+final nunca se envían, aunque sean las más valiosas. Aquí cada categoría y
+cada localización puede tener un peso y un plazo: los trabajos con plazo
+salen primero (el plazo más cercano antes) y el resto por peso, que es el
+producto del peso de su categoría por el de su localización. A igual
+prioridad se respeta el orden del plan. Los pesos se pueden cambiar
+mientras se envía y la cola se reordena. Un trabajo que agrupa varias
+categorías toma el mayor peso y el plazo más cercano de ellas.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+CATEGORY = "category"
+LOCATION = "location"
+
+
+def parse_priority(text):
+    """'cat:dentista=3' -> ('category', 'dentista', 3.0); 'loc:gandia=2' -> ('location', ...)"""
+    kind, _, rest = text.partition(':')
+    name, _, value = rest.rpartition('=')
+    kinds = {"cat": CATEGORY, "category": CATEGORY, "loc": LOCATION, "location": LOCATION}
+    if kind not in kinds or not name or not value:
+        raise ValueError(f"Prioridad no válida: '{text}' (formato cat:nombre=valor o loc:nombre=valor)")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"Valor no válido en la prioridad '{text}'")
+    if number < 0:
+        raise ValueError(f"La prioridad '{text}' no puede ser negativa")
+    return kinds[kind], name, number
+
+
+class PriorityJobQueue:
+    """Cola de trabajos segura entre hilos, ordenada por plazo y peso"""
+
+    def __init__(self, weights=None, deadlines=None):
+        # {(tipo, nombre): peso} y {(tipo, nombre): segundos desde el inicio}
+        self._weights = dict(weights or {})
+        self._deadlines = dict(deadlines or {})
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+
+    def _key(self, job, seq):
+        categories = set((job.get('keyword_categories') or {}).values()) or {job['category']}
+        keys = [(CATEGORY, category) for category in categories] + [(LOCATION, job['location'])]
+        deadlines = [self._deadlines[key] for key in keys if key in self._deadlines]
+        weight = (max(self._weights.get((CATEGORY, category), 1.0) for category in categories)
+                  * self._weights.get((LOCATION, job['location']), 1.0))
+        if deadlines:
+            return (0, self._start + min(deadlines), -weight, seq)
+        return (1, 0.0, -weight, seq)
+
+    def push(self, job):
+        with self._lock:
+            seq = next(self._seq)
+            heapq.heappush(self._heap, (self._key(job, seq), seq, job, time.monotonic()))
+
+    def extend(self, jobs):
+        for job in jobs:
+            self.push(job)
+
+    def pop(self):
+        """Saca el trabajo más prioritario, o None si la cola está vacía"""
+        return self.pop_with_wait()[0]
+
+    def pop_with_wait(self):
+        """Como pop, pero devuelve (trabajo, segundos que ha esperado en la cola)"""
+        with self._lock:
+            if not self._heap:
+                return None, 0.0
+            _, _, job, pushed_at = heapq.heappop(self._heap)
+        return job, time.monotonic() - pushed_at
+
+    def set_weight(self, kind, name, weight):
+        """Cambia el peso de una categoría o localización y reordena lo que queda"""
+        with self._lock:
+            self._weights[(kind, name)] = weight
+            self._reorder()
+
+    def set_deadline(self, kind, name, seconds):
+        """Plazo en segundos desde el inicio de la cola (None lo quita)"""
+        with self._lock:
+            if seconds is None:
+                self._deadlines.pop((kind, name), None)
+            else:
+                self._deadlines[(kind, name)] = seconds
+            self._reorder()
+
+    def _reorder(self):
+        self._heap = [(self._key(job, seq), seq, job, pushed_at) for _, seq, job, pushed_at in self._heap]
+        heapq.heapify(self._heap)
+
+    def weight(self, kind, name):
+        with self._lock:
+            return self._weights.get((kind, name), 1.0)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
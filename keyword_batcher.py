@@ -0,0 +1,154 @@
+"""División y agrupación de las keywords de cada trabajo.
+
+El plan crea un trabajo por categoría y localización con todas las keywords
+de la categoría. Una categoría grande se convierte en un trabajo largo que
+llega a max_time y se corta, y una pequeña paga el coste fijo de un trabajo
+por pocas búsquedas. Aquí los trabajos con más keywords de las indicadas se
+dividen en partes iguales y los pequeños de una misma localización se agrupan
+en un solo trabajo. El tamaño se puede fijar o calcular con el tiempo medio
+por keyword de ejecuciones anteriores (ver JobLedger.seconds_per_keyword).
+
+Cada trabajo guarda en 'keyword_categories' la categoría de cada keyword para
+poder atribuir los resultados a su categoría original. El CSV del scraper no
+repite la keyword de cada fila, pero admite un ID propio por keyword
+('keyword #!# id') y lo devuelve en la columna input_id: las keywords se
+envían con un ID derivado de la propia keyword (tag_keywords) y cada fila se
+atribuye con keyword_lookup. Dos trabajos que comparten keyword no se
+agrupan, porque sus filas no se podrían repartir entre sus categorías.
+"""
+import hashlib
+import math
+
+from keyword_planner import normalize_keyword
+
+# Parte de max_time que se intenta ocupar al calcular el tamaño de los lotes
+DEFAULT_FILL = 0.8
+
+# Separador de la keyword y su ID en cada línea de keywords del payload
+INPUT_ID_SEPARATOR = "#!#"
+
+
+def parse_batch_size(text):
+    """'off' -> None, 'auto' -> 'auto', '25' -> 25"""
+    text = str(text).strip().lower()
+    if text in ("", "off", "0"):
+        return None
+    if text == "auto":
+        return "auto"
+    try:
+        size = int(text)
+    except ValueError:
+        raise ValueError(f"Tamaño de lote no válido: '{text}' (un número, 'auto' u 'off')")
+    if size < 1:
+        raise ValueError("El tamaño de lote debe ser mayor que 0")
+    return size
+
+
+def keywords_per_job(seconds_per_keyword, max_time_minutes, fill=DEFAULT_FILL):
+    """Keywords que caben en un trabajo sin llegar a max_time"""
+    return max(1, int(max_time_minutes * 60 * fill / seconds_per_keyword))
+
+
+def keyword_input_id(keyword):
+    """ID de una keyword para la columna input_id (el mismo sin distinguir mayúsculas ni espacios)"""
+    return hashlib.blake2b(normalize_keyword(keyword).encode('utf-8'), digest_size=6).hexdigest()
+
+
+def tag_keywords(keywords):
+    """Keywords tal como se envían a la API: 'keyword #!# id'"""
+    return [f"{keyword} {INPUT_ID_SEPARATOR} {keyword_input_id(keyword)}" for keyword in keywords]
+
+
+def keyword_lookup(keywords):
+    """{keyword normalizada o su ID: keyword}, para reconocer la keyword de cada fila del CSV"""
+    lookup = {}
+    for keyword in keywords:
+        lookup[normalize_keyword(keyword)] = keyword
+        lookup[keyword_input_id(keyword)] = keyword
+    return lookup
+
+
+def job_keyword_categories(job):
+    """{keyword: categoría} de un trabajo (los agrupados mezclan varias categorías)"""
+    return job.get('keyword_categories') or {keyword: job['category'] for keyword in job['payload']['keywords']}
+
+
+def split_keywords(keywords, max_keywords):
+    """Divide la lista en el mínimo de partes de como mucho max_keywords, de tamaño parecido"""
+    parts = math.ceil(len(keywords) / max_keywords)
+    size = math.ceil(len(keywords) / parts)
+    return [keywords[i:i + size] for i in range(0, len(keywords), size)]
+
+
+def _params_key(payload):
+    # Solo se agrupan trabajos con los mismos parámetros de búsqueda
+    return tuple(sorted((key, repr(value)) for key, value in payload.items() if key not in ("name", "keywords")))
+
+
+def _with_keywords(job, name, keywords, keyword_categories):
+    result = dict(job, name=name, payload=dict(job['payload'], name=name, keywords=keywords))
+    if len(set(keyword_categories.values())) > 1:
+        result['keyword_categories'] = keyword_categories
+    return result
+
+
+def _pack(group):
+    first = group[0]
+    categories = []
+    keywords = []
+    keyword_categories = {}
+    for job in group:
+        categories.append(job['category'])
+        keywords.extend(job['payload']['keywords'])
+        keyword_categories.update(job_keyword_categories(job))
+    category = "+".join(categories)
+    name = first['name'].replace(f"_{first['category']}_", f"_{category}_", 1)
+    return dict(_with_keywords(first, name, keywords, keyword_categories), category=category)
+
+
+def batch_jobs(jobs, max_keywords, log=print):
+    """Divide los trabajos con más de max_keywords keywords y agrupa los pequeños.
+
+    Un trabajo se considera pequeño si tiene como mucho la mitad de
+    max_keywords; se agrupa con otros de la misma localización que no
+    compartan ninguna keyword mientras el total no pase de max_keywords. Se
+    mantiene el orden del plan.
+    """
+    if max_keywords < 1:
+        raise ValueError("El tamaño de lote debe ser mayor que 0")
+
+    groups = []
+    group_keywords = {}  # índice del grupo abierto -> sus keywords normalizadas
+    open_groups = {}  # (localización, parámetros) -> índice del grupo que admite más trabajos
+    split = 0
+    for job in jobs:
+        keywords = job['payload']['keywords']
+        if len(keywords) > max_keywords:
+            categories = job_keyword_categories(job)
+            parts = split_keywords(keywords, max_keywords)
+            for i, part in enumerate(parts, 1):
+                groups.append([_with_keywords(job, f"{job['name']}_p{i}", part,
+                                              {keyword: categories[keyword] for keyword in part})])
+            split += 1
+            continue
+        if len(keywords) * 2 > max_keywords:
+            groups.append([job])
+            continue
+
+        key = (job['location'], _params_key(job['payload']))
+        normalized = {normalize_keyword(keyword) for keyword in keywords}
+        index = open_groups.get(key)
+        if (index is not None and not normalized & group_keywords[index]
+                and sum(len(j['payload']['keywords']) for j in groups[index]) + len(keywords) <= max_keywords):
+            groups[index].append(job)
+            group_keywords[index] |= normalized
+        else:
+            open_groups[key] = len(groups)
+            group_keywords[len(groups)] = normalized
+            groups.append([job])
+
+    batched = [group[0] if len(group) == 1 else _pack(group) for group in groups]
+    packed = sum(len(group) for group in groups if len(group) > 1)
+    log(f"Lotes de keywords (hasta {max_keywords} por trabajo): {len(jobs)} trabajos -> {len(batched)} "
+        f"({split} divididos, {packed} agrupados)")
+    return batched
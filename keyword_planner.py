@@ -0,0 +1,61 @@
+"""Eliminación de keywords repetidas entre las categorías de un mismo plan.
+
+Varias categorías comparten keywords ("Instalador de gas" está en fontanería
+y en gas). Como cada localización recibe un trabajo por categoría, la misma
+búsqueda se repetiría una vez por categoría y localización. Aquí cada keyword
+se asigna a una sola categoría (la primera del plan que la contiene).
+"""
+import re
+
+
+def normalize_keyword(keyword):
+    """Compara keywords sin distinguir mayúsculas ni espacios sobrantes"""
+    return re.sub(r'\s+', ' ', keyword).strip().casefold()
+
+
+def assign_keywords(category_keywords):
+    """Asigna cada keyword única a una sola categoría.
+
+    category_keywords es una lista de (categoría, keywords) en el orden del plan.
+    Devuelve (asignadas, eliminadas): asignadas es la misma lista sin repetidas
+    ni vacías, y eliminadas una lista de (categoría, keyword, categoría_asignada).
+    """
+    owners = {}
+    assigned = []
+    removed = []
+    for category, keywords in category_keywords:
+        unique = []
+        for keyword in keywords:
+            key = normalize_keyword(keyword)
+            if not key:
+                continue
+            if key in owners:
+                removed.append((category, keyword, owners[key]))
+                continue
+            owners[key] = category
+            unique.append(keyword.strip())
+        assigned.append((category, unique))
+    return assigned, removed
+
+
+def query_report(category_keywords, assigned, removed, location_count):
+    """Resume cuántas búsquedas se ahorran al eliminar las repetidas"""
+    before = sum(1 for _, keywords in category_keywords
+                 for keyword in keywords if normalize_keyword(keyword)) * location_count
+    after = sum(len(keywords) for _, keywords in assigned) * location_count
+    return {
+        "queries_before": before,
+        "queries_after": after,
+        "queries_removed": before - after,
+        "duplicate_keywords": len(removed),
+        "empty_categories": [category for category, keywords in assigned if not keywords]
+    }
+
+
+def format_report(report):
+    text = (f"Búsquedas: {report['queries_after']} de {report['queries_before']} "
+            f"({report['queries_removed']} repetidas eliminadas, "
+            f"{report['duplicate_keywords']} keywords compartidas entre categorías)")
+    if report['empty_categories']:
+        text += f"; sin keywords propias: {', '.join(report['empty_categories'])}"
+    return text
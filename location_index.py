@@ -0,0 +1,414 @@
+"""Catálogo espacial de localizaciones: almacén compacto, índice en rejilla e importación masiva.
+
+Cada localización creada a mano es un archivo de texto en location/. Para
+miles de municipios eso no escala, así que los importados (de un CSV o un
+GeoJSON) se guardan juntos en location/localizaciones_importadas.csv, con el
+mismo prefijo numérico que tendría su archivo. Se usan igual que los demás:
+'1234_location_alcoi' o 'alcoi' en -l, en la interfaz y en los planes.
+
+En memoria, LocationIndex guarda todas las localizaciones en arrays (lat,
+lon y zoom) y un índice en rejilla de celdas de cell_deg grados, de modo que
+"las que están a menos de X km de un punto" o "las de este rectángulo" solo
+miran las celdas que tocan la zona.
+
+Ejemplos:
+    python location_index.py import municipios.csv --zoom 13
+    python location_index.py near 38.97,-0.18,25
+    python location_index.py bbox 38.8,-0.55,39.0,0.1
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from array import array
+
+from coverage_planner import DEFAULT_ZOOM, KM_PER_DEG_LAT
+
+IMPORTED_LOCATIONS_FILE = 'localizaciones_importadas.csv'
+STORE_FIELDS = ("prefix", "name", "zoom", "lat", "lon")
+
+# Tamaño de las celdas del índice (0.1 grados son unos 11 km de latitud)
+GRID_DEG = 0.1
+EARTH_RADIUS_KM = KM_PER_DEG_LAT * 180 / math.pi
+
+# Zooms que admite la API
+ZOOM_LIMITS = (1, 21)
+
+# Un lugar importado con el nombre de otro que está a menos de esta distancia es el mismo
+DUPLICATE_KM = 2.0
+
+# Columnas (o propiedades del GeoJSON) reconocidas al importar, sin distinguir mayúsculas
+NAME_FIELDS = ("name", "nombre", "municipio", "nameunit", "localidad", "ciudad", "city", "town")
+LAT_FIELDS = ("lat", "latitude", "latitud", "y")
+LON_FIELDS = ("lon", "lng", "long", "longitude", "longitud", "x")
+ZOOM_FIELDS = ("zoom",)
+REGION_FIELDS = ("provincia", "province", "region", "comarca", "state", "county")
+
+
+def slugify(text):
+    """'L'Alcúdia de Crespins' -> 'l_alcudia_de_crespins' (como los nombres de archivo del catálogo)"""
+    text = unicodedata.normalize('NFKD', text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distancia de círculo máximo entre dos puntos"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class LocationIndex:
+    """Localizaciones en arrays con un índice espacial en rejilla.
+
+    Cada localización tiene una clave (su nombre de archivo, real o del
+    almacén de importadas), un nombre, zoom, latitud y longitud; las
+    consultas devuelven posiciones en ese orden.
+    """
+
+    def __init__(self, cell_deg=GRID_DEG):
+        self.cell_deg = cell_deg
+        self.keys = []
+        self.names = []
+        self.zooms = array('B')
+        self.lats = array('d')
+        self.lons = array('d')
+        self._by_key = {}
+        self._by_name = {}
+        self._grid = {}  # (fila, columna) -> array de posiciones
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, key, name, zoom, lat, lon):
+        """Añade una localización y devuelve su posición"""
+        i = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.zooms.append(zoom)
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self._by_key[key] = i
+        self._by_name.setdefault(name, i)
+        self._grid.setdefault(self._cell(lat, lon), array('I')).append(i)
+        return i
+
+    def find(self, key):
+        """Posición de una localización por clave o por nombre (None si no existe)"""
+        i = self._by_key.get(key)
+        return self._by_name.get(key) if i is None else i
+
+    def data(self, i):
+        """Datos de la localización como los de un archivo: {'zoom', 'lat', 'lon'}"""
+        return {'zoom': self.zooms[i], 'lat': repr(self.lats[i]), 'lon': repr(self.lons[i])}
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Posiciones de las celdas que tocan el rectángulo"""
+        row0, col0 = self._cell(min_lat, min_lon)
+        row1, col1 = self._cell(max_lat, max_lon)
+        if (row1 - row0 + 1) * (col1 - col0 + 1) > len(self._grid):
+            # Zona enorme: es más rápido recorrer las celdas ocupadas
+            cells = [cell for (row, col), cell in self._grid.items() if row0 <= row <= row1 and col0 <= col <= col1]
+        else:
+            cells = [self._grid[(row, col)] for row in range(row0, row1 + 1) for col in range(col0, col1 + 1)
+                     if (row, col) in self._grid]
+        for cell in cells:
+            yield from cell
+
+    def within_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """Posiciones dentro del rectángulo, en orden del catálogo"""
+        if min_lat > max_lat or min_lon > max_lon:
+            raise ValueError("El rectángulo debe ser min_lat,min_lon,max_lat,max_lon")
+        return sorted(i for i in self._candidates(min_lat, min_lon, max_lat, max_lon)
+                      if min_lat <= self.lats[i] <= max_lat and min_lon <= self.lons[i] <= max_lon)
+
+    def within_radius(self, lat, lon, km):
+        """Posiciones a menos de km kilómetros del punto, de la más cercana a la más lejana"""
+        if km < 0:
+            raise ValueError("La distancia no puede ser negativa")
+        dlat = km / KM_PER_DEG_LAT
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + dlat)))
+        dlon = 180.0 if cos_lat * 180 * KM_PER_DEG_LAT <= km else km / (KM_PER_DEG_LAT * cos_lat)
+        found = []
+        for i in self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon):
+            distance = distance_km(lat, lon, self.lats[i], self.lons[i])
+            if distance <= km:
+                found.append((distance, i))
+        found.sort()
+        return [i for _, i in found]
+
+
+def read_location_store(path):
+    """Filas del almacén de importadas: [(prefijo, nombre, zoom, lat, lon)] y cuántas no eran válidas"""
+    rows, invalid = [], 0
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                place = (int(row['prefix']), row['name'], int(row['zoom']), float(row['lat']), float(row['lon']))
+            except (KeyError, TypeError, ValueError):
+                invalid += 1
+                continue
+            if (not ZOOM_LIMITS[0] <= place[2] <= ZOOM_LIMITS[1]
+                    or not -90 <= place[3] <= 90 or not -180 <= place[4] <= 180):
+                invalid += 1
+                continue
+            rows.append(place)
+    return rows, invalid
+
+
+def append_to_store(path, rows):
+    """Añade filas (prefijo, nombre, zoom, lat, lon) al almacén de importadas"""
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(STORE_FIELDS)
+        writer.writerows(rows)
+
+
+def _field(names, candidates, wanted=None):
+    """Nombre real de la primera columna que coincide (sin distinguir mayúsculas)"""
+    by_lower = {name.strip().lower(): name for name in names or ()}
+    for candidate in ((wanted,) if wanted else candidates):
+        if candidate.lower() in by_lower:
+            return by_lower[candidate.lower()]
+    return None
+
+
+def _number(value):
+    """'38,98' o '38.98' -> 38.98"""
+    text = str(value).strip()
+    if "," in text and "." not in text:
+        text = text.replace(",", ".")
+    return float(text)
+
+
+def _place(properties, fields, lat, lon):
+    name = str(properties.get(fields['name']) or "").strip()
+    if not name or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        return None
+    zoom = properties.get(fields['zoom']) if fields['zoom'] else None
+    return {
+        "name": name,
+        "region": str(properties.get(fields['region']) or "").strip() if fields['region'] else "",
+        "zoom": (max(ZOOM_LIMITS[0], min(ZOOM_LIMITS[1], int(_number(zoom) + 0.5)))
+                 if zoom not in (None, "") else None),
+        "lat": lat,
+        "lon": lon,
+    }
+
+
+def _fields(names, name_field):
+    fields = {
+        "name": _field(names, NAME_FIELDS, name_field),
+        "lat": _field(names, LAT_FIELDS),
+        "lon": _field(names, LON_FIELDS),
+        "zoom": _field(names, ZOOM_FIELDS),
+        "region": _field(names, REGION_FIELDS),
+    }
+    if fields['name'] is None:
+        raise ValueError(f"No hay columna de nombre ({name_field or ', '.join(NAME_FIELDS)})")
+    return fields
+
+
+def _read_csv(path, name_field):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        fields = _fields(reader.fieldnames, name_field)
+        if fields['lat'] is None or fields['lon'] is None:
+            raise ValueError("No hay columnas de latitud y longitud")
+        places, invalid = [], 0
+        for row in reader:
+            try:
+                place = _place(row, fields, _number(row[fields['lat']]), _number(row[fields['lon']]))
+            except (TypeError, ValueError):
+                place = None
+            if place is None:
+                invalid += 1
+            else:
+                places.append(place)
+    return places, invalid
+
+
+def _points(coordinates):
+    """Todos los puntos [lon, lat] de unas coordenadas GeoJSON de cualquier geometría"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for part in coordinates or ():
+        yield from _points(part)
+
+
+def _read_geojson(path, name_field):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    features = data.get('features', []) if data.get('type') == 'FeatureCollection' else [data]
+    names = set()
+    for feature in features:
+        names.update((feature.get('properties') or {}).keys())
+    fields = _fields(names, name_field)
+    places, invalid = [], 0
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        points = list(_points(geometry.get('coordinates')))
+        place = None
+        if points:
+            try:
+                # Polígonos: el centro del rectángulo que los contiene
+                lons, lats = [float(p[0]) for p in points], [float(p[1]) for p in points]
+                place = _place(feature.get('properties') or {}, fields,
+                               (min(lats) + max(lats)) / 2, (min(lons) + max(lons)) / 2)
+            except (TypeError, ValueError, IndexError):
+                place = None
+        if place is None:
+            invalid += 1
+        else:
+            places.append(place)
+    return places, invalid
+
+
+def read_import_file(path, name_field=None):
+    """Lee municipios de un CSV o un GeoJSON (según la extensión).
+
+    Devuelve (lugares, inválidos): cada lugar es un diccionario con name,
+    region, zoom (None si el archivo no lo trae), lat y lon. Lanza ValueError
+    si el archivo no tiene las columnas necesarias.
+    """
+    try:
+        if os.path.splitext(path)[1].lower() in (".geojson", ".json"):
+            return _read_geojson(path, name_field)
+        return _read_csv(path, name_field)
+    except OSError as e:
+        raise ValueError(f"No se pudo leer {path}: {e}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} no es un GeoJSON válido: {e}")
+
+
+def plan_import(places, index, next_prefix, zoom=DEFAULT_ZOOM):
+    """Decide el nombre y el prefijo de cada lugar a importar.
+
+    Un lugar con el nombre de otro que ya está a menos de DUPLICATE_KM se
+    omite (es el mismo, por ejemplo al importar dos veces el mismo archivo);
+    si el otro está lejos, se le añade la provincia o un número. Devuelve
+    (filas para el almacén, omitidos). index se amplía con los nuevos.
+    Lanza ValueError si zoom (el de los lugares que no lo traen) no es válido.
+    """
+    if not ZOOM_LIMITS[0] <= zoom <= ZOOM_LIMITS[1]:
+        raise ValueError(f"zoom fuera de rango ({ZOOM_LIMITS[0]}-{ZOOM_LIMITS[1]}): {zoom}")
+    rows, skipped = [], 0
+    for place in places:
+        base = slugify(place['name'])
+        if not base:
+            skipped += 1
+            continue
+        # El mismo lugar puede estar con su nombre o con los sufijos que se le añaden abajo,
+        # pero no basta con empezar igual ('valencia' no es 'valencia_de_don_juan')
+        suffixes = [r"\d+"] + ([re.escape(slugify(place['region']))] if place['region'] else [])
+        own_names = re.compile(rf"{re.escape(base)}(_({'|'.join(suffixes)}))?")
+        nearby = {index.names[i] for i in index.within_radius(place['lat'], place['lon'], DUPLICATE_KM)}
+        if any(own_names.fullmatch(name) for name in nearby):
+            skipped += 1
+            continue
+        name = base
+        if index.find(name) is not None and place['region']:
+            name = f"{base}_{slugify(place['region'])}"
+        suffix = 2
+        while index.find(name) is not None:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        prefix = next_prefix + len(rows)
+        row = (prefix, name, place['zoom'] or zoom, place['lat'], place['lon'])
+        index.add(f"{prefix}_location_{name}", *row[1:])
+        rows.append(row)
+    return rows, skipped
+
+
+def parse_numbers(text, count, usage):
+    """'38.8,-0.55,39.0,0.1' -> (38.8, -0.55, 39.0, 0.1). Lanza ValueError si no son count números"""
+    try:
+        values = tuple(float(value) for value in text.split(','))
+    except ValueError:
+        values = ()
+    if len(values) != count:
+        raise ValueError(f"El formato es {usage}")
+    return values
+
+
+def parse_point(text):
+    """Argumento lat,lon,km"""
+    try:
+        return parse_numbers(text, 3, "lat,lon,km")
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_bbox(text):
+    """Argumento min_lat,min_lon,max_lat,max_lon"""
+    try:
+        return parse_numbers(text, 4, "min_lat,min_lon,max_lat,max_lon")
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Catálogo espacial de localizaciones")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    imports = commands.add_parser('import', help="Importa municipios de un CSV o un GeoJSON")
+    imports.add_argument('files', nargs='+')
+    imports.add_argument('--zoom', type=int, default=DEFAULT_ZOOM,
+                         help="Zoom de los lugares que no lo traen en el archivo")
+    imports.add_argument('--name-field', default=None, help="Columna o propiedad con el nombre")
+
+    near = commands.add_parser('near', help="Localizaciones a menos de X km de un punto")
+    near.add_argument('point', type=parse_point, help="lat,lon,km")
+
+    bbox = commands.add_parser('bbox', help="Localizaciones dentro de un rectángulo")
+    bbox.add_argument('bbox', type=parse_bbox, help="min_lat,min_lon,max_lat,max_lon")
+    return parser
+
+
+def main(argv=None):
+    from catalog import default_catalog
+
+    args = build_parser().parse_args(argv)
+    catalog = default_catalog()
+    try:
+        if args.command == 'import':
+            for path in args.files:
+                added, skipped, invalid = catalog.import_locations(path, args.zoom, args.name_field)
+                print(f"{path}: {added} localizaciones añadidas, {skipped} ya existían, {invalid} no válidas")
+            return 0
+
+        index = catalog.location_index()
+        if args.command == 'near':
+            lat, lon, km = args.point
+            found = index.within_radius(lat, lon, km)
+        else:
+            found = index.within_bbox(*args.bbox)
+        for i in found:
+            print(f"{index.keys[i].split('_')[0]}. {index.names[i]} ({index.lats[i]:.5f}, {index.lons[i]:.5f})")
+        print(f"{len(found)} localizaciones")
+        return 0
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""Métricas de una ejecución: contadores e histogramas, y perfilado opcional.
+
+Las partes más costosas del proceso (construir el plan, leer los archivos
+del catálogo, enviar cada trabajo, consultar estados, esperar en la cola,
+descargar resultados y la duración total de cada trabajo) anotan sus tiempos
+en el registro de default_metrics(). Al terminar, el registro se puede
+guardar como JSON junto a los resultados o consultarse durante la ejecución
+en formato de texto de Prometheus (serve()).
+
+RunProfiler activa cProfile en todos los hilos y/o tracemalloc y guarda el
+resultado al terminar.
+"""
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites superiores (segundos) de los intervalos de los histogramas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+# Prefijo de los nombres en el formato de Prometheus
+PROMETHEUS_PREFIX = "scraper_"
+
+# Tipos de perfilado
+PROFILE_MODES = ("cpu", "memory", "all")
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class Histogram:
+    """Distribución de valores por intervalos, con suma, mínimo y máximo"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Cuantil aproximado: el límite superior del intervalo que lo contiene"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts) if count},
+        }
+
+
+class MetricsRegistry:
+    """Contadores e histogramas con etiquetas, seguros para usar desde varios hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, run_id=None):
+        """Vacía el registro al empezar una ejecución"""
+        with self._lock:
+            self.run_id = run_id
+            self.started = time.time()
+            self._counters = {}
+            self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Anota en el histograma 'name' lo que tarda el bloque"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time, **labels)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started": self.started,
+                "elapsed": time.time() - self.started,
+                "counters": [{"name": name, "labels": dict(labels), "value": value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                "histograms": [dict(name=name, labels=dict(labels), **histogram.to_dict())
+                               for (name, labels), histogram in sorted(self._histograms.items())],
+            }
+
+    def write_json(self, path):
+        """Guarda las métricas en un archivo JSON"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def to_prometheus(self):
+        """Métricas en el formato de texto de Prometheus"""
+        lines = []
+        with self._lock:
+            declared = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                full_name = PROMETHEUS_PREFIX + name
+                if full_name not in declared:
+                    declared.add(full_name)
+                    lines.append(f"# TYPE {full_name} counter")
+                lines.append(f"{full_name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                full_name = PROMETHEUS_PREFIX + name
+                if full_name not in declared:
+                    declared.add(full_name)
+                    lines.append(f"# TYPE {full_name} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Publica las métricas en http://host:port/metrics en un hilo aparte. Devuelve el servidor"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+_default_metrics = None
+_default_lock = threading.Lock()
+
+
+def default_metrics():
+    """Registro de métricas compartido por todo el proceso"""
+    global _default_metrics
+    with _default_lock:
+        if _default_metrics is None:
+            _default_metrics = MetricsRegistry()
+        return _default_metrics
+
+
+class RunProfiler:
+    """Perfilado de una ejecución: 'cpu' (cProfile), 'memory' (tracemalloc) o 'all'.
+
+    cProfile solo sigue el hilo en el que se activa, así que también se
+    activa en cada hilo que se cree mientras dura el perfilado.
+    """
+
+    def __init__(self, mode):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Perfilado no válido: {mode}")
+        self.cpu = mode in ("cpu", "all")
+        self.memory = mode in ("memory", "all")
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _thread_hook(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Versiones en las que un solo perfilador ya cubre todos los hilos
+            return
+        with self._lock:
+            self._profiles.append(profile)
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(25)
+        if self.cpu:
+            profile = cProfile.Profile()
+            profile.enable()
+            self._profiles.append(profile)
+            threading.setprofile(self._thread_hook)
+        return self
+
+    def stop(self, output_dir, run_id, log=print, top=30):
+        """Detiene el perfilado y guarda los resultados. Devuelve las rutas de los archivos"""
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        # La memoria primero, para no contar lo que ocupa procesar el perfil de CPU
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            mem_path = os.path.join(output_dir, f"{run_id}_memoria.txt")
+            with open(mem_path, 'w', encoding='utf-8') as f:
+                f.write(f"Memoria en uso: {current / 1024 / 1024:.1f} MB, pico: {peak / 1024 / 1024:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:top]:
+                    f.write(f"{stat}\n")
+            paths.append(mem_path)
+        if self.cpu:
+            threading.setprofile(None)
+            with self._lock:
+                profiles, self._profiles = self._profiles, []
+            for profile in profiles:
+                profile.disable()
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            prof_path = os.path.join(output_dir, f"{run_id}_cpu.prof")
+            stats.dump_stats(prof_path)
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(top)
+            txt_path = os.path.join(output_dir, f"{run_id}_cpu.txt")
+            with open(txt_path, 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+            paths += [prof_path, txt_path]
+        for path in paths:
+            log(f"Perfil guardado en {path}")
+        return paths
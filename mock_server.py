@@ -0,0 +1,328 @@
+"""Servidor local que imita la API /api/v1/jobs del Google Maps Scraper.
+
+Sirve para probar y medir el programa sin el scraper real. Implementa lo que
+usa ScraperAPIClient: crear trabajos (POST /api/v1/jobs), listarlos
+(GET /api/v1/jobs), consultar uno (GET /api/v1/jobs/{id}) y descargar su CSV
+(GET /api/v1/jobs/{id}/download). Se puede ajustar la latencia de cada
+petición, la parte de peticiones que fallan con 503, cuántos trabajos se
+ejecutan a la vez, su duración y el tamaño de los CSV.
+
+Los trabajos no hacen nada: al crearlos se calcula cuándo empezarán (según
+los huecos libres) y cuándo terminarán, y su estado se deduce de la hora.
+Los CSV tienen las columnas del scraper real y, como este, no repiten la
+keyword: cada fila lleva en input_id el ID de su keyword, el indicado con
+'keyword #!# id' o uno aleatorio.
+
+Ejemplo:
+    python mock_server.py --port 8080 --workers 4 --job-seconds 5 --error-rate 0.05
+"""
+import argparse
+import csv
+import hashlib
+import heapq
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Columnas del CSV de resultados, en el orden del scraper real
+CSV_COLUMNS = ["input_id", "link", "title", "category", "address", "open_hours", "popular_times", "website",
+               "phone", "plus_code", "review_count", "review_rating", "reviews_per_rating", "latitude",
+               "longitude", "cid", "status", "descriptions", "reviews_link", "thumbnail", "timezone",
+               "price_range", "data_id", "images", "reservations", "order_online", "menu", "owner",
+               "complete_address", "about", "user_reviews", "user_reviews_extended", "emails"]
+
+# Separador de la keyword y su ID propio en cada línea de keywords
+INPUT_ID_SEPARATOR = "#!#"
+
+_JOB_PATH = re.compile(r'^/api/v1/jobs/([^/]+)(/download)?$')
+
+
+class MockScraper:
+    """Estado de los trabajos simulados. Los parámetros de tiempo están en segundos"""
+
+    def __init__(self, workers=4, job_seconds=1.0, keyword_seconds=0.1, rows_per_keyword=20,
+                 failure_rate=0.0, place_pool=None, seed=None, blocked_proxies=(), rows_per_depth=None):
+        self.workers = workers
+        self.job_seconds = job_seconds
+        self.keyword_seconds = keyword_seconds
+        self.rows_per_keyword = rows_per_keyword
+        # Filas por keyword y unidad de depth: con poco depth no se llega a rows_per_keyword
+        self.rows_per_depth = rows_per_depth
+        self.failure_rate = failure_rate
+        # Lugares distintos por keyword y zona; con menos que filas, se repiten entre trabajos
+        self.place_pool = place_pool
+        # Proxies "bloqueados por Google": sus trabajos terminan sin resultados
+        self.blocked_proxies = set(blocked_proxies)
+        self.random = random.Random(seed)
+        self.jobs = {}
+        # Lugares ya devueltos por "nombre, dirección", para las búsquedas de un lugar concreto
+        self.places = {}
+        self._free_at = [0.0] * max(1, workers)
+        self._lock = threading.Lock()
+
+    def create(self, payload):
+        keywords = payload.get('keywords')
+        if not isinstance(keywords, list) or not keywords:
+            raise ValueError("keywords debe ser una lista no vacía")
+        now = time.time()
+        duration = self.job_seconds + self.keyword_seconds * len(keywords)
+        max_time = payload.get('max_time')
+        if max_time:
+            duration = min(duration, float(max_time) * 60)
+        with self._lock:
+            # Primer hueco libre: el trabajo espera en 'pending' hasta entonces
+            start = max(now, heapq.heappop(self._free_at))
+            end = start + duration
+            heapq.heappush(self._free_at, end)
+            job = {
+                "id": str(uuid.uuid4()),
+                "name": payload.get('name', ""),
+                "payload": payload,
+                "created": now,
+                "start": start,
+                "end": end,
+                "failed": self.random.random() < self.failure_rate,
+            }
+            self.jobs[job['id']] = job
+        return job
+
+    def status(self, job, now=None):
+        now = time.time() if now is None else now
+        if now < job['start']:
+            return "pending"
+        if now < job['end']:
+            return "working"
+        return "failed" if job['failed'] else "ok"
+
+    def describe(self, job):
+        return {"id": job['id'], "name": job['name'], "status": self.status(job)}
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [self.describe(job) for job in jobs]
+
+    def results_csv(self, job):
+        """CSV de resultados del trabajo; los lugares dependen de la keyword y la zona.
+
+        Una keyword 'nombre, dirección' de un lugar devuelto por un trabajo con
+        fast_mode da solo ese lugar.
+        Un tercio de los lugares no tiene web y solo hay emails si el payload los pide.
+        """
+        payload = job['payload']
+        lat, lon = float(payload.get('lat', 0)), float(payload.get('lon', 0))
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=CSV_COLUMNS, restval='')
+        writer.writeheader()
+        if self.blocked_proxies.intersection(payload.get('proxies') or ()):
+            return out.getvalue().encode('utf-8')
+        rows = self.rows_per_keyword
+        if self.rows_per_depth and payload.get('depth'):
+            rows = min(rows, int(payload['depth']) * self.rows_per_depth)
+        for line in payload['keywords']:
+            keyword, separator, input_id = line.partition(INPUT_ID_SEPARATOR)
+            keyword = keyword.strip()
+            input_id = input_id.strip() if separator else str(uuid.uuid4())
+            known = self.places.get(keyword)
+            if known is not None:
+                writer.writerow(self._place_row(input_id, known, payload))
+                continue
+            for i in range(rows):
+                n = i % self.place_pool if self.place_pool else i
+                seed = hashlib.blake2b(f"{keyword}|{lat:.2f}|{lon:.2f}|{n}".encode('utf-8'),
+                                       digest_size=8).hexdigest()
+                offset = int(seed[:4], 16) / 65535 - 0.5, int(seed[4:8], 16) / 65535 - 0.5
+                place = {
+                    "title": f"{keyword} {seed[:6]}", "category": keyword,
+                    "address": f"Calle {n}, {seed[8:12]}", "phone": f"6{int(seed[:8], 16) % 10 ** 8:08d}",
+                    "website": f"https://{seed[:10]}.example" if int(seed[-2:], 16) % 3 else "",
+                    "latitude": f"{lat + offset[0] / 10:.6f}", "longitude": f"{lon + offset[1] / 10:.6f}",
+                    "seed": seed,
+                }
+                if payload.get('fast_mode'):
+                    # Solo se recuerdan los del descubrimiento rápido, para no acumular memoria en los benchmarks
+                    self.places[f"{place['title']}, {place['address']}"] = place
+                writer.writerow(self._place_row(input_id, place, payload))
+        return out.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _place_row(input_id, place, payload):
+        seed = place['seed']
+        email = f"info@{seed[:10]}.example" if payload.get('email') and place['website'] else ""
+        return {
+            "input_id": input_id, "link": f"https://maps.example/{seed}", "title": place['title'],
+            "category": place['category'], "address": place['address'], "website": place['website'],
+            "phone": place['phone'], "latitude": place['latitude'], "longitude": place['longitude'],
+            "cid": str(int(seed, 16)), "data_id": f"0x{seed[:8]}:0x{seed[8:]}", "emails": email,
+        }
+
+
+class MockServer:
+    """Servidor HTTP con la API simulada, en un hilo aparte.
+
+    latency es la espera de cada respuesta (más un aleatorio de hasta
+    latency_jitter), error_rate la parte de peticiones que responden 503 y
+    listing=False imita un servidor sin listado de trabajos (404).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, scraper=None, latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, listing=True, seed=None):
+        self.scraper = scraper or MockScraper(seed=seed)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.listing = listing
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Sin Nagle: la cabecera y el cuerpo van en escrituras separadas
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, code, body, content_type="application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _simulate(self):
+                """Aplica la latencia y los errores configurados. Devuelve False si hay que fallar"""
+                with server._lock:
+                    server.requests += 1
+                    delay = server.latency + server.random.uniform(0, server.latency_jitter)
+                    fail = server.random.random() < server.error_rate
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    self._send(503, {"error": "servicio no disponible (simulado)"})
+                return not fail
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                if self.path.rstrip('/') != "/api/v1/jobs":
+                    return self._send(404, {"error": "no encontrado"})
+                if not self._simulate():
+                    return
+                try:
+                    job = server.scraper.create(json.loads(body or b"{}"))
+                except ValueError as e:
+                    return self._send(422, {"error": str(e)})
+                self._send(201, {"id": job['id']})
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path in ("", "/"):
+                    return self._send(200, b"mock google-maps-scraper", "text/plain")
+                if path.rstrip('/') == "/api/v1/jobs":
+                    if not server.listing:
+                        return self._send(404, {"error": "no encontrado"})
+                    if self._simulate():
+                        self._send(200, server.scraper.list())
+                    return
+                match = _JOB_PATH.match(path)
+                if not match:
+                    return self._send(404, {"error": "no encontrado"})
+                if not self._simulate():
+                    return
+                job = server.scraper.get(match.group(1))
+                if job is None:
+                    return self._send(404, {"error": "trabajo no encontrado"})
+                if not match.group(2):
+                    return self._send(200, server.scraper.describe(job))
+                if server.scraper.status(job) != "ok":
+                    return self._send(404, {"error": "resultados no disponibles"})
+                self._send(200, server.scraper.results_csv(job), "text/csv")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API del Google Maps Scraper")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="Segundos de espera por petición")
+    parser.add_argument('--latency-jitter', type=float, default=0.0,
+                        help="Espera aleatoria adicional (0 a N segundos)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Parte de las peticiones que responden 503 (0-1)")
+    parser.add_argument('--no-listing', action='store_true',
+                        help="Sin listado de trabajos (GET /api/v1/jobs responde 404)")
+    parser.add_argument('--workers', type=int, default=4, help="Trabajos que se ejecutan a la vez")
+    parser.add_argument('--job-seconds', type=float, default=1.0, help="Duración fija de cada trabajo")
+    parser.add_argument('--keyword-seconds', type=float, default=0.1, help="Duración añadida por keyword")
+    parser.add_argument('--rows-per-keyword', type=int, default=20, help="Filas del CSV por keyword")
+    parser.add_argument('--rows-per-depth', type=int, default=None,
+                        help="Filas por keyword y unidad de depth del payload (limita rows-per-keyword)")
+    parser.add_argument('--place-pool', type=int, default=None,
+                        help="Lugares distintos por keyword y zona (menos que filas = repetidos)")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Parte de los trabajos que terminan en 'failed' (0-1)")
+    parser.add_argument('--blocked-proxies', nargs='+', default=[], metavar="PROXY",
+                        help="Proxies cuyos trabajos terminan sin resultados, como si Google los bloqueara")
+    parser.add_argument('--seed', type=int, default=None, help="Semilla para repetir la simulación")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    scraper = MockScraper(args.workers, args.job_seconds, args.keyword_seconds, args.rows_per_keyword,
+                          args.failure_rate, args.place_pool, args.seed, args.blocked_proxies,
+                          args.rows_per_depth)
+    server = MockServer(args.host, args.port, scraper, args.latency, args.latency_jitter,
+                        args.error_rate, listing=not args.no_listing, seed=args.seed)
+    print(f"API simulada en {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,211 @@
+"""Descarga de los resultados de los trabajos terminados y unión en un único CSV.
+
+Los CSV se descargan por bloques a disco y se añaden al consolidado fila a
+fila, de modo que el uso de memoria no depende del tamaño de cada archivo.
+"""
+import csv
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from dedup_index import NEW, place_key
+from keyword_batcher import keyword_lookup
+from keyword_planner import normalize_keyword
+from metrics import default_metrics
+
+DEFAULT_RESULTS_DIR = 'results'
+
+# Columnas que se añaden a cada fila del consolidado. Llevan el prefijo job_ para no
+# pisar las del CSV del scraper (su 'category' es la categoría del negocio en Google)
+TAG_COLUMNS = ["job_category", "job_location", "job_keyword", "job_id"]
+
+# Columnas del CSV que indican la keyword que produjo cada fila, por orden de preferencia. El
+# scraper solo escribe input_id, con el ID que se envía con cada keyword (ver tag_keywords)
+KEYWORD_COLUMNS = ("input_id", "query", "keyword")
+
+# Qué hacer con los lugares repetidos: marcarlos en la columna place_status u omitirlos
+DEDUP_MODES = ("flag", "skip")
+
+
+def safe_filename(name):
+    """Quita del nombre los caracteres no válidos en un archivo"""
+    return re.sub(r'[^\w.-]+', '_', name)
+
+
+def keyword_column(fieldnames):
+    """Columna del CSV con la keyword de cada fila, o None si no la hay"""
+    return next((c for c in KEYWORD_COLUMNS if c in (fieldnames or [])), None)
+
+
+class CSVMerger:
+    """Añade filas de varios CSV a un único archivo, etiquetadas con categoría y localización.
+
+    Las etiquetas van en TAG_COLUMNS (job_category, job_location...), así que
+    las columnas del CSV original se conservan tal cual. Si el trabajo indica
+    la categoría de cada keyword (info['keyword_categories']) y el CSV tiene la
+    keyword de cada fila (o su ID en input_id), cada fila se etiqueta con su keyword y la categoría
+    original de esta, aunque el trabajo agrupe varias categorías.
+
+    La cabecera se fija con el primer archivo; las columnas que falten en los
+    siguientes quedan vacías y las que sobren se descartan. Con un índice de
+    duplicados, las filas se procesan por lotes y cada lugar se clasifica como
+    new/duplicate/known.
+    """
+
+    def __init__(self, path, dedup_index=None, dedup_mode="flag", batch_size=1000):
+        self.path = path
+        self.dedup_index = dedup_index
+        self.dedup_mode = dedup_mode
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.place_counts = {}
+        self._lock = threading.Lock()
+        self._fieldnames = None
+        self._file = None
+        self._writer = None
+
+    def append(self, csv_path, info):
+        """Añade las filas de csv_path al consolidado.
+
+        Devuelve (filas añadidas, filas leídas, lugares nuevos); sin índice de
+        duplicados, lugares nuevos es None.
+        """
+        tags = {"job_category": info['category'], "job_location": info['location'], "job_id": info['id']}
+        keyword_categories = info.get('keyword_categories') or {}
+        keywords = {key: (keyword, keyword_categories[keyword])
+                    for key, keyword in keyword_lookup(keyword_categories).items()}
+        added = read = new = 0
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None:
+                return 0, 0, (0 if self.dedup_index is not None else None)
+            column = keyword_column(reader.fieldnames) if keywords else None
+            with self._lock:
+                writer = self._get_writer(reader.fieldnames)
+                while True:
+                    batch = list(islice(reader, self.batch_size))
+                    if not batch:
+                        break
+                    read += len(batch)
+                    batch_added, batch_new = self._write_batch(writer, batch, tags, keywords, column)
+                    added += batch_added
+                    new += batch_new
+                self._file.flush()
+                self.rows_written += added
+        return added, read, (new if self.dedup_index is not None else None)
+
+    def _write_batch(self, writer, batch, tags, keywords=None, column=None):
+        if self.dedup_index is None:
+            statuses = [None] * len(batch)
+        else:
+            statuses = self.dedup_index.classify(
+                [place_key(row) for row in batch], tags['job_category'], tags['job_location']
+            )
+
+        added = new = 0
+        for row, status in zip(batch, statuses):
+            if status is not None:
+                self.place_counts[status] = self.place_counts.get(status, 0) + 1
+                new += status == NEW
+                if self.dedup_mode == "skip" and status != NEW:
+                    continue
+                row['place_status'] = status
+            row.update(tags)
+            if column:
+                match = keywords.get(normalize_keyword(row.get(column) or ""))
+                if match is not None:
+                    row['job_keyword'], row['job_category'] = match
+            writer.writerow(row)
+            added += 1
+        return added, new
+
+    def _get_writer(self, fieldnames):
+        if self._writer is None:
+            tag_columns = TAG_COLUMNS + (["place_status"] if self.dedup_index is not None else [])
+            self._fieldnames = tag_columns + [name for name in fieldnames if name not in tag_columns]
+            self._file = open(self.path, 'w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames,
+                                          restval='', extrasaction='ignore')
+            self._writer.writeheader()
+        return self._writer
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ResultsDownloader:
+    """Descarga en paralelo los CSV de los trabajos que terminan en 'ok' y los une.
+
+    Con varios hosts, client_for(info) devuelve el cliente del host de cada trabajo.
+    on_downloaded(info, ruta_csv) se llama tras unir cada archivo, con las filas
+    añadidas en info['result_rows'], las que traía el CSV en info['source_rows']
+    y los lugares nuevos según el índice de duplicados en info['new_places'].
+    """
+
+    def __init__(self, client, output_dir=DEFAULT_RESULTS_DIR, run_id="resultados", max_workers=4,
+                 log=print, should_continue=None, dedup_index=None, dedup_mode="flag", client_for=None,
+                 on_downloaded=None):
+        self.client = client
+        self.client_for = client_for or (lambda info: self.client)
+        self.on_downloaded = on_downloaded
+        self.output_dir = output_dir
+        self.jobs_dir = os.path.join(output_dir, run_id)
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.merged_path = os.path.join(output_dir, f"{run_id}_resultados.csv")
+        self.merger = CSVMerger(self.merged_path, dedup_index, dedup_mode)
+        self.log = log
+        self.should_continue = should_continue or (lambda: True)
+
+        self.downloaded = 0
+        self.failed = 0
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    def enqueue(self, info):
+        """Programa la descarga de un trabajo terminado (una sola vez por trabajo)"""
+        with self._lock:
+            if info['id'] in self._queued:
+                return
+            self._queued.add(info['id'])
+        self._executor.submit(self._download, info)
+
+    def _download(self, info):
+        if not self.should_continue():
+            return
+        dest_path = os.path.join(self.jobs_dir, f"{safe_filename(info['name'])}.csv")
+        metrics = default_metrics()
+        try:
+            with metrics.timer("download_seconds"):
+                size = self.client_for(info).download_results(info['id'], dest_path)
+            with metrics.timer("merge_seconds"):
+                rows, source_rows, new_places = self.merger.append(dest_path, info)
+            info['results_file'] = dest_path
+            info['result_rows'] = rows
+            info['source_rows'] = source_rows
+            info['new_places'] = new_places
+            if self.on_downloaded:
+                self.on_downloaded(info, dest_path)
+        except Exception as e:
+            metrics.inc("downloads_total", result="failed")
+            with self._lock:
+                self.failed += 1
+            self.log(f"Error al descargar los resultados de {info['name']}: {str(e)}")
+            return
+
+        metrics.inc("downloads_total", result="ok")
+        metrics.inc("download_bytes_total", size)
+        metrics.inc("result_rows_total", rows)
+        with self._lock:
+            self.downloaded += 1
+        self.log(f"Resultados de {info['name']} descargados ({rows} filas, {size / 1024:.0f} KB)")
+
+    def wait(self):
+        """Espera a que terminen las descargas pendientes y cierra el consolidado"""
+        self._executor.shutdown(wait=True)
+        self.merger.close()
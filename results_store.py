@@ -0,0 +1,256 @@
+"""Almacén columnar (Parquet) de los resultados, con consultas rápidas.
+
+Los resultados de cada ejecución se añaden a un conjunto de archivos Parquet
+particionado por categoría, localización y fecha de ejecución
+(job_category=.../job_location=.../run_date=.../). La lectura del CSV y la escritura
+se hacen por bloques con pyarrow, sin pasar fila a fila por Python, y las
+consultas solo leen las columnas y particiones que necesitan.
+
+Necesita pyarrow (pip install pyarrow); sin él, crear un ResultsStore lanza
+MissingDependencyError con las instrucciones.
+
+Ejemplos:
+    python results_store.py ingest results/20240101_120000_resultados.csv
+    python results_store.py query --where job_category=dentista job_location=gandia "website!=" "emails=" \\
+        --columns title phone website --output dentistas_sin_email.csv
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import uuid
+
+DEFAULT_STORE_DIR = 'results_store'
+
+# Columnas por las que se particiona el almacén
+PARTITION_COLUMNS = ("job_category", "job_location", "run_date")
+
+# Operadores de los filtros, por orden de comprobación ('!=' antes que '=')
+FILTER_OPERATORS = ("!=", "~", "=")
+
+
+class MissingDependencyError(ImportError):
+    """Falta una dependencia opcional"""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.csv  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+    except ImportError as e:
+        raise MissingDependencyError(
+            "El almacén de resultados necesita pyarrow. Instálalo con: pip install pyarrow"
+        ) from e
+
+
+def parse_filter(text):
+    """'website!=' -> ('website', '!=', ''); 'title~dental' -> ('title', '~', 'dental')"""
+    for operator in FILTER_OPERATORS:
+        column, found, value = text.partition(operator)
+        if found and column.strip():
+            return column.strip(), operator, value
+    raise ValueError(f"Filtro no válido: '{text}' (columna=valor, columna!=valor o columna~texto)")
+
+
+class ResultsStore:
+    """Conjunto Parquet particionado con los resultados de todas las ejecuciones"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        _require_pyarrow()
+        self.root = root
+
+    def _partitioning(self):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        return ds.partitioning(pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+                               flavor="hive")
+
+    def ingest_csv(self, csv_path, run_id, block_size=8 * 1024 * 1024):
+        """Añade un CSV de resultados (por ejemplo, el consolidado de una ejecución).
+
+        Todas las columnas se guardan como texto para que los archivos de
+        distintas ejecuciones sean compatibles. Cada llamada escribe archivos
+        nuevos, aunque se repita el run_id. Devuelve las filas añadidas.
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        import pyarrow.dataset as ds
+
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            header = next(csv.reader(f), None)
+        if not header:
+            return 0
+
+        run_date = time.strftime('%Y-%m-%d')
+        reader = pacsv.open_csv(
+            csv_path,
+            read_options=pacsv.ReadOptions(block_size=block_size),
+            convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in header},
+                                                 strings_can_be_null=False)
+        )
+        columns = [name for name in header if name not in ("run_date", "run_id")]
+        for column in PARTITION_COLUMNS[:2]:
+            if column not in columns:
+                columns.append(column)
+        schema = pa.schema([(name, pa.string()) for name in columns + ["run_date", "run_id"]])
+        rows = 0
+
+        def batches():
+            nonlocal rows
+            for batch in reader:
+                count = batch.num_rows
+                rows += count
+                arrays = [batch.column(name) if name in batch.schema.names else pa.nulls(count, pa.string())
+                          for name in columns]
+                arrays += [pa.array([run_date] * count, pa.string()), pa.array([run_id] * count, pa.string())]
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+        ds.write_dataset(
+            pa.RecordBatchReader.from_batches(schema, batches()), self.root, format="parquet",
+            # Un sufijo por ingesta: con el mismo run_id, otro CSV no pisa los archivos del anterior
+            partitioning=self._partitioning(),
+            basename_template=f"{run_id}-{uuid.uuid4().hex[:12]}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore"
+        )
+        return rows
+
+    def dataset(self):
+        """Dataset de pyarrow con el esquema unificado de todos los archivos"""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        if not os.path.isdir(self.root):
+            raise ValueError(f"No hay resultados en {self.root}")
+        dataset = ds.dataset(self.root, format="parquet", partitioning=self._partitioning())
+        # Cada ejecución puede traer columnas distintas: se unen todas
+        schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+        schema = pa.unify_schemas(schemas + [self._partitioning().schema]) if schemas else dataset.schema
+        return ds.dataset(self.root, schema=schema, format="parquet", partitioning=self._partitioning())
+
+    @staticmethod
+    def filter_expression(filters):
+        """Combina filtros (columna, operador, valor) en una expresión de pyarrow.
+
+        '=' con valor vacío busca celdas vacías y '!=' con valor vacío, no vacías;
+        '~' busca el texto sin distinguir mayúsculas.
+        """
+        import pyarrow.compute as pc
+
+        expression = None
+        for column, operator, value in filters:
+            field = pc.field(column)
+            if operator == "~":
+                condition = pc.match_substring(field, value, ignore_case=True)
+            elif value == "":
+                empty = field.is_null() | (field == "")
+                condition = empty if operator == "=" else ~empty
+            else:
+                condition = (field == value) if operator == "=" else (field.is_null() | (field != value))
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    def scanner(self, filters=(), columns=None, batch_size=64 * 1024):
+        """Lector de las filas que cumplen los filtros, solo con las columnas pedidas"""
+        dataset = self.dataset()
+        unknown = [name for name in list(columns or []) + [f[0] for f in filters]
+                   if name not in dataset.schema.names]
+        if unknown:
+            raise ValueError(f"Columnas desconocidas: {', '.join(unknown)} "
+                             f"(disponibles: {', '.join(dataset.schema.names)})")
+        return dataset.scanner(columns=list(columns) if columns else None,
+                               filter=self.filter_expression(filters), batch_size=batch_size)
+
+    def scan(self, filters=(), columns=None):
+        """Lotes de filas que cumplen los filtros"""
+        return self.scanner(filters, columns).to_batches()
+
+    def export(self, output_path, filters=(), columns=None, limit=None):
+        """Guarda en CSV o Parquet (según la extensión) las filas que cumplen los filtros.
+
+        Devuelve cuántas filas se escribieron.
+        """
+        import pyarrow.csv as pacsv
+        import pyarrow.parquet as pq
+
+        scanner = self.scanner(filters, columns)
+        if output_path.endswith(".parquet"):
+            writer = pq.ParquetWriter(output_path, scanner.projected_schema)
+        else:
+            writer = pacsv.CSVWriter(output_path, scanner.projected_schema)
+        written = 0
+        with writer:
+            for batch in scanner.to_batches():
+                if limit is not None:
+                    if written >= limit:
+                        break
+                    batch = batch.slice(0, limit - written)
+                writer.write_batch(batch)
+                written += batch.num_rows
+        return written
+
+    def count(self, filters=()):
+        return self.scanner(filters, columns=[]).count_rows()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Almacén columnar de resultados (Parquet)")
+    parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help="Carpeta del almacén")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="Añade CSV de resultados al almacén")
+    ingest.add_argument('csv_files', nargs='+')
+    ingest.add_argument('--run-id', default=None,
+                        help="Identificador de la ejecución (por defecto, el del nombre del archivo)")
+
+    query = commands.add_parser('query', help="Filtra y exporta resultados")
+    query.add_argument('--where', nargs='+', default=[], metavar="FILTRO",
+                       help="columna=valor, columna!=valor o columna~texto; vacío tras '=' o '!=' "
+                            "busca celdas vacías o no vacías")
+    query.add_argument('--columns', nargs='+', default=None, help="Columnas a mostrar o exportar")
+    query.add_argument('--limit', type=int, default=None, help="Máximo de filas")
+    query.add_argument('--output', default=None, help="Archivo .csv o .parquet donde guardar el resultado")
+    query.add_argument('--count', action='store_true', help="Solo cuenta las filas")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        store = ResultsStore(args.store_dir)
+        if args.command == 'ingest':
+            for path in args.csv_files:
+                run_id = args.run_id or os.path.basename(path).split('_resultados')[0]
+                start = time.perf_counter()
+                rows = store.ingest_csv(path, run_id)
+                print(f"{path}: {rows} filas añadidas en {time.perf_counter() - start:.1f} s")
+            return 0
+
+        filters = [parse_filter(text) for text in args.where]
+        start = time.perf_counter()
+        if args.count:
+            print(f"{store.count(filters)} filas ({time.perf_counter() - start:.2f} s)")
+        elif args.output:
+            rows = store.export(args.output, filters, args.columns, args.limit)
+            print(f"{rows} filas guardadas en {args.output} ({time.perf_counter() - start:.2f} s)")
+        else:
+            limit = args.limit if args.limit is not None else 20
+            writer = csv.writer(sys.stdout)
+            shown = 0
+            for batch in store.scan(filters, args.columns):
+                if shown == 0:
+                    writer.writerow(batch.schema.names)
+                for row in batch.slice(0, limit - shown).to_pylist():
+                    writer.writerow(row.values())
+                shown += min(batch.num_rows, limit - shown)
+                if shown >= limit:
+                    break
+        return 0
+    except (ValueError, MissingDependencyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,358 @@
+"""Ejecución por línea de comandos, sin interfaz gráfica.
+
+Ejemplos:
+    python scraper_cli.py --list
+    python scraper_cli.py -c dentista fontaneria -l gandia oliva --radius 5000
+    python scraper_cli.py -c all -l all --no-wait
+    python scraper_cli.py -c all -l all --host http://a:8080,http://b:8080*2
+    python scraper_cli.py -c all -l all --batch-size auto
+    python scraper_cli.py -c dentista --bbox 38.8,-0.55,39.0,0.1 --cell-radius 5000 --plan-only
+    python scraper_cli.py -c dentista --near 38.97,-0.18,25
+    python scraper_cli.py --gui
+"""
+import argparse
+import os
+import sys
+import threading
+from datetime import datetime
+
+from backend_pool import PLACEMENTS
+from dedup_index import DEFAULT_INDEX_PATH
+from enrichment import DEFAULT_ENRICH_BATCH, DEFAULT_ENRICH_TTL, discovery_jobs, run_enrichment
+from freshness import DEFAULT_FRESHNESS_PATH, FreshnessStore
+from job_ledger import DEFAULT_LEDGER_PATH, JobLedger
+from job_queue import parse_priority
+from keyword_batcher import parse_batch_size
+from location_index import parse_bbox, parse_point
+from metrics import PROFILE_MODES, RunProfiler, default_metrics
+from proxy_pool import ProxyPool, load_proxies
+from results_downloader import DEDUP_MODES, DEFAULT_RESULTS_DIR
+from results_store import ResultsStore
+from scraper_core import (
+    JobPipeline, batch_plan, category_name_from_file, coverage_locations, filter_due_jobs,
+    format_status_counts, get_keyword_files, get_location_files, get_location_files_near,
+    location_name_from_file, plan_jobs_for_locations, read_locations, select_files, tune_plan
+)
+
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    # Varios hilos escriben a la vez; el cerrojo evita líneas mezcladas
+    with _print_lock:
+        print(f"{datetime.now().strftime('%H:%M:%S')} - {message}", flush=True)
+
+
+def priority_arg(text):
+    try:
+        return parse_priority(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def batch_size_arg(text):
+    try:
+        return parse_batch_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Google Maps Scraper - ejecución por lotes")
+    parser.add_argument('--gui', action='store_true', help="Abre la interfaz gráfica")
+    parser.add_argument('--list', action='store_true', help="Muestra las categorías y localizaciones disponibles")
+    parser.add_argument('-c', '--categories', nargs='+', default=[],
+                        help="Categorías por nombre o prefijo numérico ('all' para todas)")
+    parser.add_argument('-l', '--locations', nargs='+', default=[],
+                        help="Localizaciones por nombre o prefijo numérico ('all' para todas)")
+    parser.add_argument('--near', type=parse_point, default=None, metavar="LAT,LON,KM",
+                        help="Añade las localizaciones del catálogo a menos de KM kilómetros del punto")
+    parser.add_argument('--host', default="http://localhost:8080",
+                        help="Host de la API, o varios separados por comas ('http://b:8080*2' da peso 2)")
+    parser.add_argument('--placement', choices=PLACEMENTS, default="least-loaded",
+                        help="Reparto de trabajos entre hosts: el menos cargado o por turnos ponderados")
+    parser.add_argument('--job-name', default=f"Trabajo_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                        help="Prefijo del nombre de los trabajos")
+    parser.add_argument('--radius', type=int, default=10000, help="Radio en metros")
+    parser.add_argument('--depth', type=int, default=10, help="Profundidad de búsqueda")
+    parser.add_argument('--max-time', type=int, default=15, help="Tiempo máximo por trabajo (minutos)")
+    parser.add_argument('--wait-time', type=int, default=30, help="Tiempo de espera total (minutos)")
+    parser.add_argument('--max-in-flight', type=int, default=4, help="Envíos simultáneos a la API")
+    parser.add_argument('--max-active', type=int, default=0,
+                        help="Máximo de trabajos pendientes o en curso en el servidor; activa el regulador "
+                             "que frena ante 429/5xx o latencia creciente (0 = sin límite)")
+    parser.add_argument('--submit-rate', type=float, default=2.0,
+                        help="Máximo de envíos por segundo con el regulador activo")
+    parser.add_argument('--weight', nargs='+', type=priority_arg, default=[],
+                        help="Peso de una categoría o localización: cat:nombre=3 loc:nombre=2 "
+                             "(se envía antes lo de más peso; por defecto 1)")
+    parser.add_argument('--deadline', nargs='+', type=priority_arg, default=[],
+                        help="Plazo en minutos desde el inicio: cat:nombre=10 loc:nombre=5 "
+                             "(los trabajos con plazo se envían primero)")
+    parser.add_argument('--batch-size', type=batch_size_arg, default=None,
+                        help="Keywords por trabajo: divide las categorías grandes y agrupa las pequeñas "
+                             "de una misma localización; 'auto' lo calcula con el tiempo por keyword de "
+                             "ejecuciones anteriores (por defecto, un trabajo por categoría)")
+    parser.add_argument('--coverage', action='store_true',
+                        help="Cubre la zona de las localizaciones con celdas hexagonales sin solape")
+    parser.add_argument('--bbox', type=parse_bbox, default=None,
+                        help="Zona a cubrir con celdas: min_lat,min_lon,max_lat,max_lon (implica --coverage)")
+    parser.add_argument('--cell-radius', type=int, default=None,
+                        help="Radio de cada celda en metros (por defecto, --radius)")
+    parser.add_argument('--auto-tune', action='store_true',
+                        help="Ajusta depth y max_time de cada categoría y localización según lo que "
+                             "rindieron los trabajos anteriores del registro")
+    parser.add_argument('--two-phase', action='store_true',
+                        help="Primero busca lugares en modo rápido sin emails y después solo los emails "
+                             "de los lugares con web nuevos o caducados")
+    parser.add_argument('--enrich-ttl', type=float, default=DEFAULT_ENRICH_TTL,
+                        help="Horas tras las que se vuelven a buscar los emails de un lugar (modo en dos fases)")
+    parser.add_argument('--enrich-batch', type=int, default=DEFAULT_ENRICH_BATCH,
+                        help="Lugares por trabajo en la búsqueda de emails (modo en dos fases)")
+    parser.add_argument('--plan-only', action='store_true',
+                        help="Muestra el plan sin enviar ningún trabajo")
+    parser.add_argument('--keep-duplicate-keywords', action='store_true',
+                        help="No elimina las keywords repetidas entre categorías")
+    parser.add_argument('--ledger', default=DEFAULT_LEDGER_PATH,
+                        help="Archivo SQLite donde se registran los trabajos enviados")
+    parser.add_argument('--proxies', default=None, metavar="ARCHIVO",
+                        help="Archivo con un proxy por línea; cada trabajo recibe los más sanos por turnos")
+    parser.add_argument('--proxies-per-job', type=int, default=1, help="Proxies que se asignan a cada trabajo")
+    parser.add_argument('--proxy-cooldown', type=float, default=300,
+                        help="Segundos de pausa de un proxy tras varios resultados vacíos o fallidos seguidos")
+    parser.add_argument('--resume', action='store_true',
+                        help="Omite los pares categoría/localización ya enviados o terminados")
+    parser.add_argument('--reuse-window', type=float, default=0,
+                        help="Horas durante las que un trabajo idéntico en curso o terminado se reutiliza "
+                             "en lugar de volver a enviarlo (0 = nunca)")
+    parser.add_argument('--download-dir', default=DEFAULT_RESULTS_DIR,
+                        help="Carpeta donde se descargan y unen los resultados")
+    parser.add_argument('--download-workers', type=int, default=4, help="Descargas simultáneas")
+    parser.add_argument('--no-download', action='store_true',
+                        help="No descarga los resultados de los trabajos terminados")
+    parser.add_argument('--results-store', default=None, metavar="CARPETA",
+                        help="Añade también los resultados a un almacén Parquet en esta carpeta "
+                             "(necesita pyarrow; consultas con results_store.py)")
+    parser.add_argument('--dedup-index', default=DEFAULT_INDEX_PATH,
+                        help="Archivo SQLite con los lugares ya vistos")
+    parser.add_argument('--dedup-mode', choices=DEDUP_MODES + ("off",), default="flag",
+                        help="Marca (flag) u omite (skip) los lugares repetidos; 'off' desactiva el índice")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Solo busca las keywords cuyos datos superan el TTL o que probablemente han cambiado")
+    parser.add_argument('--ttl', type=float, default=168,
+                        help="Horas tras las que los datos de una keyword se consideran caducados (modo incremental)")
+    parser.add_argument('--change-threshold', type=float, default=0.2,
+                        help="Parte estimada de lugares cambiados a partir de la cual se vuelve a buscar antes del TTL")
+    parser.add_argument('--freshness-db', default=DEFAULT_FRESHNESS_PATH,
+                        help="Archivo SQLite con la frescura de los datos de cada keyword y localización")
+    parser.add_argument('--metrics-dir', default=None,
+                        help="Carpeta donde guardar las métricas de la ejecución (<ejecución>_metrics.json)")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Publica las métricas en formato Prometheus en http://127.0.0.1:PUERTO/metrics "
+                             "mientras dura la ejecución")
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None,
+                        help="Perfila la ejecución con cProfile (cpu), tracemalloc (memory) o ambos (all); "
+                             "el resultado se guarda en --metrics-dir o en --download-dir")
+    parser.add_argument('--no-wait', action='store_true',
+                        help="Termina tras enviar los trabajos, sin seguir su estado")
+    return parser
+
+
+def list_catalog():
+    print("Categorías:")
+    for f in get_keyword_files():
+        print(f"  {f.split('_')[0]}. {category_name_from_file(f)}")
+    print("Localizaciones:")
+    for f in get_location_files():
+        print(f"  {f.split('_')[0]}. {location_name_from_file(f)}")
+
+
+def run_batch(args, stop_event):
+    """Planifica, envía y sigue los trabajos. Devuelve el código de salida"""
+    run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+    metrics = default_metrics()
+    metrics.reset(run_id)
+    server = metrics.serve(args.metrics_port) if args.metrics_port else None
+    if server is not None:
+        log(f"Métricas en http://127.0.0.1:{args.metrics_port}/metrics")
+    profiler = RunProfiler(args.profile).start() if args.profile else None
+    try:
+        return _run_batch(args, stop_event, run_id)
+    finally:
+        if profiler is not None:
+            profiler.stop(args.metrics_dir or args.download_dir, run_id, log=log)
+        if args.metrics_dir:
+            path = metrics.write_json(os.path.join(args.metrics_dir, f"{run_id}_metrics.json"))
+            log(f"Métricas guardadas en {path}")
+        if server is not None:
+            server.shutdown()
+
+
+def _run_batch(args, stop_event, run_id):
+    if args.two_phase and args.no_download:
+        raise ValueError("El modo en dos fases necesita descargar los resultados (sin --no-download)")
+    # Sin pyarrow se avisa antes de enviar nada
+    results_store = ResultsStore(args.results_store) if args.results_store and not args.no_download else None
+    proxy_pool = (ProxyPool(load_proxies(args.proxies), args.proxies_per_job, args.proxy_cooldown, log=log)
+                  if args.proxies else None)
+
+    keyword_files = select_files(get_keyword_files(), args.categories, category_name_from_file)
+    location_files = (select_files(get_location_files(), args.locations, location_name_from_file)
+                      if args.locations else [])
+    if args.near:
+        near = get_location_files_near(*args.near)
+        log(f"Localizaciones a menos de {args.near[2]:g} km: {len(near)}")
+        location_files += [f for f in near if f not in location_files]
+
+    if args.coverage or args.bbox:
+        locations = coverage_locations(location_files, args.radius, args.cell_radius, args.bbox, log=log)
+        radius = args.cell_radius or args.radius
+    else:
+        locations = read_locations(location_files)
+        radius = args.radius
+
+    jobs = plan_jobs_for_locations(keyword_files, locations, args.job_name,
+                                   radius, args.depth, args.max_time, log=log,
+                                   dedupe_keywords=not args.keep_duplicate_keywords)
+
+    freshness = FreshnessStore(args.freshness_db)
+    try:
+        if args.incremental:
+            jobs = filter_due_jobs(jobs, freshness, args.ttl, args.change_threshold, log=log)
+        ledger = JobLedger(args.ledger)
+        try:
+            jobs = batch_plan(jobs, args.batch_size, args.max_time, ledger, log=log, fast_mode=args.two_phase)
+            if args.auto_tune:
+                jobs = tune_plan(jobs, ledger, args.resume, run_id, log=log, fast_mode=args.two_phase)
+            if args.two_phase:
+                jobs = discovery_jobs(jobs)
+            log(f"Total de trabajos a ejecutar: {len(jobs)}")
+            if args.plan_only:
+                for job in jobs:
+                    payload = job['payload']
+                    log(f"{job['name']}: {len(payload['keywords'])} keywords en "
+                        f"{payload['lat']}, {payload['lon']} (radio {payload['radius']} m, "
+                        f"depth {payload['depth']}, max_time {payload['max_time']} min)")
+                return 0
+            return _run_pipeline(args, jobs, ledger, freshness, results_store, proxy_pool, stop_event, run_id)
+        finally:
+            ledger.close()
+    finally:
+        freshness.close()
+
+
+def _run_pipeline(args, jobs, ledger, freshness, results_store, proxy_pool, stop_event, run_id):
+    def make_pipeline(phase_run_id, **overrides):
+        options = dict(
+            should_continue=lambda: not stop_event.is_set(),
+            ledger=ledger, resume=args.resume,
+            download_dir=None if args.no_download else args.download_dir,
+            download_workers=args.download_workers,
+            dedup_index_path=None if args.dedup_mode == "off" else args.dedup_index,
+            dedup_mode=args.dedup_mode,
+            max_active=args.max_active, submit_rate=args.submit_rate,
+            placement=args.placement,
+            weights={(kind, name): value for kind, name, value in args.weight},
+            deadlines={(kind, name): value for kind, name, value in args.deadline},
+            freshness=freshness, run_id=phase_run_id, reuse_window=args.reuse_window,
+            results_store=results_store, proxy_pool=proxy_pool
+        )
+        options.update(overrides)
+        return JobPipeline(args.host, args.max_in_flight, args.wait_time, log=log, **options)
+
+    # En dos fases, el consolidado se guarda en el almacén cuando ya tiene los emails
+    pipeline = make_pipeline(run_id, results_store=None) if args.two_phase else make_pipeline(run_id)
+    jobs_info = pipeline.submit(jobs)
+    if stop_event.is_set():
+        pipeline.close()
+        log(f"Ejecución cancelada por el usuario ({len(jobs_info)} trabajos enviados)")
+        return 130
+
+    log(f"Todos los trabajos ({len(jobs_info)}) han sido enviados al servidor.")
+    if args.no_wait:
+        pipeline.close()
+        return 0 if all(info['id'] != "unknown" for info in jobs_info) else 1
+
+    tracker = pipeline.track(
+        jobs_info,
+        on_status_change=lambda info, old, new: log(f"Trabajo {info['name']}: {old or '-'} -> {new}")
+    )
+    if stop_event.is_set():
+        log("Seguimiento de trabajos cancelado por el usuario")
+        return 130
+
+    counts = tracker.summary()
+    log(f"Resumen: {format_status_counts(counts)}")
+    code = 0 if set(counts) <= {"ok"} else 1
+    if args.two_phase:
+        code = max(code, _run_enrichment_phase(args, pipeline, make_pipeline, results_store, stop_event, run_id))
+    return code
+
+
+def _run_enrichment_phase(args, pipeline, make_pipeline, results_store, stop_event, run_id):
+    """Segunda fase del modo en dos fases: emails de los lugares nuevos o caducados"""
+    merged_path = pipeline.downloader.merged_path
+    tracker = run_enrichment(
+        # Sin índice de duplicados ni frescura: los resultados son de lugares ya contados
+        lambda phase_run_id: make_pipeline(phase_run_id, dedup_index_path=None, freshness=None,
+                                           results_store=None),
+        merged_path, args.dedup_index, run_id, args.job_name, args.max_time,
+        args.enrich_ttl, args.enrich_batch, log=log, should_continue=lambda: not stop_event.is_set()
+    )
+    if stop_event.is_set():
+        log("Búsqueda de emails cancelada por el usuario")
+        return 130
+    if results_store is not None and os.path.exists(merged_path):
+        rows = results_store.ingest_csv(merged_path, run_id)
+        log(f"{rows} filas añadidas al almacén de resultados ({results_store.root})")
+    if tracker is None:
+        return 0
+    counts = tracker.summary()
+    log(f"Resumen de la búsqueda de emails: {format_status_counts(counts)}")
+    return 0 if set(counts) <= {"ok"} else 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.gui:
+        # Tk solo se importa al abrir la interfaz
+        from scraper_gui import main as gui_main
+        gui_main()
+        return 0
+
+    if args.list:
+        list_catalog()
+        return 0
+
+    if not args.categories or not (args.locations or args.near or args.bbox):
+        print("Debes indicar al menos una categoría (-c) y una localización (-l, --near) o una zona (--bbox)",
+              file=sys.stderr)
+        return 2
+
+    # El lote corre en un hilo para que Ctrl+C pueda cancelar de forma ordenada
+    stop_event = threading.Event()
+    result = {}
+
+    def target():
+        try:
+            result['code'] = run_batch(args, stop_event)
+        except (ValueError, ImportError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            result['code'] = 2
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+    except KeyboardInterrupt:
+        log("Cancelando ejecución...")
+        stop_event.set()
+        thread.join()
+    return result.get('code', 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
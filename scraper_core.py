@@ -0,0 +1,706 @@
+"""Planificación y envío de trabajos, sin dependencias de la interfaz gráfica.
+
+Lo usan tanto la interfaz Tk (scraper_gui.py) como la línea de comandos
+(scraper_cli.py).
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from auto_tuner import ANY_LOCATION, format_tuning, recommend, tune_jobs
+from backend_pool import BackendPool
+from catalog import default_catalog, parse_filename
+from coverage_planner import (
+    DEFAULT_ZOOM, Region, centres_report, format_coverage_report, plan_coverage
+)
+from dedup_index import DUPLICATE, KNOWN, NEW, DedupIndex
+from governor import SubmitGovernor
+from job_ledger import payload_hash
+from job_queue import PriorityJobQueue
+from keyword_batcher import batch_jobs, job_keyword_categories, keywords_per_job, tag_keywords
+from keyword_planner import assign_keywords, format_report, query_report
+from metrics import default_metrics
+from results_downloader import ResultsDownloader
+from status_tracker import FINAL_STATUSES, JobStatusTracker
+
+# Funciones del scraper que vamos a reutilizar
+def get_keyword_files():
+    """Obtiene todos los archivos de keywords ordenados por su prefijo numérico"""
+    return [entry.filename for entry in default_catalog().categories()]
+
+def get_location_files():
+    """Obtiene todas las localizaciones (archivos e importadas) ordenadas por su prefijo numérico"""
+    return default_catalog().location_keys()
+
+def get_location_files_near(lat, lon, km):
+    """Localizaciones a menos de km kilómetros del punto, de la más cercana a la más lejana"""
+    index = default_catalog().location_index()
+    return [index.keys[i] for i in index.within_radius(lat, lon, km)]
+
+def read_keywords(keyword_file):
+    """Lee keywords del archivo seleccionado (desde la caché del catálogo)"""
+    return default_catalog().keywords(keyword_file)
+
+def read_location(location_file):
+    """Lee datos de localización del archivo seleccionado (desde la caché del catálogo)"""
+    return default_catalog().location_data(location_file)
+
+def category_name_from_file(keyword_file):
+    """'8_keywords_fontaneria.txt' -> 'fontaneria'"""
+    return parse_filename(keyword_file)[2]
+
+def location_name_from_file(location_file):
+    """'4_location_denia' -> 'denia'"""
+    return parse_filename(location_file)[2]
+
+def select_files(files, selectors, name_from_file):
+    """Filtra archivos por nombre o por prefijo numérico. 'all' selecciona todos.
+
+    Lanza ValueError si algún selector no corresponde a ningún archivo.
+    """
+    if not selectors or 'all' in selectors:
+        return list(files)
+
+    selected = []
+    for selector in selectors:
+        matches = [f for f in files
+                   if str(parse_filename(f)[0]) == selector or name_from_file(f) == selector]
+        if not matches:
+            raise ValueError(f"No existe '{selector}'")
+        for f in matches:
+            if f not in selected:
+                selected.append(f)
+    return selected
+
+
+# Campos comunes a todos los payloads; cada trabajo solo añade los suyos
+PAYLOAD_TEMPLATE = {
+    "lang": "es",
+    "fast_mode": False, #True = No emails
+    "email": True,
+    "proxies": []
+}
+
+def payload_template(radius, depth, max_time, **fields):
+    """Plantilla con los parámetros comunes a todos los trabajos de un plan"""
+    return dict(PAYLOAD_TEMPLATE, radius=radius, depth=depth, max_time=max_time, **fields)
+
+def build_payload(job_name, keywords, location_data, radius=None, depth=None, max_time=None, template=None):
+    """Construye el payload de un trabajo para la API a partir de la plantilla del plan"""
+    if template is None:
+        template = payload_template(radius, depth, max_time)
+    return dict(
+        template,
+        name=job_name,
+        keywords=keywords,
+        zoom=location_data['zoom'],
+        lat=location_data['lat'],
+        lon=location_data['lon'],
+        proxies=list(template.get('proxies', []))
+    )
+
+def api_payload(payload, proxies=None):
+    """Payload tal como se envía: cada keyword con su ID (ver tag_keywords) y los proxies asignados.
+
+    Es una copia: el payload del plan (y su hash) no cambia.
+    """
+    payload = dict(payload, keywords=tag_keywords(payload['keywords']))
+    if proxies:
+        payload['proxies'] = proxies
+    return payload
+
+def read_category_keywords(keyword_files):
+    """Lee las keywords de cada categoría: [(categoría, keywords), ...]"""
+    return [(category_name_from_file(f), read_keywords(f)) for f in keyword_files]
+
+def read_locations(location_files):
+    """Lee las localizaciones: [(nombre, datos), ...]"""
+    return [(location_name_from_file(f), read_location(f)) for f in location_files]
+
+def plan_jobs(keyword_files, location_files, job_prefix, radius, depth, max_time, log=print,
+              dedupe_keywords=True):
+    """Construye la lista de trabajos (categoría x localización).
+
+    Cada trabajo es un diccionario con 'name', 'category', 'location' y 'payload'.
+    Con dedupe_keywords, cada keyword repetida entre categorías se busca una sola vez.
+    """
+    return plan_jobs_for_locations(keyword_files, read_locations(location_files), job_prefix,
+                                   radius, depth, max_time, log, dedupe_keywords)
+
+def plan_jobs_for_locations(keyword_files, locations, job_prefix, radius, depth, max_time, log=print,
+                            dedupe_keywords=True):
+    """Como plan_jobs, pero con las localizaciones ya leídas (por ejemplo, celdas de cobertura)"""
+    with default_metrics().timer("plan_build_seconds"):
+        jobs = _plan_jobs(keyword_files, locations, job_prefix, radius, depth, max_time, log, dedupe_keywords)
+    default_metrics().inc("jobs_planned_total", len(jobs))
+    return jobs
+
+def _plan_jobs(keyword_files, locations, job_prefix, radius, depth, max_time, log, dedupe_keywords):
+    category_keywords = read_category_keywords(keyword_files)
+
+    if dedupe_keywords:
+        assigned, removed = assign_keywords(category_keywords)
+        log(format_report(query_report(category_keywords, assigned, removed, len(locations))))
+    else:
+        assigned = category_keywords
+
+    template = payload_template(radius, depth, max_time)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    jobs = []
+    for category_name, keywords_list in assigned:
+        if not keywords_list:
+            log(f"Categoría sin keywords, se omite: {category_name}")
+            continue
+
+        log(f"Procesando categoría: {category_name} ({len(keywords_list)} keywords)")
+
+        for location_name, location_data in locations:
+            job_name = f"{job_prefix}_{category_name}_{location_name}_{timestamp}"
+            jobs.append({
+                "name": job_name,
+                "category": category_name,
+                "location": location_name,
+                "payload": build_payload(job_name, keywords_list, location_data, template=template)
+            })
+    return jobs
+
+
+def coverage_locations(location_files, radius, cell_radius=None, bbox=None, log=print):
+    """Sustituye las localizaciones por celdas hexagonales que cubren su zona sin solaparse.
+
+    La zona es el rectángulo bbox si se indica, o la unión de los círculos de
+    radio 'radius' alrededor de cada localización. Devuelve [(nombre, datos), ...].
+    """
+    locations = read_locations(location_files)
+    centres = [(name, float(data['lat']), float(data['lon'])) for name, data in locations]
+    zoom = max((data['zoom'] for _, data in locations), default=DEFAULT_ZOOM)
+    region = Region(bbox=bbox, centres=centres, radius_m=radius)
+    if centres:
+        log(f"Cobertura de las localizaciones: {format_coverage_report(centres_report(region, radius))}")
+    locations, report = plan_coverage(region, cell_radius or radius, zoom)
+    log(f"Cobertura de las celdas: {format_coverage_report(report)}")
+    return locations
+
+
+def filter_due_jobs(jobs, freshness, ttl_hours, change_threshold=0.2, log=print):
+    """Modo incremental: deja en cada trabajo solo las keywords cuyos datos hay que renovar.
+
+    Los trabajos sin ninguna keyword pendiente se omiten.
+    """
+    due_jobs = []
+    skipped = 0
+    for job in jobs:
+        keywords = job['payload']['keywords']
+        due = freshness.due_keywords(job['category'], job['location'], keywords,
+                                     ttl_hours * 3600, change_threshold)
+        skipped += len(keywords) - len(due)
+        if not due:
+            continue
+        if len(due) < len(keywords):
+            job = dict(job, payload=dict(job['payload'], keywords=due))
+        due_jobs.append(job)
+    log(f"Modo incremental: {len(due_jobs)} de {len(jobs)} trabajos por actualizar, "
+        f"{skipped} búsquedas recientes omitidas (TTL {ttl_hours:g} h)")
+    return due_jobs
+
+
+def batch_plan(jobs, batch_size, max_time, ledger=None, log=print, fast_mode=False):
+    """Divide o agrupa las keywords de los trabajos según batch_size (ver keyword_batcher).
+
+    batch_size es None (sin cambios), un número de keywords por trabajo o
+    'auto', que lo calcula con el tiempo por keyword de las ejecuciones
+    anteriores guardadas en el registro (solo búsquedas con el mismo fast_mode
+    con el que se enviará el plan).
+    """
+    if batch_size is None:
+        return jobs
+    if batch_size == "auto":
+        seconds = ledger.seconds_per_keyword(fast_mode=fast_mode) if ledger is not None else None
+        if seconds is None:
+            log("Lotes automáticos: aún no hay trabajos terminados en el registro; no se cambian los trabajos")
+            return jobs
+        batch_size = keywords_per_job(seconds, max_time)
+        log(f"Lotes automáticos: {seconds:.1f} s por keyword en ejecuciones anteriores")
+    return batch_jobs(jobs, batch_size, log=log)
+
+
+def tune_plan(jobs, ledger, resume=False, run_id=None, log=print, fast_mode=False):
+    """Ajusta depth y max_time de cada trabajo con el historial del registro (ver auto_tuner).
+
+    El historial se limita a búsquedas con el mismo fast_mode con el que se
+    enviará el plan. Los ajustes se guardan en el registro con la ejecución
+    y su fast_mode; al reanudar se usan los de la última ejecución con el
+    mismo fast_mode, para que los payloads (y su hash) sean los de la
+    ejecución interrumpida, y se vuelven a guardar con la ejecución actual.
+    """
+    tuning = ledger.load_tuning(fast_mode) if resume else None
+    if tuning:
+        log(f"Ajuste automático: se repiten los ajustes de la ejecución interrumpida "
+            f"({sum(1 for key in tuning if key[1] != ANY_LOCATION)} pares)")
+        ledger.save_tuning(tuning, run_id, fast_mode)
+    else:
+        history = ledger.yield_history(fast_mode=fast_mode)
+        tuning = recommend(history)
+        log(f"Ajuste automático: {len(history)} trabajos anteriores, "
+            f"{sum(1 for key in tuning if key[1] != ANY_LOCATION)} pares con historial suficiente")
+        if tuning:
+            report = format_tuning(tuning)
+            if report:
+                log(report)
+            ledger.save_tuning(tuning, run_id, fast_mode)
+    if not tuning:
+        return jobs
+    return tune_jobs(jobs, tuning, log=log)
+
+
+def submit_jobs_concurrently(backends, jobs, max_in_flight, log, should_continue, on_submitted=None,
+                             governor=None, proxy_pool=None):
+    """Envía los trabajos a la API en paralelo con un máximo de envíos simultáneos.
+
+    backends es un BackendPool que elige el host de cada trabajo y jobs una
+    PriorityJobQueue (o una lista, que se envía en su orden). Cada hilo saca
+    de la cola el trabajo más prioritario en el momento del envío, así que los
+    cambios de prioridad durante la ejecución se aplican a lo que queda.
+
+    Devuelve la lista de trabajos enviados, en el orden de envío, con su ID,
+    su host y la latencia del envío. Si se indica, on_submitted(job, info) se
+    llama tras cada envío. Con un regulador (SubmitGovernor), cada envío espera
+    a que el servidor tenga hueco. Con un ProxyPool, cada envío lleva los
+    proxies que este asigne (en info['proxies']).
+    """
+    if isinstance(jobs, PriorityJobQueue):
+        queue = jobs
+    else:
+        queue = PriorityJobQueue()
+        queue.extend(jobs)
+
+    jobs_info = []
+    lock = threading.Lock()
+    metrics = default_metrics()
+
+    def send(job):
+        log(f"Procesando trabajo: {job['name']}")
+        log("Enviando trabajo a la API...")
+        proxies = proxy_pool.acquire() if proxy_pool is not None else []
+        payload = api_payload(job['payload'], proxies)
+        start_time = time.perf_counter()
+        job_id, status_code, response, host = backends.submit(payload)
+        latency = time.perf_counter() - start_time
+        metrics.observe("submit_seconds", latency, host=host)
+        metrics.inc("jobs_submitted_total", result="ok" if job_id else "failed")
+
+        if job_id:
+            where = f" en {host}" if len(backends.backends) > 1 else ""
+            log(f"Trabajo creado con ID: {job_id}{where} (envío en {latency:.2f} s)")
+        else:
+            log(f"No se pudo obtener ID del trabajo {job['name']} (código {status_code}), "
+                f"pero el proceso continuará.")
+            if governor is not None:
+                governor.release()
+            if proxy_pool is not None:
+                proxy_pool.release(proxies)
+
+        info = {
+            "id": job_id if job_id else "unknown",
+            "name": job['name'],
+            "category": job['category'],
+            "location": job['location'],
+            "status": "pending" if job_id else "failed",
+            "host": host,
+            "submit_latency": latency,
+            "submitted_at": time.time()
+        }
+        if proxies and job_id:
+            info['proxies'] = proxies
+        with lock:
+            jobs_info.append(info)
+        if on_submitted:
+            on_submitted(job, info)
+
+    def worker():
+        # Respetar la cancelación antes de cada envío
+        while should_continue():
+            if governor is not None:
+                with metrics.timer("governor_wait_seconds"):
+                    acquired = governor.acquire(should_continue)
+                if not acquired:
+                    return
+            job, waited = queue.pop_with_wait()
+            if job is None:
+                if governor is not None:
+                    governor.release()
+                return
+            metrics.observe("queue_wait_seconds", waited)
+            send(job)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        for future in [executor.submit(worker) for _ in range(max(1, max_in_flight))]:
+            future.result()
+    return jobs_info
+
+
+class JobPipeline:
+    """Envía un plan de trabajos a la API y sigue su estado hasta que terminan.
+
+    hosts puede ser un host o varios separados por comas; los trabajos se
+    reparten entre ellos (BackendPool) y, si un host deja de responder, sus
+    trabajos sin terminar se reenvían a los demás.
+
+    Con max_active > 0 los envíos pasan por un regulador (SubmitGovernor) que
+    limita los trabajos activos en el servidor y el ritmo de envío; en ese caso
+    el seguimiento empieza a la vez que los envíos para ir liberando huecos.
+
+    Los trabajos salen de una cola con prioridad (self.queue): weights y
+    deadlines son {(tipo, nombre): valor} con tipo 'category' o 'location' y el
+    plazo en minutos desde el inicio. Los pesos se pueden cambiar durante los
+    envíos con self.queue.set_weight().
+
+    Con un FreshnessStore, los resultados de cada trabajo descargado se
+    registran por keyword para el modo incremental.
+
+    Los trabajos se identifican por el hash de su payload, porque tras dividir
+    las keywords (batch_plan) una categoría y localización puede tener varios.
+
+    Con reuse_window > 0 (horas) y un registro, un trabajo idéntico a otro que
+    sigue en curso o terminó dentro de la ventana no se envía: se sigue y se
+    descarga el existente.
+
+    Con un ResultsStore (results_store.py), el consolidado de la ejecución se
+    añade al almacén Parquet al terminar las descargas.
+
+    Con un ProxyPool (proxy_pool.py), cada envío lleva sus proxies y el
+    resultado del trabajo (fallido, sin resultados, lento o correcto) se anota
+    en ellos al terminar o al descargarse.
+    """
+
+    def __init__(self, hosts, max_in_flight=4, wait_time=30, log=print, should_continue=None,
+                 ledger=None, resume=False, download_dir=None, download_workers=4,
+                 dedup_index_path=None, dedup_mode="flag", max_active=0, submit_rate=2.0,
+                 placement="least-loaded", health_interval=30.0, weights=None, deadlines=None,
+                 freshness=None, run_id=None, reuse_window=0, results_store=None, proxy_pool=None):
+        self.max_in_flight = max_in_flight
+        self.wait_time = wait_time
+        self.log = log
+        self.should_continue = should_continue or (lambda: True)
+        self.ledger = ledger
+        self.resume = resume
+        self.download_dir = download_dir
+        self.download_workers = download_workers
+        self.dedup_index_path = dedup_index_path
+        self.dedup_mode = dedup_mode
+        self.governor = SubmitGovernor(max_active, submit_rate, log=log) if max_active > 0 else None
+        self.backends = BackendPool(
+            hosts, placement, pool_size=max_in_flight + download_workers + 1,
+            on_submit_response=self.governor.observe_response if self.governor is not None else None,
+            log=log
+        )
+        self.host = self.backends.hosts[0]
+        self.queue = PriorityJobQueue(weights, {key: minutes * 60 for key, minutes in (deadlines or {}).items()})
+        self.health_interval = health_interval
+        self.freshness = freshness
+        self.reuse_window = reuse_window
+        self.results_store = results_store
+        self.proxy_pool = proxy_pool
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.tracker = None
+        self.downloader = None
+        self._on_status_change = None
+        self._dedup_index = None
+        self._jobs_by_hash = {}
+        self._last_health_check = time.monotonic()
+
+    def _resume_from_ledger(self, jobs):
+        """Omite los trabajos ya enviados según el registro y los devuelve para seguirlos"""
+        jobs, already_submitted = self.ledger.split_for_resume(jobs)
+        self.log(f"Reanudando: se omiten {len(already_submitted)} trabajos ya enviados o terminados")
+        resumed_info = [self._info_from_row(row, resumed=True) for row in already_submitted]
+        return jobs, resumed_info
+
+    def _reuse_from_ledger(self, jobs):
+        """Sustituye los trabajos idénticos a otros recientes por el ID de estos"""
+        to_submit, reused_info = [], []
+        for job in jobs:
+            source = self.ledger.find_reusable(job, self.reuse_window * 3600)
+            if source is None:
+                to_submit.append(job)
+                continue
+            self.ledger.record_reused(job, source)
+            reused_info.append(self._info_from_row(
+                dict(source, name=job['name'], category=job['category'], location=job['location'],
+                     payload_hash=payload_hash(job['payload'])),
+                reused=True
+            ))
+        if reused_info:
+            default_metrics().inc("jobs_reused_total", len(reused_info))
+            self.log(f"Se reutilizan {len(reused_info)} trabajos idénticos a otros en curso o terminados "
+                     f"en las últimas {self.reuse_window:g} horas")
+        return to_submit, reused_info
+
+    def _info_from_row(self, row, **extra):
+        info = {
+            "id": row['backend_id'],
+            "name": row['name'],
+            "category": row['category'],
+            "location": row['location'],
+            "status": row['status'],
+            "host": row['host'] or self.host,
+            "payload_hash": row['payload_hash'],
+        }
+        job = self._jobs_by_hash.get(row['payload_hash'])
+        if job is not None:
+            info['keyword_categories'] = job_keyword_categories(job)
+        info.update(extra)
+        return info
+
+    def _on_submitted(self, job, info):
+        info['payload_hash'] = payload_hash(job['payload'])
+        info['keyword_categories'] = job_keyword_categories(job)
+        if self.ledger is not None:
+            self.ledger.record_submitted(job, None if info['id'] == "unknown" else info['id'],
+                                         info['status'], info['host'])
+        if self.tracker is not None:
+            self.tracker.add(info)
+
+    def submit(self, jobs):
+        """Envía los trabajos y registra las estadísticas de la API"""
+        self._jobs_by_hash = {payload_hash(job['payload']): job for job in jobs}
+        resumed_info = []
+        if self.ledger is not None:
+            if self.resume:
+                jobs, resumed_info = self._resume_from_ledger(jobs)
+            self.ledger.record_planned(jobs, self.run_id)
+            if self.reuse_window > 0:
+                jobs, reused_info = self._reuse_from_ledger(jobs)
+                resumed_info += reused_info
+
+        # Los trabajos reanudados que siguen en curso ocupan hueco en su host
+        running = [info for info in resumed_info if info['status'] not in FINAL_STATUSES]
+        self.backends.add_active(running)
+        if len(self.backends.backends) > 1:
+            self.backends.check_health()
+            self.log(f"Repartiendo entre {len(self.backends.backends)} hosts ({self.backends.placement})")
+
+        if self.governor is not None:
+            self.governor.add_active(len(running))
+            self._start_tracking(resumed_info, intake_open=True)
+            self.log(f"Enviando {len(jobs)} trabajos ({self.max_in_flight} simultáneos, como mucho "
+                     f"{self.governor.max_active} activos y {self.governor.max_rate:g} envíos/s)...")
+        else:
+            self.log(f"Enviando {len(jobs)} trabajos ({self.max_in_flight} simultáneos)...")
+        if self.proxy_pool is not None:
+            self.log(f"Usando {self.proxy_pool.available()} proxies ({self.proxy_pool.per_job} por trabajo)")
+
+        self.queue.extend(jobs)
+        jobs_info = submit_jobs_concurrently(
+            self.backends, self.queue, self.max_in_flight, self.log, self.should_continue,
+            on_submitted=self._on_submitted, governor=self.governor, proxy_pool=self.proxy_pool
+        )
+        if len(self.queue):
+            self.log(f"{len(self.queue)} trabajos quedaron sin enviar")
+        stats = self.backends.get_stats()
+        self.log(f"Peticiones a la API: {stats['requests']}, reintentos: {stats['retries']}, "
+                 f"errores: {stats['errors']}")
+        if len(self.backends.backends) > 1:
+            self.log(f"Reparto: {self.backends.describe()}")
+        if self.governor is not None:
+            self.log(f"Regulador: {self.governor.describe()}")
+
+        latencies = [info['submit_latency'] for info in jobs_info]
+        if latencies:
+            self.log(f"Latencia de envío: media {sum(latencies) / len(latencies):.2f} s, "
+                     f"máxima {max(latencies):.2f} s")
+        return resumed_info + jobs_info
+
+    def _start_tracking(self, jobs_info, intake_open=False):
+        """Prepara las descargas y arranca el seguimiento en segundo plano"""
+        if self.download_dir:
+            if self.dedup_index_path:
+                self._dedup_index = DedupIndex(self.dedup_index_path, run_id=self.run_id)
+            self.downloader = ResultsDownloader(
+                None, self.download_dir, self.run_id, self.download_workers,
+                log=self.log, should_continue=self.should_continue,
+                dedup_index=self._dedup_index, dedup_mode=self.dedup_mode,
+                client_for=self.backends.client_for,
+                on_downloaded=self._on_downloaded
+            )
+            # Trabajos que ya estaban terminados (por ejemplo, al reanudar)
+            for info in jobs_info:
+                if info.get('status') == "ok":
+                    self.downloader.enqueue(info)
+
+        def on_change(info, old_status, new_status):
+            if self.ledger is not None:
+                self.ledger.update_status(info['id'], new_status)
+            if new_status == "working":
+                info.setdefault('started_at', time.time())
+            if new_status == "ok" and self.downloader is not None:
+                self.downloader.enqueue(info)
+            if new_status in FINAL_STATUSES and old_status not in FINAL_STATUSES:
+                info['finished_at'] = time.time()
+                self._job_finished_on_proxies(info, new_status)
+                if info.get('submitted_at'):
+                    default_metrics().observe("job_duration_seconds", time.time() - info['submitted_at'],
+                                              status=new_status)
+                self.backends.job_finished(info)
+                if self.governor is not None:
+                    self.governor.release()
+            if self._on_status_change:
+                self._on_status_change(info, old_status, new_status)
+
+        def on_tick(counts):
+            if self.governor is not None:
+                self.governor.observe_counts(counts)
+            self._check_backends()
+
+        self.tracker = JobStatusTracker(
+            None, jobs_info, self.wait_time * 60,
+            on_change=on_change,
+            should_continue=self.should_continue,
+            intake_open=intake_open,
+            on_tick=on_tick,
+            client_for=self.backends.client_for
+        )
+        self.tracker.start()
+
+    def _on_downloaded(self, info, csv_path):
+        if self.ledger is not None:
+            self.ledger.record_results(info['id'], info['source_rows'], info.get('new_places'))
+        # Un trabajo reutilizado no es una búsqueda nueva: anotarlo adelantaría last_scraped,
+        # sumaría una ejecución y mezclaría un cambio de 0 en change_rate
+        if self.freshness is not None and not info.get('reused'):
+            job = self._jobs_by_hash.get(info.get('payload_hash'))
+            if job is not None:
+                self.freshness.record_csv(info['location'], job_keyword_categories(job), csv_path)
+        if self.proxy_pool is not None and info.get('proxies'):
+            # Filas del CSV, no las añadidas: con dedup 'skip' un trabajo correcto puede no añadir ninguna
+            self.proxy_pool.report(info['proxies'], "ok" if info.get('source_rows') else "empty",
+                                   self._seconds_per_keyword(info))
+
+    def _seconds_per_keyword(self, info):
+        started = info.get('started_at') or info.get('submitted_at')
+        keywords = len(info.get('keyword_categories') or ()) or 1
+        if not started or not info.get('finished_at'):
+            return None
+        return (info['finished_at'] - started) / keywords
+
+    def _job_finished_on_proxies(self, info, status):
+        """Libera los proxies del trabajo y anota su resultado si no hay que esperar a la descarga"""
+        if self.proxy_pool is None or not info.get('proxies'):
+            return
+        self.proxy_pool.release(info['proxies'])
+        if status != "ok":
+            self.proxy_pool.report(info['proxies'], "failed")
+        elif self.downloader is None:
+            # Sin descargas no se sabe si vino vacío
+            self.proxy_pool.report(info['proxies'], "ok", self._seconds_per_keyword(info))
+
+    def _check_backends(self):
+        """Comprueba los hosts cada health_interval segundos y reenvía los trabajos de los caídos"""
+        if len(self.backends.backends) < 2:
+            return
+        if time.monotonic() - self._last_health_check < self.health_interval:
+            return
+        self._last_health_check = time.monotonic()
+        for backend in self.backends.check_health():
+            self._requeue_from(backend.host)
+
+    def _requeue_from(self, dead_host):
+        """Reenvía a otros hosts los trabajos sin terminar de un host caído"""
+        for info in self.tracker.pending_jobs():
+            if info.get('host') != dead_host or not self.should_continue():
+                continue
+            job = self._jobs_by_hash.get(info.get('payload_hash'))
+            if job is None:
+                continue
+            proxies = self.proxy_pool.acquire() if self.proxy_pool is not None else []
+            payload = api_payload(job['payload'], proxies)
+            job_id, status_code, _, host = self.backends.submit(payload, exclude_hosts=[dead_host])
+            if not job_id:
+                if self.proxy_pool is not None:
+                    self.proxy_pool.release(proxies)
+                self.log(f"No se pudo reenviar el trabajo {info['name']} (código {status_code})")
+                continue
+
+            self.backends.job_finished(info)
+            if self.proxy_pool is not None:
+                self.proxy_pool.release(info.get('proxies'))
+            old_status = info.get('status')
+            info.pop('started_at', None)
+            info.update(id=job_id, host=host, status="pending", requeued=info.get('requeued', 0) + 1,
+                        submitted_at=time.time(), proxies=proxies)
+            default_metrics().inc("jobs_requeued_total")
+            if self.ledger is not None:
+                self.ledger.record_submitted(job, job_id, "pending", host)
+            self.log(f"Trabajo {info['name']} reenviado de {dead_host} a {host} (nuevo ID {job_id})")
+            if self._on_status_change:
+                self._on_status_change(info, old_status, "pending")
+
+    def track(self, jobs_info, on_status_change=None):
+        """Sigue el estado de los trabajos hasta que terminan o vence el tiempo de espera.
+
+        Si hay carpeta de descargas, los resultados de cada trabajo se descargan
+        en cuanto llega a 'ok'.
+        """
+        self._on_status_change = on_status_change
+        if self.tracker is None:
+            self._start_tracking(jobs_info)
+        else:
+            # El seguimiento ya empezó con los envíos (regulador)
+            self.tracker.close_intake()
+
+        self.log(f"Siguiendo el estado de los trabajos (máximo {self.wait_time} minutos)...")
+        self.tracker.wait()
+
+        if self.downloader is not None:
+            self.downloader.wait()
+            if self.downloader.downloaded or self.downloader.failed:
+                self.log(f"Resultados descargados: {self.downloader.downloaded} trabajos, "
+                         f"{self.downloader.merger.rows_written} filas en {self.downloader.merged_path}"
+                         + (f" ({self.downloader.failed} descargas fallidas)" if self.downloader.failed else ""))
+            if self._dedup_index is not None:
+                counts = self.downloader.merger.place_counts
+                self.log(f"Lugares: {counts.get(NEW, 0)} nuevos, {counts.get(DUPLICATE, 0)} repetidos "
+                         f"en esta ejecución, {counts.get(KNOWN, 0)} ya conocidos "
+                         f"({self._dedup_index.count()} en el índice)")
+                self._dedup_index.close()
+            if self.results_store is not None and self.downloader.merger.rows_written:
+                self._store_results()
+        self.backends.close()
+
+        if self.should_continue():
+            counts = self.tracker.summary()
+            self.log(f"Estado final de los trabajos ({self.tracker.polls} consultas): "
+                     f"{format_status_counts(counts)}")
+            if self.tracker.pending_jobs():
+                self.log(f"{len(self.tracker.pending_jobs())} trabajos siguen en curso tras el tiempo de espera.")
+            if self.proxy_pool is not None:
+                self.log(f"Proxies: {self.proxy_pool.describe()}")
+        return self.tracker
+
+    def _store_results(self):
+        """Añade el consolidado de la ejecución al almacén Parquet"""
+        try:
+            with default_metrics().timer("results_store_seconds"):
+                rows = self.results_store.ingest_csv(self.downloader.merged_path, self.run_id)
+        except (OSError, ValueError) as e:
+            # Los resultados siguen en el CSV consolidado; se pueden añadir luego con 'ingest'
+            self.log(f"No se pudieron guardar los resultados en el almacén: {e}")
+            return
+        self.log(f"{rows} filas añadidas al almacén de resultados ({self.results_store.root})")
+
+    def close(self):
+        """Detiene el seguimiento y cierra las conexiones cuando no se va a llamar a track()"""
+        if self.tracker is not None:
+            self.tracker.stop()
+            self.tracker.wait()
+        if self.downloader is not None:
+            self.downloader.wait()
+        if self._dedup_index is not None:
+            self._dedup_index.close()
+        self.backends.close()
+
+
+def format_status_counts(counts):
+    """{'ok': 3, 'failed': 1} -> 'failed: 1, ok: 3'"""
+    return ", ".join(f"{status}: {count}" for status, count in sorted(counts.items()))
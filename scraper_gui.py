@@ -1,69 +1,39 @@
 import os
-import json
-import requests
-import time
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 from datetime import datetime
-from os import listdir
-from os.path import isfile, join
 import threading
 
-# Funciones del scraper que vamos a reutilizar
-def get_keyword_files():
-    """Obtiene todos los archivos de keywords y los ordena por su prefijo numérico"""
-    keyword_dir = 'keywords'
-    files = [f for f in listdir(keyword_dir) if isfile(join(keyword_dir, f))]
-    # Extrae el prefijo numérico y ordena por él
-    files.sort(key=lambda x: int(x.split('_')[0]))
-    return files
+from catalog import KEYWORDS_DIR, LOCATIONS_DIR, default_catalog
+from dedup_index import DEFAULT_INDEX_PATH
+from enrichment import discovery_jobs, run_enrichment
+from gui_widgets import KeywordListView, VirtualCheckList
+from freshness import FreshnessStore
+from job_ledger import JobLedger
+from job_queue import CATEGORY, LOCATION
+from keyword_batcher import parse_batch_size
+from keyword_planner import assign_keywords, format_report, normalize_keyword, query_report
+from location_index import DEFAULT_ZOOM, ZOOM_LIMITS, parse_numbers
+from metrics import RunProfiler, default_metrics
+from proxy_pool import ProxyPool, load_proxies
+from results_downloader import DEFAULT_RESULTS_DIR
+from results_store import DEFAULT_STORE_DIR, ResultsStore
+from scraper_core import (
+    JobPipeline, batch_plan, category_name_from_file, coverage_locations, filter_due_jobs,
+    format_status_counts, get_keyword_files, get_location_files, location_name_from_file,
+    plan_jobs_for_locations, read_category_keywords, read_keywords, read_location, read_locations,
+    tune_plan
+)
+from ui_bridge import LogBuffer, UIBridge
 
-def get_location_files():
-    """Obtiene todos los archivos de localización y los ordena por su prefijo numérico"""
-    location_dir = 'location'
-    files = [f for f in listdir(location_dir) if isfile(join(location_dir, f))]
-    # Extrae el prefijo numérico y ordena por él
-    files.sort(key=lambda x: int(x.split('_')[0]))
-    return files
+# Opciones del combobox de duplicados -> modo del índice
+DEDUP_OPTIONS = {"Marcar": "flag", "Omitir": "skip", "Desactivado": "off"}
 
-def read_keywords(keyword_file):
-    """Lee keywords del archivo seleccionado"""
-    with open(os.path.join('keywords', keyword_file), 'r', encoding='utf-8') as f:
-        return [line.strip() for line in f.readlines()]
+# Opciones del combobox de reparto entre hosts -> estrategia del BackendPool
+PLACEMENT_OPTIONS = {"Menos cargado": "least-loaded", "Por turnos": "round-robin"}
 
-def read_location(location_file):
-    """Lee datos de localización del archivo seleccionado"""
-    with open(os.path.join('location', location_file), 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        return {
-            'zoom': int(lines[0].strip()),
-            'lat': lines[1].strip(),
-            'lon': lines[2].strip()
-        }
-
-def submit_job(api_url, payload):
-    """Envía un trabajo a la API"""
-    try:
-        response = requests.post(api_url, json=payload)
-        if response.status_code in [200, 201]:
-            result = response.json()
-            return result.get('id'), response.status_code, result
-        else:
-            return None, response.status_code, response.text
-    except Exception as e:
-        return None, 0, str(e)
-
-def check_job_status(job_id, api_url):
-    """Verifica el estado de un trabajo"""
-    status_url = f"{api_url}/{job_id}"
-    try:
-        response = requests.get(status_url)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"status": "error", "message": f"Error {response.status_code}"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+# Opciones del combobox de perfilado -> modo de RunProfiler
+PROFILE_OPTIONS = {"No": None, "CPU": "cpu", "Memoria": "memory", "CPU y memoria": "all"}
 
 class GoogleMapsScraper(tk.Tk):
     def __init__(self):
@@ -81,6 +51,31 @@ class GoogleMapsScraper(tk.Tk):
         self.depth_var = tk.IntVar(value=10)
         self.max_time_var = tk.IntVar(value=15)
         self.wait_time_var = tk.IntVar(value=30)
+        self.max_in_flight_var = tk.IntVar(value=4)
+        self.max_active_var = tk.IntVar(value=0)
+        self.submit_rate_var = tk.DoubleVar(value=2.0)
+        self.placement_var = tk.StringVar(value="Menos cargado")
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.ttl_var = tk.DoubleVar(value=168)
+        self.batch_size_var = tk.StringVar(value="off")
+        self.save_metrics_var = tk.BooleanVar(value=False)
+        self.profile_var = tk.StringVar(value="No")
+        self.reuse_window_var = tk.DoubleVar(value=0)
+        self.results_store_var = tk.BooleanVar(value=False)
+        self.proxies_file_var = tk.StringVar(value="")
+        self.proxies_per_job_var = tk.IntVar(value=1)
+        self.auto_tune_var = tk.BooleanVar(value=False)
+        self.two_phase_var = tk.BooleanVar(value=False)
+        self.resume_var = tk.BooleanVar(value=False)
+        self.download_dir_var = tk.StringVar(value=DEFAULT_RESULTS_DIR)
+        self.dedup_mode_var = tk.StringVar(value="Marcar")
+        self.dedupe_keywords_var = tk.BooleanVar(value=True)
+        self.coverage_var = tk.BooleanVar(value=False)
+        
+        # Prioridades {(tipo, nombre): valor} y trabajo en curso (para reordenar su cola)
+        self.priority_weights = {}
+        self.priority_deadlines = {}
+        self.pipeline = None
         
         self.keyword_files = get_keyword_files()
         self.location_files = get_location_files()
@@ -91,6 +86,12 @@ class GoogleMapsScraper(tk.Tk):
         # Crear la interfaz
         self.create_widgets()
         
+        # Los hilos de trabajo se comunican con la interfaz a través de esta cola
+        self.bridge = UIBridge(self)
+        self.log_buffer = LogBuffer(self.log_text)
+        self.bridge.add_flusher(self.log_buffer.flush)
+        self.bridge.start()
+        
         # Estado de ejecución
         self.running = False
         self.job_id = None
@@ -128,7 +129,7 @@ class GoogleMapsScraper(tk.Tk):
         frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         # Host API
-        ttk.Label(frame, text="Host API:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(frame, text="Host API (varios separados por comas):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Entry(frame, textvariable=self.host_var, width=40).grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
         
         # Nombre del trabajo
@@ -150,6 +151,109 @@ class GoogleMapsScraper(tk.Tk):
         # Tiempo de espera
         ttk.Label(frame, text="Tiempo de espera (minutos):").grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
         ttk.Entry(frame, textvariable=self.wait_time_var, width=10).grid(row=5, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Envíos simultáneos a la API
+        ttk.Label(frame, text="Envíos simultáneos:").grid(row=6, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(frame, from_=1, to=32, textvariable=self.max_in_flight_var, width=5).grid(row=6, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Reanudar omitiendo los trabajos ya enviados
+        ttk.Checkbutton(
+            frame,
+            text="Reanudar (omitir trabajos ya enviados o terminados)",
+            variable=self.resume_var
+        ).grid(row=7, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # Carpeta de descarga de resultados (vacía = no descargar)
+        ttk.Label(frame, text="Carpeta de resultados:").grid(row=8, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.download_dir_var, width=40).grid(row=8, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Lugares repetidos entre trabajos y ejecuciones
+        ttk.Label(frame, text="Lugares repetidos:").grid(row=9, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(frame, textvariable=self.dedup_mode_var, values=list(DEDUP_OPTIONS),
+                     state="readonly", width=15).grid(row=9, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Buscar una sola vez las keywords compartidas entre categorías
+        ttk.Checkbutton(
+            frame,
+            text="Eliminar keywords repetidas entre categorías",
+            variable=self.dedupe_keywords_var
+        ).grid(row=10, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # Sustituir las localizaciones por celdas hexagonales del mismo radio
+        ttk.Checkbutton(
+            frame,
+            text="Cubrir la zona de las localizaciones con celdas hexagonales (menos solapes)",
+            variable=self.coverage_var
+        ).grid(row=11, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # Regulador: trabajos activos en el servidor y envíos por segundo
+        ttk.Label(frame, text="Trabajos activos máx. (0 = sin límite):").grid(row=12, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(frame, from_=0, to=1000, textvariable=self.max_active_var, width=5).grid(row=12, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(frame, text="Envíos por segundo (máx.):").grid(row=13, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.submit_rate_var, width=10).grid(row=13, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Reparto de los trabajos cuando hay varios hosts
+        ttk.Label(frame, text="Reparto entre hosts:").grid(row=14, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(frame, textvariable=self.placement_var, values=list(PLACEMENT_OPTIONS),
+                     state="readonly", width=15).grid(row=14, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Modo incremental: solo lo que ha caducado o probablemente ha cambiado
+        ttk.Checkbutton(
+            frame,
+            text="Incremental (solo keywords con datos caducados o que cambian a menudo)",
+            variable=self.incremental_var
+        ).grid(row=15, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(frame, text="Caducidad de los datos (horas):").grid(row=16, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.ttl_var, width=10).grid(row=16, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Dividir las categorías grandes y agrupar las pequeñas en trabajos de N keywords
+        ttk.Label(frame, text="Keywords por trabajo (número, auto u off):").grid(row=17, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.batch_size_var, width=10).grid(row=17, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Métricas y perfilado de la ejecución (se guardan en la carpeta de resultados)
+        ttk.Checkbutton(
+            frame,
+            text="Guardar métricas de la ejecución (JSON en la carpeta de resultados)",
+            variable=self.save_metrics_var
+        ).grid(row=18, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(frame, text="Perfilado:").grid(row=19, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(frame, textvariable=self.profile_var, values=list(PROFILE_OPTIONS),
+                     state="readonly", width=15).grid(row=19, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # No volver a enviar búsquedas idénticas a otras en curso o recientes
+        ttk.Label(frame, text="Reutilizar trabajos idénticos (horas, 0 = no):").grid(row=20, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.reuse_window_var, width=10).grid(row=20, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Copia de los resultados en Parquet para consultarlos con results_store.py (necesita pyarrow)
+        ttk.Checkbutton(
+            frame,
+            text=f"Guardar también en el almacén columnar (Parquet, carpeta {DEFAULT_STORE_DIR})",
+            variable=self.results_store_var
+        ).grid(row=21, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # Proxies que se reparten entre los trabajos según su salud (vacío = sin proxies)
+        ttk.Label(frame, text="Archivo de proxies (uno por línea):").grid(row=22, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Entry(frame, textvariable=self.proxies_file_var, width=40).grid(row=22, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(frame, text="Proxies por trabajo:").grid(row=23, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(frame, from_=1, to=10, textvariable=self.proxies_per_job_var, width=5).grid(row=23, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # Depth y tiempo máximo por categoría y localización según las ejecuciones anteriores
+        ttk.Checkbutton(
+            frame,
+            text="Ajustar profundidad y tiempo máximo según ejecuciones anteriores",
+            variable=self.auto_tune_var
+        ).grid(row=24, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # Descubrimiento en modo rápido y, después, emails solo de los lugares nuevos con web
+        ttk.Checkbutton(
+            frame,
+            text="Dos fases: descubrimiento rápido y emails solo de lugares nuevos con web",
+            variable=self.two_phase_var
+        ).grid(row=25, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
     
     def setup_categories_tab(self, parent):
         # Frame principal que contiene todo
@@ -164,39 +268,20 @@ class GoogleMapsScraper(tk.Tk):
         categories_frame = ttk.LabelFrame(left_frame, text="Categorías Disponibles")
         categories_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Lista de categorías con checkbuttons
-        self.category_vars = []
-        self.category_names = []
-        
-        # Crear un canvas con scrollbar para las categorías
-        canvas = tk.Canvas(categories_frame)
-        scrollbar = ttk.Scrollbar(categories_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Crear checkbuttons para cada categoría
-        for i, file in enumerate(self.keyword_files):
-            category_name = file.split('_keywords_')[1].split('.')[0]
-            self.category_names.append(category_name)
-            var = tk.BooleanVar()
-            self.category_vars.append(var)
-            
-            ttk.Checkbutton(
-                scrollable_frame, 
-                text=f"{i+1}. {category_name}", 
-                variable=var,
-                command=self.update_keywords_list
-            ).grid(row=i, column=0, sticky=tk.W, padx=5, pady=2)
-        
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        # Búsqueda por nombre de categoría o por keyword
+        search_frame = ttk.Frame(categories_frame)
+        search_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(search_frame, text="Buscar:").pack(side=tk.LEFT)
+        self.category_search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.category_search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.category_search_var.trace_add("write", lambda *args: self.schedule_category_search())
+        self._search_after_id = None
+        
+        # Lista virtualizada: solo las filas visibles tienen widget
+        self.category_names = [category_name_from_file(file) for file in self.keyword_files]
+        self.category_list = VirtualCheckList(categories_frame, on_toggle=self.on_category_toggled)
+        self.category_list.pack(fill=tk.BOTH, expand=True)
+        self.category_list.set_items([f"{i+1}. {name}" for i, name in enumerate(self.category_names)])
         
         # Frame para mostrar keywords de la categoría seleccionada
         keywords_frame = ttk.LabelFrame(left_frame, text="Keywords Disponibles")
@@ -205,6 +290,7 @@ class GoogleMapsScraper(tk.Tk):
         # Lista de keywords
         self.keywords_listbox = tk.Listbox(keywords_frame, selectmode=tk.EXTENDED, height=15)
         self.keywords_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.keywords_view = KeywordListView(self.keywords_listbox)
         
         # Scrollbar para la lista de keywords
         keywords_scrollbar = ttk.Scrollbar(keywords_frame, orient=tk.VERTICAL, command=self.keywords_listbox.yview)
@@ -264,21 +350,43 @@ class GoogleMapsScraper(tk.Tk):
         locations_frame = ttk.LabelFrame(left_frame, text="Localizaciones Disponibles")
         locations_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # Lista de localizaciones con checkbuttons
-        self.location_vars = []
+        # Búsqueda por nombre
+        search_frame = ttk.Frame(locations_frame)
+        search_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(search_frame, text="Buscar:").pack(side=tk.LEFT)
+        self.location_search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.location_search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.location_search_var.trace_add("write", lambda *args: self.apply_location_search())
+        
+        # Lista virtualizada: con miles de municipios importados solo las filas visibles tienen widget
+        self.location_list = VirtualCheckList(locations_frame)
+        self.location_list.pack(fill=tk.BOTH, expand=True)
         self.location_names = []
-        
-        for i, file in enumerate(self.location_files):
-            location_name = file.split('_location_')[1].split('.')[0]
-            self.location_names.append(location_name)
-            var = tk.BooleanVar()
-            self.location_vars.append(var)
-            
-            ttk.Checkbutton(
-                locations_frame, 
-                text=f"{i+1}. {location_name}", 
-                variable=var
-            ).grid(row=i, column=0, sticky=tk.W, padx=5, pady=5)
+        self.reload_locations()
+        
+        # Selección por zona con el índice espacial del catálogo
+        zone_frame = ttk.LabelFrame(left_frame, text="Seleccionar por Zona")
+        zone_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(zone_frame, text="Punto (lat,lon):").grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        self.zone_point_var = tk.StringVar()
+        ttk.Entry(zone_frame, textvariable=self.zone_point_var, width=24).grid(row=0, column=1, sticky=tk.W, padx=5, pady=2)
+        ttk.Label(zone_frame, text="Km:").grid(row=0, column=2, sticky=tk.W, padx=5, pady=2)
+        self.zone_km_var = tk.DoubleVar(value=20)
+        ttk.Entry(zone_frame, textvariable=self.zone_km_var, width=6).grid(row=0, column=3, sticky=tk.W, padx=5, pady=2)
+        ttk.Button(zone_frame, text="Marcar Cercanas", command=self.select_locations_near).grid(row=0, column=4, padx=5, pady=2)
+        
+        ttk.Label(zone_frame, text="Rectángulo (min_lat,min_lon,max_lat,max_lon):").grid(row=1, column=0, columnspan=2, sticky=tk.W, padx=5, pady=2)
+        self.zone_bbox_var = tk.StringVar()
+        ttk.Entry(zone_frame, textvariable=self.zone_bbox_var, width=30).grid(row=1, column=2, columnspan=2, sticky=tk.W, padx=5, pady=2)
+        ttk.Button(zone_frame, text="Marcar en Rectángulo", command=self.select_locations_in_bbox).grid(row=1, column=4, padx=5, pady=2)
+        
+        # Botones para seleccionar todas/ninguna
+        button_frame = ttk.Frame(left_frame)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="Seleccionar Todas", command=lambda: self.location_list.set_all(True)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Deseleccionar Todas", command=lambda: self.location_list.set_all(False)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Ver Todas", command=lambda: self.location_search_var.set("")).pack(side=tk.LEFT, padx=5)
         
         # Información de la localización seleccionada
         info_frame = ttk.LabelFrame(left_frame, text="Información de Localización")
@@ -304,9 +412,9 @@ class GoogleMapsScraper(tk.Tk):
         self.new_location_var = tk.StringVar()
         ttk.Entry(add_location_frame, textvariable=self.new_location_var, width=30).grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
         
-        ttk.Label(add_location_frame, text="Zoom (1-20):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Label(add_location_frame, text=f"Zoom ({ZOOM_LIMITS[0]}-{ZOOM_LIMITS[1]}):").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         self.new_zoom_var = tk.IntVar(value=12)
-        ttk.Spinbox(add_location_frame, from_=1, to=20, textvariable=self.new_zoom_var, width=5).grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(add_location_frame, from_=ZOOM_LIMITS[0], to=ZOOM_LIMITS[1], textvariable=self.new_zoom_var, width=5).grid(row=1, column=1, sticky=tk.W, padx=5, pady=5)
         
         ttk.Label(add_location_frame, text="Latitud:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
         self.new_lat_var = tk.StringVar()
@@ -336,6 +444,22 @@ class GoogleMapsScraper(tk.Tk):
             text="Abrir Mapa para Obtener Coordenadas", 
             command=lambda: self.open_map_website()
         ).grid(row=6, column=0, columnspan=2, pady=5)
+        
+        # Importación masiva de municipios al almacén del catálogo
+        import_frame = ttk.LabelFrame(right_frame, text="Importar Localizaciones (CSV o GeoJSON)")
+        import_frame.pack(fill=tk.X, expand=False, pady=10)
+        
+        ttk.Label(import_frame, text="Zoom si el archivo no lo trae:").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        self.import_zoom_var = tk.IntVar(value=DEFAULT_ZOOM)
+        ttk.Spinbox(import_frame, from_=ZOOM_LIMITS[0], to=ZOOM_LIMITS[1], textvariable=self.import_zoom_var, width=5).grid(row=0, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Label(
+            import_frame,
+            text="Columnas: nombre (o municipio), latitud y longitud; provincia y zoom opcionales",
+            justify=tk.LEFT
+        ).grid(row=1, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        ttk.Button(import_frame, text="Importar Archivo...", command=self.import_locations).grid(row=2, column=0, columnspan=2, pady=10)
     
     def setup_execution_tab(self, parent):
         # Frame para mostrar configuración del trabajo
@@ -345,6 +469,39 @@ class GoogleMapsScraper(tk.Tk):
         self.summary_text = scrolledtext.ScrolledText(summary_frame, height=15, wrap=tk.WORD)
         self.summary_text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Frame para el estado de cada trabajo
+        status_frame = ttk.LabelFrame(parent, text="Estado de los Trabajos")
+        status_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        columns = ("category", "location", "host", "id", "status")
+        self.jobs_tree = ttk.Treeview(status_frame, columns=columns, show="headings", height=8)
+        for column, heading, width in zip(columns, ("Categoría", "Localización", "Host", "ID", "Estado"),
+                                          (130, 130, 150, 260, 90)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width)
+        self.jobs_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        
+        jobs_scrollbar = ttk.Scrollbar(status_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        jobs_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.jobs_tree.configure(yscrollcommand=jobs_scrollbar.set)
+        
+        # Prioridades: se pueden cambiar también durante los envíos
+        priority_frame = ttk.LabelFrame(parent, text="Prioridades")
+        priority_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.priority_target_var = tk.StringVar()
+        self.priority_weight_var = tk.DoubleVar(value=1.0)
+        self.priority_deadline_var = tk.StringVar()
+        self.priority_combo = ttk.Combobox(priority_frame, textvariable=self.priority_target_var,
+                                           state="readonly", width=30, postcommand=self.update_priority_combo)
+        self.priority_combo.pack(side=tk.LEFT, padx=5, pady=5)
+        ttk.Label(priority_frame, text="Peso:").pack(side=tk.LEFT)
+        ttk.Spinbox(priority_frame, from_=0, to=100, increment=0.5, textvariable=self.priority_weight_var,
+                    width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Label(priority_frame, text="Plazo (min):").pack(side=tk.LEFT)
+        ttk.Entry(priority_frame, textvariable=self.priority_deadline_var, width=6).pack(side=tk.LEFT, padx=5)
+        ttk.Button(priority_frame, text="Aplicar", command=self.apply_priority).pack(side=tk.LEFT, padx=5)
+        
         # Frame para los logs
         log_frame = ttk.LabelFrame(parent, text="Logs")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -369,49 +526,173 @@ class GoogleMapsScraper(tk.Tk):
         self.progress = ttk.Progressbar(parent, orient=tk.HORIZONTAL, length=100, mode='indeterminate')
         self.progress.pack(fill=tk.X, padx=10, pady=10)
     
-    def update_keywords_list(self):
-        # Limpiar la lista actual
-        self.keywords_listbox.delete(0, tk.END)
-        
-        # Obtener las categorías seleccionadas
-        selected_indices = [i for i, var in enumerate(self.category_vars) if var.get()]
-        
-        # Actualizar la lista de keywords
-        all_keywords = []
-        for idx in selected_indices:
-            file = self.keyword_files[idx]
-            keywords = read_keywords(file)
-            all_keywords.extend(keywords)
+    def update_priority_combo(self):
+        """Categorías y localizaciones a las que se puede dar prioridad"""
+        self.priority_combo['values'] = ([f"Categoría: {name}" for name in self.category_names]
+                                         + [f"Localización: {name}" for name in self.location_names])
+    
+    def apply_priority(self):
+        """Guarda el peso y el plazo elegidos y, si hay envíos en curso, reordena su cola"""
+        target = self.priority_target_var.get()
+        if not target:
+            messagebox.showerror("Error", "Selecciona una categoría o localización")
+            return
+        label, _, name = target.partition(": ")
+        key = (CATEGORY if label == "Categoría" else LOCATION, name)
+        try:
+            weight = float(self.priority_weight_var.get())
+            deadline = self.priority_deadline_var.get().strip()
+            deadline = float(deadline) if deadline else None
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "El peso y el plazo deben ser números")
+            return
+        if weight < 0 or (deadline is not None and deadline < 0):
+            messagebox.showerror("Error", "El peso y el plazo no pueden ser negativos")
+            return
         
-        # Mostrar todos los keywords en la lista
-        for kw in all_keywords:
-            self.keywords_listbox.insert(tk.END, kw)
+        self.priority_weights[key] = weight
+        if deadline is None:
+            self.priority_deadlines.pop(key, None)
+        else:
+            self.priority_deadlines[key] = deadline
+        
+        pipeline = self.pipeline
+        if self.running and pipeline is not None:
+            pipeline.queue.set_weight(*key, weight)
+            pipeline.queue.set_deadline(*key, None if deadline is None else deadline * 60)
+            self.log(f"Prioridad de {name} cambiada durante la ejecución: peso {weight:g}"
+                     + (f", plazo {deadline:g} min" if deadline is not None else ""))
+    
+    def update_keywords_list(self):
+        """Vuelve a llenar la lista de keywords con todas las categorías marcadas"""
+        self.keywords_view.set_blocks([
+            (idx, read_keywords(self.keyword_files[idx])) for idx in self.category_list.checked_indices()
+        ])
+    
+    def on_category_toggled(self, index, checked):
+        """Añade o quita solo las keywords de la categoría que cambia"""
+        if checked:
+            self.keywords_view.add(index, read_keywords(self.keyword_files[index]))
+        else:
+            self.keywords_view.remove(index)
     
     def select_all_categories(self):
-        for var in self.category_vars:
-            var.set(True)
+        self.category_list.set_all(True)
         self.update_keywords_list()
     
     def deselect_all_categories(self):
-        for var in self.category_vars:
-            var.set(False)
+        self.category_list.set_all(False)
         self.update_keywords_list()
     
+    def schedule_category_search(self):
+        """Espera a que se deje de escribir antes de filtrar"""
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(250, self.apply_category_search)
+    
+    def apply_category_search(self):
+        """Filtra categorías y keywords usando el índice del catálogo"""
+        self._search_after_id = None
+        text = normalize_keyword(self.category_search_var.get())
+        if not text:
+            self.category_list.set_filter(None)
+            self.keywords_view.set_filter(None)
+            return
+        
+        matches = default_catalog().search_keywords(text)
+        matched_keywords = {keyword for keyword, _ in matches}
+        matched_categories = {category for _, categories in matches for category in categories}
+        self.category_list.set_filter(
+            i for i, name in enumerate(self.category_names)
+            if name in matched_categories or text in normalize_keyword(name)
+        )
+        # Si el texto es el nombre de una categoría, se muestran todas sus keywords
+        self.keywords_view.set_filter(
+            None if not matched_keywords else lambda keyword: normalize_keyword(keyword) in matched_keywords
+        )
+    
+    def reload_locations(self):
+        """Vuelve a llenar la lista de localizaciones desde el catálogo, conservando las marcadas"""
+        checked = set()
+        if self.location_names:
+            checked = {self.location_files[i] for i in self.location_list.checked_indices()}
+        self.location_files = get_location_files()
+        self.location_names = [location_name_from_file(file) for file in self.location_files]
+        self.location_list.set_items([f"{i+1}. {name}" for i, name in enumerate(self.location_names)])
+        self.location_list.set_checked_many(i for i, file in enumerate(self.location_files) if file in checked)
+        self.apply_location_search()
+    
+    def apply_location_search(self):
+        text = normalize_keyword(self.location_search_var.get())
+        if not text:
+            self.location_list.set_filter(None)
+            return
+        self.location_list.set_filter(i for i, name in enumerate(self.location_names)
+                                      if text in normalize_keyword(name))
+    
+    def _mark_zone(self, found, description):
+        """Marca las localizaciones del índice espacial y muestra solo esas"""
+        index = default_catalog().location_index()
+        positions = {file: i for i, file in enumerate(self.location_files)}
+        selected = [positions[index.keys[i]] for i in found if index.keys[i] in positions]
+        self.location_list.set_checked_many(selected)
+        self.location_list.set_filter(selected)
+        self.log(f"{len(selected)} localizaciones marcadas {description}")
+    
+    def select_locations_near(self):
+        try:
+            lat, lon = parse_numbers(self.zone_point_var.get(), 2, "lat,lon")
+            km = self.zone_km_var.get()
+            found = default_catalog().location_index().within_radius(lat, lon, km)
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Indica el punto como lat,lon y una distancia en km")
+            return
+        self._mark_zone(found, f"a menos de {km:g} km de ({lat}, {lon})")
+    
+    def select_locations_in_bbox(self):
+        try:
+            bbox = parse_numbers(self.zone_bbox_var.get(), 4, "min_lat,min_lon,max_lat,max_lon")
+            found = default_catalog().location_index().within_bbox(*bbox)
+        except ValueError:
+            messagebox.showerror("Error", "El rectángulo es min_lat,min_lon,max_lat,max_lon")
+            return
+        self._mark_zone(found, "dentro del rectángulo")
+    
+    def import_locations(self):
+        """Importa municipios de un CSV o un GeoJSON al catálogo"""
+        path = filedialog.askopenfilename(
+            title="Importar localizaciones",
+            filetypes=[("CSV o GeoJSON", "*.csv *.geojson *.json"), ("Todos los archivos", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            added, skipped, invalid = default_catalog().import_locations(path, self.import_zoom_var.get())
+        except (ValueError, tk.TclError) as e:
+            messagebox.showerror("Error", f"Error al importar localizaciones: {str(e)}")
+            return
+        self.reload_locations()
+        self.update_priority_combo()
+        messagebox.showinfo(
+            "Importación completada",
+            f"{added} localizaciones añadidas\n{skipped} ya existían\n{invalid} filas sin nombre o coordenadas válidas"
+        )
+    
     def show_location_info(self):
         # Limpiar información actual
         self.location_info_text.config(state=tk.NORMAL)
         self.location_info_text.delete(1.0, tk.END)
         
         # Obtener las localizaciones seleccionadas
-        selected_indices = [i for i, var in enumerate(self.location_vars) if var.get()]
+        selected_indices = self.location_list.checked_indices()
         
         if not selected_indices:
             self.location_info_text.insert(tk.END, "No hay localizaciones seleccionadas.")
             self.location_info_text.config(state=tk.DISABLED)
             return
         
-        # Mostrar información de cada localización
-        for idx in selected_indices:
+        # Mostrar información de cada localización (como mucho las primeras 200)
+        for idx in selected_indices[:200]:
             file = self.location_files[idx]
             location_name = self.location_names[idx]
             location_data = read_location(file)
@@ -423,6 +704,8 @@ class GoogleMapsScraper(tk.Tk):
             info += "-" * 30 + "\n"
             
             self.location_info_text.insert(tk.END, info)
+        if len(selected_indices) > 200:
+            self.location_info_text.insert(tk.END, f"... y {len(selected_indices) - 200} más\n")
         
         self.location_info_text.config(state=tk.DISABLED)
     
@@ -439,11 +722,11 @@ class GoogleMapsScraper(tk.Tk):
         wait_time = self.wait_time_var.get()
         
         # Obtener categorías seleccionadas
-        selected_categories = [i for i, var in enumerate(self.category_vars) if var.get()]
+        selected_categories = self.category_list.checked_indices()
         category_names = [self.category_names[i] for i in selected_categories]
         
         # Obtener localizaciones seleccionadas
-        selected_locations = [i for i, var in enumerate(self.location_vars) if var.get()]
+        selected_locations = self.location_list.checked_indices()
         location_names = [self.location_names[i] for i in selected_locations]
         
         # Mostrar resumen
@@ -453,7 +736,24 @@ class GoogleMapsScraper(tk.Tk):
         summary += f"Radio: {radius} metros\n"
         summary += f"Profundidad: {depth}\n"
         summary += f"Tiempo máximo: {max_time} minutos\n"
-        summary += f"Tiempo de espera: {wait_time} minutos\n\n"
+        if self.auto_tune_var.get():
+            summary += "Profundidad y tiempo máximo: ajustados por categoría y localización según el historial\n"
+        if self.two_phase_var.get():
+            summary += "Dos fases: descubrimiento en modo rápido y después emails de los lugares nuevos con web\n"
+        summary += f"Tiempo de espera: {wait_time} minutos\n"
+        summary += f"Envíos simultáneos: {self.max_in_flight_var.get()}\n"
+        if self.max_active_var.get() > 0:
+            summary += (f"Regulador: como mucho {self.max_active_var.get()} trabajos activos "
+                        f"y {self.submit_rate_var.get():g} envíos/s\n")
+        summary += f"Reanudar: {'Sí' if self.resume_var.get() else 'No'}\n"
+        if self.proxies_file_var.get().strip():
+            summary += (f"Proxies: {self.proxies_file_var.get().strip()} "
+                        f"({self.proxies_per_job_var.get()} por trabajo)\n")
+        for (kind, name), weight in self.priority_weights.items():
+            deadline = self.priority_deadlines.get((kind, name))
+            summary += (f"Prioridad de {name}: peso {weight:g}"
+                        + (f", plazo {deadline:g} min" if deadline is not None else "") + "\n")
+        summary += "\n"
         
         summary += f"Categorías seleccionadas ({len(category_names)}):\n"
         for name in category_names:
@@ -463,144 +763,256 @@ class GoogleMapsScraper(tk.Tk):
         for name in location_names:
             summary += f"- {name}\n"
         
+        # Con cobertura por celdas, cada celda es una localización
+        if self.coverage_var.get() and selected_locations:
+            coverage_lines = []
+            cells = coverage_locations([self.location_files[i] for i in selected_locations], radius,
+                                       log=coverage_lines.append)
+            summary += "\n" + "\n".join(coverage_lines) + "\n"
+            location_names = [name for name, _ in cells]
+        
         # Calcular total de trabajos
-        total_jobs = len(category_names) * len(location_names)
+        category_keywords = read_category_keywords([self.keyword_files[i] for i in selected_categories])
+        if self.dedupe_keywords_var.get():
+            assigned, removed = assign_keywords(category_keywords)
+            report = query_report(category_keywords, assigned, removed, len(location_names))
+            summary += f"\n{format_report(report)}\n"
+            for category, keyword, owner in removed:
+                summary += f"- '{keyword}' ({category}) se buscará solo en {owner}\n"
+            category_keywords = assigned
+        
+        total_jobs = sum(1 for _, keywords in category_keywords if keywords) * len(location_names)
+        if self.incremental_var.get():
+            # Solo cuentan los pares con alguna keyword caducada
+            freshness = FreshnessStore()
+            try:
+                ttl_seconds = self.ttl_var.get() * 3600
+                due = [len(freshness.due_keywords(category, location, keywords, ttl_seconds))
+                       for category, keywords in category_keywords if keywords
+                       for location in location_names]
+            finally:
+                freshness.close()
+            summary += (f"\nModo incremental: {sum(due)} búsquedas por actualizar "
+                        f"(TTL {self.ttl_var.get():g} h)\n")
+            total_jobs = sum(1 for count in due if count)
         summary += f"\nTotal de trabajos a ejecutar: {total_jobs}\n"
+        batch_size = self.batch_size_var.get().strip()
+        if batch_size and batch_size.lower() != "off":
+            summary += f"Keywords por trabajo: {batch_size} (el número de trabajos cambiará al dividir y agrupar)\n"
         
         self.summary_text.insert(tk.END, summary)
     
     def log(self, message):
-        self.log_text.insert(tk.END, f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
-        self.log_text.see(tk.END)
+        """Añade una línea al log; se puede llamar desde cualquier hilo"""
+        self.log_buffer.write(f"{datetime.now().strftime('%H:%M:%S')} - {message}")
+    
+    def show_jobs_status(self, jobs_info):
+        """Muestra los trabajos enviados en la tabla de estado"""
+        self.jobs_tree.delete(*self.jobs_tree.get_children())
+        for info in jobs_info:
+            self.jobs_tree.insert("", tk.END, iid=info['name'], values=self._job_row(info))
+    
+    @staticmethod
+    def _job_row(info):
+        return (info['category'], info['location'], info.get('host') or "", info['id'], info.get('status', ""))
+    
+    def update_job_row(self, name, values):
+        self.jobs_tree.item(name, values=values)
+    
+    def on_job_status_change(self, info, old_status, new_status):
+        """Refleja en la tabla y en el log el cambio de estado de un trabajo.
+        
+        Se llama desde el hilo de seguimiento; si un trabajo cambia varias veces
+        en el mismo ciclo de la interfaz, solo se aplica el último estado.
+        """
+        # Se copia la fila ahora: un trabajo reenviado a otro host cambia de ID y de host
+        self.bridge.call_latest(("status", info['name']), self.update_job_row, info['name'], self._job_row(info))
+        self.log(f"Trabajo {info['name']}: {old_status or '-'} -> {new_status}")
     
     def run_job(self):
         # Validar entradas
-        selected_categories = [i for i, var in enumerate(self.category_vars) if var.get()]
+        selected_categories = self.category_list.checked_indices()
         if not selected_categories:
             messagebox.showerror("Error", "Debes seleccionar al menos una categoría")
             return
         
-        selected_locations = [i for i, var in enumerate(self.location_vars) if var.get()]
+        selected_locations = self.location_list.checked_indices()
         if not selected_locations:
             messagebox.showerror("Error", "Debes seleccionar al menos una localización")
             return
         
+        try:
+            batch_size = parse_batch_size(self.batch_size_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
         # Confirmar ejecución
         if not messagebox.askyesno("Confirmar", "¿Deseas iniciar la ejecución de los trabajos?"):
             return
         
+        # Leer la configuración aquí: el hilo de trabajo no debe tocar variables de Tk
+        settings = {
+            'host': self.host_var.get(),
+            'job_prefix': self.job_name_var.get(),
+            'radius': self.radius_var.get(),
+            'depth': self.depth_var.get(),
+            'max_time': self.max_time_var.get(),
+            'wait_time': self.wait_time_var.get(),
+            'max_in_flight': self.max_in_flight_var.get(),
+            'max_active': self.max_active_var.get(),
+            'placement': PLACEMENT_OPTIONS[self.placement_var.get()],
+            'weights': dict(self.priority_weights),
+            'deadlines': dict(self.priority_deadlines),
+            'submit_rate': self.submit_rate_var.get(),
+            'keyword_files': [self.keyword_files[i] for i in selected_categories],
+            'location_files': [self.location_files[i] for i in selected_locations],
+            'coverage': self.coverage_var.get(),
+            'dedupe_keywords': self.dedupe_keywords_var.get(),
+            'incremental': self.incremental_var.get(),
+            'ttl': self.ttl_var.get(),
+            'batch_size': batch_size,
+            'save_metrics': self.save_metrics_var.get(),
+            'profile': PROFILE_OPTIONS[self.profile_var.get()],
+            'resume': self.resume_var.get(),
+            'reuse_window': self.reuse_window_var.get(),
+            'results_store': self.results_store_var.get(),
+            'proxies_file': self.proxies_file_var.get().strip(),
+            'proxies_per_job': self.proxies_per_job_var.get(),
+            'auto_tune': self.auto_tune_var.get(),
+            'two_phase': self.two_phase_var.get(),
+            'download_dir': self.download_dir_var.get().strip() or None,
+            'dedup_mode': DEDUP_OPTIONS[self.dedup_mode_var.get()]
+        }
+        
         # Iniciar ejecución en un hilo aparte
         self.running = True
         self.run_button.config(state=tk.DISABLED)
         self.cancel_button.config(state=tk.NORMAL)
         self.progress.start()
         
-        thread = threading.Thread(target=self.execute_jobs)
+        thread = threading.Thread(target=self.execute_jobs, args=(settings,))
         thread.daemon = True
         thread.start()
     
-    def execute_jobs(self):
+    def execute_jobs(self, settings):
+        """Planifica, envía y sigue los trabajos. Se ejecuta en un hilo aparte, así que
+        todo lo que toca la interfaz pasa por self.bridge"""
+        ledger = None
+        freshness = None
+        host = settings['host']
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        metrics = default_metrics()
+        metrics.reset(run_id)
+        profiler = RunProfiler(settings['profile']).start() if settings['profile'] else None
         try:
-            # Obtener configuración
-            host = self.host_var.get()
-            api_url = f"{host}/api/v1/jobs"
-            job_prefix = self.job_name_var.get()
-            radius = self.radius_var.get()
-            depth = self.depth_var.get()
-            max_time = self.max_time_var.get()
-            wait_time = self.wait_time_var.get()
-            
-            # Obtener categorías seleccionadas
-            selected_categories = [i for i, var in enumerate(self.category_vars) if var.get()]
-            selected_locations = [i for i, var in enumerate(self.location_vars) if var.get()]
-            
-            # Contador de trabajos
-            job_counter = 0
-            completed_jobs = 0
-            jobs_info = []
-            
-            # Procesar cada categoría
-            for cat_idx in selected_categories:
-                cat_file = self.keyword_files[cat_idx]
-                category_name = self.category_names[cat_idx]
-                keywords_list = read_keywords(cat_file)
-                
-                self.log(f"Procesando categoría: {category_name} ({len(keywords_list)} keywords)")
-                
-                # Procesar cada localización
-                for loc_idx in selected_locations:
-                    if not self.running:
-                        self.log("Ejecución cancelada por el usuario")
-                        return
-                    
-                    loc_file = self.location_files[loc_idx]
-                    location_name = self.location_names[loc_idx]
-                    location_data = read_location(loc_file)
-                    
-                    job_counter += 1
-                    job_name = f"{job_prefix}_{category_name}_{location_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                    
-                    self.log(f"Procesando trabajo: {job_name}")
-                    
-                    # Crear payload
-                    payload = {
-                        "name": job_name,
-                        "keywords": keywords_list,
-                        "lang": "es",
-                        "zoom": location_data['zoom'],
-                        "lat": location_data['lat'],
-                        "lon": location_data['lon'],
-                        "fast_mode": False, #True = No emails
-                        "radius": radius,
-                        "depth": depth,
-                        "email": True,
-                        "max_time": max_time,
-                        "proxies": []
-                    }
-                    
-                    # Enviar trabajo
-                    self.log(f"Enviando trabajo a la API...")
-                    job_id, status_code, response = submit_job(api_url, payload)
-                    
-                    if job_id:
-                        self.log(f"Trabajo creado con ID: {job_id}")
-                        self.job_id = job_id
-                        
-                        # Esperar a que se complete (o al menos un tiempo razonable)
-                        self.log(f"Esperando a que el trabajo se procese...")
-                        start_time = time.time()
-                        
-                        try:
-                            # Solo esperamos unos segundos para verificar que el trabajo ha empezado a procesarse
-                            time.sleep(5)
-                            status = check_job_status(job_id, api_url)
-                            self.log(f"Estado: {status.get('status', 'Procesando')}")
-                        except Exception as e:
-                            self.log(f"Error al verificar estado, continuando con el siguiente trabajo: {str(e)}")
-                    else:
-                        self.log(f"No se pudo obtener ID del trabajo, pero el proceso continuará.")
-                    
-                    # Registrar información del trabajo
-                    jobs_info.append({
-                        "id": job_id if job_id else "unknown",
-                        "name": job_name,
-                        "category": category_name,
-                        "location": location_name
-                    })
-                    
-                    completed_jobs += 1
-                    
-                    # Pequeña pausa entre trabajos
-                    time.sleep(2)
+            if settings['two_phase'] and not settings['download_dir']:
+                raise ValueError("El modo en dos fases necesita una carpeta de descargas")
+            # Construir la lista de trabajos (categoría x localización)
+            if settings['coverage']:
+                locations = coverage_locations(settings['location_files'], settings['radius'], log=self.log)
+            else:
+                locations = read_locations(settings['location_files'])
+            jobs = plan_jobs_for_locations(
+                settings['keyword_files'], locations, settings['job_prefix'],
+                settings['radius'], settings['depth'], settings['max_time'], log=self.log,
+                dedupe_keywords=settings['dedupe_keywords']
+            )
+            
+            # Sin pyarrow, el error se anota en el log antes de enviar nada
+            results_store = (ResultsStore() if settings['results_store'] and settings['download_dir']
+                             else None)
+            
+            proxy_pool = (ProxyPool(load_proxies(settings['proxies_file']), settings['proxies_per_job'], log=self.log)
+                          if settings['proxies_file'] else None)
+            
+            freshness = FreshnessStore()
+            if settings['incremental']:
+                jobs = filter_due_jobs(jobs, freshness, settings['ttl'], log=self.log)
+            
+            ledger = JobLedger()
+            jobs = batch_plan(jobs, settings['batch_size'], settings['max_time'], ledger, log=self.log,
+                              fast_mode=settings['two_phase'])
+            if settings['auto_tune']:
+                jobs = tune_plan(jobs, ledger, settings['resume'], run_id, log=self.log,
+                                 fast_mode=settings['two_phase'])
+            if settings['two_phase']:
+                jobs = discovery_jobs(jobs)
+            dedup_mode = settings['dedup_mode']
+            
+            def make_pipeline(phase_run_id, **overrides):
+                options = dict(should_continue=lambda: self.running,
+                               ledger=ledger, resume=settings['resume'],
+                               download_dir=settings['download_dir'],
+                               dedup_index_path=None if dedup_mode == "off" else DEFAULT_INDEX_PATH,
+                               dedup_mode=dedup_mode,
+                               max_active=settings['max_active'],
+                               submit_rate=settings['submit_rate'],
+                               placement=settings['placement'],
+                               weights=settings['weights'],
+                               deadlines=settings['deadlines'],
+                               freshness=freshness, run_id=phase_run_id,
+                               reuse_window=settings['reuse_window'],
+                               results_store=results_store, proxy_pool=proxy_pool)
+                options.update(overrides)
+                pipeline = JobPipeline(host, settings['max_in_flight'], settings['wait_time'], log=self.log,
+                                       **options)
+                self.pipeline = pipeline
+                return pipeline
+            
+            # En dos fases, el consolidado se guarda en el almacén cuando ya tiene los emails
+            pipeline = make_pipeline(run_id, results_store=None) if settings['two_phase'] else make_pipeline(run_id)
+            
+            # Enviar los trabajos en paralelo
+            jobs_info = pipeline.submit(jobs)
+            completed_jobs = len(jobs_info)
+            
+            if not self.running:
+                pipeline.close()
+                self.log(f"Ejecución cancelada por el usuario ({completed_jobs} trabajos enviados)")
+                return
             
             self.log(f"Todos los trabajos ({completed_jobs}) han sido enviados al servidor.")
-            self.log(f"Para descargar los resultados, por favor visita: {host}")
+            self.bridge.call(self.show_jobs_status, jobs_info)
+            
+            # Seguir el estado de los trabajos hasta que terminen o venza el tiempo de espera
+            tracker = pipeline.track(jobs_info, on_status_change=self.on_job_status_change)
+            
+            if not self.running:
+                self.log("Seguimiento de trabajos cancelado por el usuario")
+                return
+            
+            status_summary = format_status_counts(tracker.summary())
+            
+            if settings['two_phase']:
+                merged_path = pipeline.downloader.merged_path
+                enrichment_tracker = run_enrichment(
+                    # Sin índice de duplicados ni frescura: los resultados son de lugares ya contados
+                    lambda phase_run_id: make_pipeline(phase_run_id, dedup_index_path=None, freshness=None,
+                                                       results_store=None),
+                    merged_path, DEFAULT_INDEX_PATH, run_id, settings['job_prefix'], settings['max_time'],
+                    log=self.log, should_continue=lambda: self.running
+                )
+                if not self.running:
+                    self.log("Búsqueda de emails cancelada por el usuario")
+                    return
+                if results_store is not None and os.path.exists(merged_path):
+                    rows = results_store.ingest_csv(merged_path, run_id)
+                    self.log(f"{rows} filas añadidas al almacén de resultados ({results_store.root})")
+                if enrichment_tracker is not None:
+                    status_summary += f"; emails: {format_status_counts(enrichment_tracker.summary())}"
             
             # Mensaje final con instrucciones
-            mensaje = f"Se han enviado {completed_jobs} trabajos al servidor.\n\n"
-            mensaje += f"Para ver y descargar los resultados CSV, por favor visita:\n{host}"
+            mensaje = f"Se han enviado {completed_jobs} trabajos al servidor.\n"
+            mensaje += f"Estado: {status_summary}\n\n"
+            if pipeline.downloader is not None and pipeline.downloader.downloaded:
+                mensaje += f"Resultados consolidados en:\n{pipeline.downloader.merged_path}\n\n"
+                mensaje += f"También puedes ver los resultados CSV en:\n{host}"
+            else:
+                self.log(f"Para descargar los resultados, por favor visita: {host}")
+                mensaje += f"Para ver y descargar los resultados CSV, por favor visita:\n{host}"
             
-            messagebox.showinfo("Proceso Completado", mensaje)
+            self.bridge.call(messagebox.showinfo, "Proceso Completado", mensaje)
         
         except Exception as e:
             self.log(f"Error en la ejecución: {str(e)}")
@@ -608,16 +1020,33 @@ class GoogleMapsScraper(tk.Tk):
             
             # Mensaje final con instrucciones de todos modos
             mensaje = "El proceso ha terminado.\n\n"
-            mensaje += f"Para ver y descargar los resultados CSV, por favor visita:\n{self.host_var.get()}"
-            messagebox.showinfo("Proceso Completado", mensaje)
+            mensaje += f"Para ver y descargar los resultados CSV, por favor visita:\n{host}"
+            self.bridge.call(messagebox.showinfo, "Proceso Completado", mensaje)
         
         finally:
+            if ledger is not None:
+                ledger.close()
+            if freshness is not None:
+                freshness.close()
+            
+            output_dir = settings['download_dir'] or DEFAULT_RESULTS_DIR
+            if profiler is not None:
+                profiler.stop(output_dir, run_id, log=self.log)
+            if settings['save_metrics']:
+                path = metrics.write_json(os.path.join(output_dir, f"{run_id}_metrics.json"))
+                self.log(f"Métricas guardadas en {path}")
+            
             # Restaurar estado de la interfaz
             self.running = False
-            self.job_id = None
-            self.progress.stop()
-            self.run_button.config(state=tk.NORMAL)
-            self.cancel_button.config(state=tk.DISABLED)
+            self.bridge.call(self.finish_run)
+    
+    def finish_run(self):
+        """Restaura los controles al terminar la ejecución (en el hilo de Tk)"""
+        self.job_id = None
+        self.pipeline = None
+        self.progress.stop()
+        self.run_button.config(state=tk.NORMAL)
+        self.cancel_button.config(state=tk.DISABLED)
     
     def cancel_job(self):
         if messagebox.askyesno("Cancelar", "¿Estás seguro de que deseas cancelar la ejecución?"):
@@ -646,59 +1075,27 @@ class GoogleMapsScraper(tk.Tk):
             return
         
         try:
-            # Encontrar el próximo número para el prefijo
-            next_num = len(self.keyword_files) + 1
+            # El prefijo sigue al mayor que existe, aunque se hayan borrado archivos
+            next_num = default_catalog().next_category_prefix()
             
             # Crear archivo de keywords
             filename = f"{next_num}_keywords_{category_name}.txt"
-            filepath = os.path.join('keywords', filename)
+            filepath = os.path.join(KEYWORDS_DIR, filename)
             
             # Crear directorio si no existe
-            os.makedirs('keywords', exist_ok=True)
+            os.makedirs(KEYWORDS_DIR, exist_ok=True)
             
             # Crear archivo vacío
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write("")
             
             # Actualizar lista de archivos
+            default_catalog().refresh()
             self.keyword_files = get_keyword_files()
             
             # Actualizar categorías
             self.category_names.append(category_name)
-            var = tk.BooleanVar()
-            self.category_vars.append(var)
-            
-            # Buscar el notebook y la pestaña actual
-            for widget in self.winfo_children():
-                if isinstance(widget, ttk.Notebook):
-                    categories_tab = widget.winfo_children()[1]  # índice 1 es la pestaña de categorías
-                    # Buscar el frame principal
-                    for child in categories_tab.winfo_children():
-                        if isinstance(child, ttk.Frame):  # Frame principal
-                            # Buscar el frame izquierdo
-                            for left_frame in child.winfo_children():
-                                if left_frame.winfo_children():  # El primer hijo del frame principal debería ser el izquierdo
-                                    # Buscar el frame de categorías
-                                    for cat_frame in left_frame.winfo_children():
-                                        if isinstance(cat_frame, ttk.LabelFrame) and "Categorías Disponibles" in cat_frame['text']:
-                                            # Buscar el canvas
-                                            for canvas_obj in cat_frame.winfo_children():
-                                                if isinstance(canvas_obj, tk.Canvas):
-                                                    # Obtener el frame scrollable
-                                                    scrollable_frame = canvas_obj.children["!frame"]
-                                                    # Añadir nuevo checkbutton
-                                                    i = len(self.category_names) - 1
-                                                    ttk.Checkbutton(
-                                                        scrollable_frame, 
-                                                        text=f"{i+1}. {category_name}", 
-                                                        variable=var,
-                                                        command=self.update_keywords_list
-                                                    ).grid(row=i, column=0, sticky=tk.W, padx=5, pady=2)
-                                                    break
-                                            break
-                                    break
-                            break
-                    break
+            self.category_list.append(f"{len(self.category_names)}. {category_name}")
             
             # Actualizar combobox
             self.update_category_combo()
@@ -731,7 +1128,7 @@ class GoogleMapsScraper(tk.Tk):
         try:
             # Obtener archivo de la categoría
             category_file = self.keyword_files[category_idx]
-            filepath = os.path.join('keywords', category_file)
+            filepath = os.path.join(KEYWORDS_DIR, category_file)
             
             # Leer keywords existentes
             existing_keywords = []
@@ -753,6 +1150,7 @@ class GoogleMapsScraper(tk.Tk):
             # Guardar keywords actualizados
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write('\n'.join(existing_keywords))
+            default_catalog().refresh()
             
             # Mostrar resultado
             if new_keywords:
@@ -763,8 +1161,8 @@ class GoogleMapsScraper(tk.Tk):
                 self.new_keywords_text.delete(1.0, tk.END)
                 
                 # Actualizar la lista de keywords si la categoría está seleccionada
-                if self.category_vars[category_idx].get():
-                    self.update_keywords_list()
+                if self.category_list.is_checked(category_idx):
+                    self.keywords_view.add(category_idx, read_keywords(category_file))
             else:
                 messagebox.showinfo(
                     "Sin Cambios", 
@@ -794,57 +1192,33 @@ class GoogleMapsScraper(tk.Tk):
             messagebox.showerror("Error", "La latitud y longitud son obligatorias")
             return
         
+        if not ZOOM_LIMITS[0] <= zoom <= ZOOM_LIMITS[1]:
+            messagebox.showerror("Error", f"El zoom debe estar entre {ZOOM_LIMITS[0]} y {ZOOM_LIMITS[1]}")
+            return
+        
         try:
             # Validar formato de lat/lon
             float(lat)
             float(lon)
             
-            # Encontrar el próximo número para el prefijo
-            next_num = len(self.location_files) + 1
+            # El prefijo sigue al mayor que existe (archivos e importadas), aunque se hayan borrado archivos
+            next_num = default_catalog().next_location_prefix()
             
             # Crear archivo de localización
             filename = f"{next_num}_location_{location_name}.txt"
-            filepath = os.path.join('location', filename)
+            filepath = os.path.join(LOCATIONS_DIR, filename)
             
             # Crear directorio si no existe
-            os.makedirs('location', exist_ok=True)
+            os.makedirs(LOCATIONS_DIR, exist_ok=True)
             
             # Crear archivo con los datos
             with open(filepath, 'w', encoding='utf-8') as f:
                 f.write(f"{zoom}\n{lat}\n{lon}")
             
-            # Actualizar lista de archivos
-            self.location_files = get_location_files()
-            
-            # Actualizar lista de localizaciones en memoria
-            self.location_names.append(location_name)
-            var = tk.BooleanVar()
-            self.location_vars.append(var)
-            
-            # Buscar el notebook y la pestaña de localizaciones
-            for widget in self.winfo_children():
-                if isinstance(widget, ttk.Notebook):
-                    locations_tab = widget.winfo_children()[2]  # índice 2 es la pestaña de localizaciones
-                    # Buscar el frame principal
-                    for child in locations_tab.winfo_children():
-                        if isinstance(child, ttk.Frame):  # Frame principal
-                            # Buscar el frame izquierdo
-                            for left_frame in child.winfo_children():
-                                if left_frame.winfo_children():  # El primer hijo del frame principal debería ser el izquierdo
-                                    # Buscar el frame de localizaciones
-                                    for loc_frame in left_frame.winfo_children():
-                                        if isinstance(loc_frame, ttk.LabelFrame) and "Localizaciones Disponibles" in loc_frame['text']:
-                                            # Añadir nuevo checkbutton
-                                            i = len(self.location_names) - 1
-                                            ttk.Checkbutton(
-                                                loc_frame, 
-                                                text=f"{i+1}. {location_name}", 
-                                                variable=var
-                                            ).grid(row=i, column=0, sticky=tk.W, padx=5, pady=5)
-                                            break
-                                    break
-                            break
-                    break
+            # Actualizar lista de localizaciones
+            default_catalog().refresh()
+            self.reload_locations()
+            self.update_priority_combo()
             
             # Actualizar interfaz
             messagebox.showinfo("Éxito", f"Localización '{location_name}' creada correctamente")
@@ -864,6 +1238,9 @@ class GoogleMapsScraper(tk.Tk):
         import webbrowser
         webbrowser.open("https://www.latlong.net/")
 
-if __name__ == "__main__":
+def main():
     app = GoogleMapsScraper()
-    app.mainloop() 
\ No newline at end of file
+    app.mainloop()
+
+if __name__ == "__main__":
+    main() 
\ No newline at end of file
@@ -0,0 +1,169 @@
+import threading
+import time
+
+from metrics import default_metrics
+
+# Estados que devuelve la API para un trabajo
+FINAL_STATUSES = {"ok", "failed"}
+
+
+def normalize_status(status):
+    """Normaliza el estado devuelto por la API ('Working' -> 'working')"""
+    return str(status or "").strip().lower()
+
+
+class JobStatusTracker:
+    """Sigue el estado de todos los trabajos enviados hasta que terminan.
+
+    En cada ciclo pide el listado completo de trabajos (una sola petición) y,
+    si el servidor no lo ofrece, consulta uno a uno solo los que siguen
+    pendientes. El intervalo entre ciclos crece mientras no haya cambios y
+    vuelve al mínimo en cuanto algún trabajo cambia de estado.
+
+    Con intake_open=True se pueden seguir añadiendo trabajos con add() mientras
+    se envían; el plazo empieza a contar cuando se llama a close_intake().
+    on_tick(resumen) se llama tras cada ciclo con los trabajos por estado.
+    Con varios hosts, client_for(info) devuelve el cliente del host de cada trabajo.
+    """
+
+    def __init__(self, client, jobs_info, deadline_seconds, on_change=None,
+                 should_continue=None, min_interval=2.0, max_interval=60.0, backoff_factor=1.5,
+                 intake_open=False, on_tick=None, client_for=None):
+        self.client = client
+        self.client_for = client_for or (lambda info: self.client)
+        self.jobs_info = [info for info in jobs_info if info.get('id') not in (None, "unknown")]
+        self.deadline_seconds = deadline_seconds
+        self.on_change = on_change
+        self.on_tick = on_tick
+        self.should_continue = should_continue or (lambda: True)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+
+        self.polls = 0
+        self._no_listing = set()
+        self._lock = threading.Lock()
+        self._intake_open = intake_open
+        self._deadline = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def pending_jobs(self):
+        with self._lock:
+            return [info for info in self.jobs_info if info.get('status') not in FINAL_STATUSES]
+
+    def add(self, info):
+        """Añade un trabajo recién enviado al seguimiento"""
+        if info.get('id') in (None, "unknown"):
+            return
+        with self._lock:
+            self.jobs_info.append(info)
+
+    def close_intake(self):
+        """No se añadirán más trabajos: empieza a contar el plazo"""
+        with self._lock:
+            self._intake_open = False
+            self._deadline = time.monotonic() + self.deadline_seconds
+        self._wake_event.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def run(self):
+        """Bucle de seguimiento. Termina al acabar todos, al vencer el plazo o al cancelar"""
+        with self._lock:
+            if not self._intake_open:
+                self._deadline = time.monotonic() + self.deadline_seconds
+        interval = self.min_interval
+
+        while not self._stop_event.is_set() and self.should_continue():
+            with self._lock:
+                intake_open, deadline = self._intake_open, self._deadline
+            pending = self.pending_jobs()
+            if not intake_open and (not pending or time.monotonic() >= deadline):
+                break
+
+            self._wake_event.clear()
+            changed = False
+            if pending:
+                with default_metrics().timer("status_poll_seconds"):
+                    statuses = self._fetch_statuses(pending)
+                changed = self._apply(statuses, pending)
+                self.polls += 1
+                if self.on_tick:
+                    self.on_tick(self.summary())
+
+            # Mientras se siguen enviando trabajos se consulta al ritmo mínimo
+            if changed or intake_open:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff_factor, self.max_interval)
+
+            # No esperar más allá del plazo; close_intake() y stop() despiertan antes
+            timeout = interval if deadline is None else max(0.0, min(interval, deadline - time.monotonic()))
+            self._wake_event.wait(timeout)
+
+    def _fetch_statuses(self, pending):
+        """Devuelve {id: estado} para los trabajos pendientes, con una consulta por host"""
+        groups = {}
+        for info in pending:
+            client = self.client_for(info)
+            groups.setdefault(client.host, (client, []))[1].append(info)
+
+        statuses = {}
+        for client, infos in groups.values():
+            statuses.update(self._fetch_from(client, infos))
+        return statuses
+
+    def _fetch_from(self, client, pending):
+        if client.host not in self._no_listing:
+            jobs = client.list_jobs()
+            if jobs is not None:
+                return {job.get('id'): normalize_status(job.get('status')) for job in jobs}
+            # El servidor no ofrece listado: pasar a consultas individuales
+            self._no_listing.add(client.host)
+
+        statuses = {}
+        for info in pending:
+            if self._stop_event.is_set() or not self.should_continue():
+                break
+            result = client.check_job_status(info['id'])
+            status = normalize_status(result.get('status'))
+            # Un error de consulta no es un estado del trabajo
+            if status != "error":
+                statuses[info['id']] = status
+        return statuses
+
+    def _apply(self, statuses, pending):
+        changed = False
+        for info in pending:
+            new_status = statuses.get(info['id'])
+            if not new_status or new_status == info.get('status'):
+                continue
+            old_status = info.get('status')
+            info['status'] = new_status
+            changed = True
+            if self.on_change:
+                self.on_change(info, old_status, new_status)
+        return changed
+
+    def summary(self):
+        """Cuenta los trabajos por estado"""
+        counts = {}
+        with self._lock:
+            jobs_info = list(self.jobs_info)
+        for info in jobs_info:
+            status = info.get('status') or "pending"
+            counts[status] = counts.get(status, 0) + 1
+        return counts
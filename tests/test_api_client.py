@@ -0,0 +1,95 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from api_client import ScraperAPIClient
+
+
+class FakeResponse:
+    def __init__(self, status_code, chunks=(), headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"Error {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def client_with(outcomes, monkeypatch):
+    monkeypatch.setattr("api_client.time.sleep", lambda seconds: None)
+    client = ScraperAPIClient("http://scraper", max_retries=3)
+    client.session = FakeSession(outcomes)
+    return client
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, "/api/v1/jobs", reason))
+
+
+@pytest.mark.parametrize("outcome", [requests.ReadTimeout("read"), requests.ConnectionError("reset"),
+                                     FakeResponse(500), FakeResponse(504)])
+def test_post_is_not_retried_once_it_may_have_arrived(outcome, monkeypatch):
+    client = client_with([outcome, FakeResponse(201)], monkeypatch)
+    if isinstance(outcome, Exception):
+        with pytest.raises(type(outcome)):
+            client.request('POST', client.jobs_url)
+    else:
+        assert client.request('POST', client.jobs_url).status_code == outcome.status_code
+    assert client.session.calls == 1
+
+
+@pytest.mark.parametrize("outcome", [requests.ConnectTimeout("connect"), refused(), FakeResponse(429),
+                                     FakeResponse(503)])
+def test_post_is_retried_when_it_was_not_processed(outcome, monkeypatch):
+    client = client_with([outcome, FakeResponse(201)], monkeypatch)
+    assert client.request('POST', client.jobs_url).status_code == 201
+    assert client.session.calls == 2
+
+
+def test_get_retries_read_timeouts(monkeypatch):
+    client = client_with([requests.ReadTimeout("read"), FakeResponse(502), FakeResponse(200)], monkeypatch)
+    assert client.request('GET', client.jobs_url).status_code == 200
+    assert client.session.calls == 3
+
+
+def test_negative_retry_after_does_not_wait(monkeypatch):
+    client = client_with([], monkeypatch)
+    assert client._backoff_delay(0, "-5") == 0
+
+
+def test_failed_download_leaves_no_part_file(tmp_path, monkeypatch):
+    dest = tmp_path / "job.csv"
+    client = client_with([FakeResponse(200, [b"title\n", requests.ConnectionError("reset")])], monkeypatch)
+    with pytest.raises(requests.ConnectionError):
+        client.download_results("job-1", str(dest))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,58 @@
+from api_client import MAYBE_SENT, NOT_SENT
+from backend_pool import BackendPool
+
+
+class FakeClient:
+    def __init__(self, host, outcomes=(), alive=True):
+        self.host = host
+        self.outcomes = list(outcomes)
+        self.alive = alive
+        self.submitted = 0
+
+    def submit_job(self, payload):
+        self.submitted += 1
+        if self.outcomes:
+            return self.outcomes.pop(0)
+        return f"{self.host}-{self.submitted}", 201, {}
+
+    def ping(self):
+        return self.alive
+
+
+def pool_with(outcomes_a=(), outcomes_b=()):
+    pool = BackendPool("http://a,http://b", log=lambda message: None)
+    pool.backends[0].client = FakeClient("a", outcomes_a)
+    pool.backends[1].client = FakeClient("b", outcomes_b)
+    return pool
+
+
+def test_host_failing_submissions_is_reported_with_its_jobs():
+    pool = pool_with(outcomes_a=[(None, 503, "busy"), (None, NOT_SENT, "refused")])
+    pool.add_active([{"host": "http://a"}, {"host": "http://a"}])
+    a, b = pool.backends
+    # b más cargado, para que cada envío se intente primero en a
+    b.active = 3
+
+    assert pool.submit({})[3] == "http://b"
+    assert pool.submit({})[3] == "http://b"
+    assert not a.healthy
+    # a sigue respondiendo al ping, pero sus trabajos deben repartirse
+    assert pool.check_health() == [a]
+    assert pool.check_health() == []
+    assert a.healthy
+
+
+def test_submission_that_may_have_arrived_is_not_resent():
+    for status in (MAYBE_SENT, 500, 502, 504):
+        pool = pool_with(outcomes_a=[(None, status, "error")])
+        job_id, status_code, _, host = pool.submit({})
+        assert (job_id, status_code, host) == (None, status, "http://a")
+        assert pool.backends[1].client.submitted == 0
+
+
+def test_throttled_host_is_not_counted_as_failed():
+    pool = pool_with(outcomes_a=[(None, 429, "slow down"), (None, 429, "slow down")])
+    assert pool.submit({})[3] == "http://b"
+    pool.backends[1].active = 5
+    assert pool.submit({})[3] == "http://b"
+    assert pool.backends[0].healthy and pool.backends[0].failures == 0
@@ -0,0 +1,50 @@
+import csv
+
+from dedup_index import DedupIndex, place_key
+from enrichment import apply_enrichment
+from keyword_batcher import keyword_input_id
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_emails_are_matched_through_input_id(tmp_path):
+    merged = tmp_path / "merged.csv"
+    sol = {"title": "Clínica Sol", "address": "Calle Mayor 1", "data_id": "0x1", "emails": ""}
+    mar = {"title": "Bar Mar", "address": "Paseo 2", "data_id": "0x2", "emails": ""}
+    write_csv(merged, [sol, mar])
+    places = [{"key": place_key(row), "query": f"{row['title']}, {row['address']}", "title": row['title']}
+              for row in (sol, mar)]
+    results = tmp_path / "emails.csv"
+    write_csv(results, [
+        {"input_id": keyword_input_id("Clínica Sol, Calle Mayor 1"), "title": "Clínica Sol", "data_id": "0x1",
+         "emails": "info@sol.example"},
+        {"input_id": keyword_input_id("Bar Mar, Paseo 2"), "title": "Bar Mar", "data_id": "0x2", "emails": ""},
+    ])
+    index = DedupIndex(str(tmp_path / "index.sqlite3"), run_id="run")
+    messages = []
+    try:
+        assert apply_enrichment(str(merged), places, str(results), index, log=messages.append) == 1
+        assert set(index.enrichment([place['key'] for place in places])) == {places[0]['key'], places[1]['key']}
+    finally:
+        index.close()
+    assert "0 sin respuesta" in messages[0]
+
+
+def test_results_without_input_id_are_reported(tmp_path):
+    merged = tmp_path / "merged.csv"
+    write_csv(merged, [{"title": "Clínica Sol", "address": "Calle Mayor 1", "emails": ""}])
+    results = tmp_path / "emails.csv"
+    write_csv(results, [{"title": "Clínica Sol", "emails": "info@sol.example"}])
+    places = [{"key": b"k", "query": "Clínica Sol, Calle Mayor 1", "title": "Clínica Sol"}]
+    index = DedupIndex(str(tmp_path / "index.sqlite3"), run_id="run")
+    messages = []
+    try:
+        apply_enrichment(str(merged), places, str(results), index, log=messages.append)
+    finally:
+        index.close()
+    assert messages[0].startswith("Aviso:")
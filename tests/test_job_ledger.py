@@ -0,0 +1,55 @@
+from enrichment import discovery_jobs, enrichment_jobs
+from job_ledger import JobLedger
+
+
+def search_job(category, payload=None):
+    payload = dict({"name": category, "keywords": [f"{category} gandia"], "lat": "38.9", "lon": "-0.18",
+                    "zoom": 14, "depth": 10, "max_time": 600, "fast_mode": False}, **(payload or {}))
+    return {"name": category, "category": category, "location": "gandia", "payload": payload}
+
+
+def finish(ledger, job, backend_id, rows, new_places, seconds):
+    ledger.record_submitted(job, backend_id, "pending")
+    ledger.update_status(backend_id, "ok")
+    with ledger._conn:
+        ledger._conn.execute("UPDATE jobs SET started_at = finished_at - ? WHERE backend_id = ?",
+                             (seconds, backend_id))
+    ledger.record_results(backend_id, rows, new_places)
+
+
+def test_history_keeps_job_kinds_apart(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite3"))
+    full = search_job("dentista")
+    fast = discovery_jobs([search_job("taller")])[0]
+    place = {"location": "gandia", "lat": 38.9, "lon": -0.18, "query": "Clínica Sol, Calle Mayor 1"}
+    emails = enrichment_jobs([place], "run", 10)[0]
+    try:
+        ledger.record_planned([full, fast, emails], "run")
+        finish(ledger, full, "a", 40, 30, 120)
+        finish(ledger, fast, "b", 50, 50, 20)
+        finish(ledger, emails, "c", 1, 0, 300)
+
+        assert [row['category'] for row in ledger.yield_history()] == ["dentista"]
+        assert [row['category'] for row in ledger.yield_history(fast_mode=True)] == ["taller"]
+        assert ledger.yield_history()[0]['new_places'] == 30
+        assert ledger.seconds_per_keyword() == 120
+        assert ledger.seconds_per_keyword(fast_mode=True) == 20
+        assert ledger.seconds_per_keyword(kind="emails") == 300
+    finally:
+        ledger.close()
+
+
+def test_resume_loads_the_latest_tuning_with_the_same_fast_mode(tmp_path):
+    ledger = JobLedger(str(tmp_path / "ledger.sqlite3"))
+    try:
+        assert ledger.load_tuning() == {}
+        ledger.save_tuning({("dentista", "gandia"): {"depth": 5, "seconds_per_keyword": 10}}, "run1")
+        ledger.save_tuning({("taller", "oliva"): {"depth": 20, "seconds_per_keyword": 30}}, "run2")
+        ledger.save_tuning({("dentista", "gandia"): {"depth": 2, "seconds_per_keyword": 3}}, "run3",
+                           fast_mode=True)
+
+        assert ledger.load_tuning() == {("taller", "oliva"): {"depth": 20, "seconds_per_keyword": 30}}
+        assert ledger.load_tuning(fast_mode=True) == {("dentista", "gandia"): {"depth": 2,
+                                                                               "seconds_per_keyword": 3}}
+    finally:
+        ledger.close()
@@ -0,0 +1,24 @@
+from keyword_batcher import batch_jobs, keyword_input_id, keyword_lookup, tag_keywords
+
+
+def job(category, keywords):
+    return {"name": f"run_{category}_gandia", "category": category, "location": "gandia",
+            "payload": {"name": f"run_{category}_gandia", "keywords": keywords, "depth": 10}}
+
+
+def test_tagged_keywords_map_back_through_input_id():
+    tagged = tag_keywords(["Dentista Gandia"])
+    assert tagged == [f"Dentista Gandia #!# {keyword_input_id('dentista  gandia')}"]
+    input_id = tagged[0].split("#!#")[1].strip()
+    assert keyword_lookup(["Dentista Gandia"])[input_id] == "Dentista Gandia"
+
+
+def test_jobs_sharing_a_keyword_are_not_packed_together():
+    jobs = [job("dentista", ["clinica gandia", "dentista gandia"]),
+            job("ortodoncista", ["Clinica Gandia"]),
+            job("taller", ["taller gandia"])]
+    batched = batch_jobs(jobs, 4, log=lambda message: None)
+
+    assert [j['category'] for j in batched] == ["dentista", "ortodoncista+taller"]
+    assert batched[1]['payload']['keywords'] == ["Clinica Gandia", "taller gandia"]
+    assert batched[1]['keyword_categories'] == {"Clinica Gandia": "ortodoncista", "taller gandia": "taller"}
@@ -0,0 +1,31 @@
+import pytest
+
+from catalog import parse_location_lines
+from location_index import LocationIndex, plan_import
+
+
+def place(name, lat, lon, region=""):
+    return {"name": name, "region": region, "zoom": None, "lat": lat, "lon": lon}
+
+
+def test_plan_import_skips_only_the_same_place():
+    index = LocationIndex()
+    index.add("1_valencia_de_la_sierra", "valencia_de_la_sierra", 13, 39.47, -0.376)
+    index.add("2_alcudia_2", "alcudia_2", 13, 39.19, -0.51)
+    index.add("3_benifaio_valencia", "benifaio_valencia", 13, 39.28, -0.42)
+    places = [
+        place("Valencia", 39.471, -0.377),
+        place("Alcudia", 39.191, -0.511),
+        place("Benifaió", 39.281, -0.421, region="Valencia"),
+    ]
+    rows, skipped = plan_import(places, index, 4)
+    assert skipped == 2
+    assert [(row[0], row[1]) for row in rows] == [(4, "valencia")]
+
+
+def test_zoom_out_of_range_is_rejected():
+    with pytest.raises(ValueError):
+        parse_location_lines(["22", "39.47", "-0.376"])
+    assert parse_location_lines(["21", "39.47", "-0.376"])['zoom'] == 21
+    with pytest.raises(ValueError):
+        plan_import([], LocationIndex(), 1, zoom=0)
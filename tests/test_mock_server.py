@@ -0,0 +1,18 @@
+import csv
+import io
+
+from mock_server import CSV_COLUMNS, MockScraper
+
+
+def test_results_follow_the_scraper_csv_contract():
+    scraper = MockScraper(rows_per_keyword=2, seed=1)
+    job = scraper.create({"name": "job", "keywords": ["dentista gandia #!# k1", "taller gandia"],
+                          "lat": "38.9", "lon": "-0.18"})
+    reader = csv.DictReader(io.StringIO(scraper.results_csv(job).decode('utf-8')))
+    rows = list(reader)
+
+    assert reader.fieldnames == CSV_COLUMNS
+    assert reader.fieldnames[0] == "input_id" and reader.fieldnames[-1] == "emails"
+    assert [row['input_id'] for row in rows[:2]] == ["k1", "k1"]
+    assert rows[2]['input_id'] == rows[3]['input_id'] != "k1"
+    assert rows[0]['category'] == "dentista gandia"
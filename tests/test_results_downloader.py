@@ -0,0 +1,99 @@
+import csv
+
+from dedup_index import DedupIndex
+from keyword_batcher import keyword_input_id
+from results_downloader import CSVMerger
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def job_info(**fields):
+    return dict({"id": "job-1", "name": "job", "category": "dentista", "location": "gandia"}, **fields)
+
+
+def test_source_category_survives_merge(tmp_path):
+    source = tmp_path / "job.csv"
+    write_csv(source, [
+        {"title": "Clínica Sol", "category": "Dentista", "query": "dentista gandia", "latitude": "38.9",
+         "longitude": "-0.18"},
+        {"title": "Ortodoncia Mar", "category": "Ortodoncista", "query": "ortodoncia gandia", "latitude": "38.91",
+         "longitude": "-0.19"},
+    ])
+    merger = CSVMerger(str(tmp_path / "merged.csv"))
+    assert merger.append(str(source), job_info()) == (2, 2, None)
+    merger.close()
+
+    rows = read_csv(tmp_path / "merged.csv")
+    assert [row['category'] for row in rows] == ["Dentista", "Ortodoncista"]
+    assert {row['job_category'] for row in rows} == {"dentista"}
+    assert {row['job_location'] for row in rows} == {"gandia"}
+    assert {row['job_id'] for row in rows} == {"job-1"}
+
+
+def test_keyword_categories_tag_job_columns_only(tmp_path):
+    source = tmp_path / "job.csv"
+    write_csv(source, [
+        {"title": "Clínica Sol", "category": "Dentista", "query": "Dentista Gandia"},
+        {"title": "Talleres Pérez", "category": "Taller mecánico", "query": "taller gandia"},
+    ])
+    info = job_info(category="dentista+taller",
+                    keyword_categories={"dentista gandia": "dentista", "taller gandia": "taller"})
+    merger = CSVMerger(str(tmp_path / "merged.csv"))
+    merger.append(str(source), info)
+    merger.close()
+
+    rows = read_csv(tmp_path / "merged.csv")
+    assert [(row['job_keyword'], row['job_category'], row['category']) for row in rows] == [
+        ("dentista gandia", "dentista", "Dentista"),
+        ("taller gandia", "taller", "Taller mecánico"),
+    ]
+
+
+def test_dedup_keeps_source_category(tmp_path):
+    source = tmp_path / "job.csv"
+    write_csv(source, [
+        {"title": "Clínica Sol", "category": "Dentista", "place_id": "a"},
+        {"title": "Clínica Sol", "category": "Dentista", "place_id": "a"},
+    ])
+    index = DedupIndex(str(tmp_path / "index.sqlite3"), run_id="run")
+    try:
+        merger = CSVMerger(str(tmp_path / "merged.csv"), dedup_index=index)
+        assert merger.append(str(source), job_info()) == (2, 2, 1)
+        merger.close()
+    finally:
+        index.close()
+
+    rows = read_csv(tmp_path / "merged.csv")
+    assert [(row['category'], row['place_status']) for row in rows] == [("Dentista", "new"),
+                                                                       ("Dentista", "duplicate")]
+
+
+def test_input_id_attributes_rows_of_a_packed_job(tmp_path):
+    source = tmp_path / "job.csv"
+    write_csv(source, [
+        {"input_id": keyword_input_id("dentista gandia"), "title": "Clínica Sol", "category": "Dentista"},
+        {"input_id": keyword_input_id("taller gandia"), "title": "Talleres Pérez", "category": "Taller"},
+        {"input_id": "otro", "title": "Bar Pepe", "category": "Bar"},
+    ])
+    info = job_info(category="dentista+taller",
+                    keyword_categories={"Dentista Gandia": "dentista", "taller gandia": "taller"})
+    merger = CSVMerger(str(tmp_path / "merged.csv"))
+    merger.append(str(source), info)
+    merger.close()
+
+    rows = read_csv(tmp_path / "merged.csv")
+    assert [(row['job_keyword'], row['job_category']) for row in rows] == [
+        ("Dentista Gandia", "dentista"),
+        ("taller gandia", "taller"),
+        ("", "dentista+taller"),
+    ]
@@ -0,0 +1,37 @@
+import csv
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from results_store import ResultsStore  # noqa: E402
+
+
+def write_results(path, count, category="dentista"):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["job_category", "job_location", "job_id", "title", "category"])
+        for i in range(count):
+            writer.writerow([category, "gandia", "job-1", f"Lugar {i}", "Dentista"])
+
+
+def test_ingest_same_run_id_twice_keeps_both(tmp_path):
+    first, second = tmp_path / "a.csv", tmp_path / "b.csv"
+    write_results(first, 30)
+    write_results(second, 20)
+    store = ResultsStore(str(tmp_path / "store"))
+
+    assert store.ingest_csv(str(first), "20240101_120000") == 30
+    assert store.ingest_csv(str(second), "20240101_120000") == 20
+    assert store.count() == 50
+    assert store.count([("job_category", "=", "dentista"), ("category", "=", "Dentista")]) == 50
+
+
+def test_unknown_column_is_rejected(tmp_path):
+    source = tmp_path / "a.csv"
+    write_results(source, 3)
+    store = ResultsStore(str(tmp_path / "store"))
+    store.ingest_csv(str(source), "run")
+
+    with pytest.raises(ValueError, match="Columnas desconocidas"):
+        store.count([("missing", "=", "x")])
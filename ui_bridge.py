@@ -0,0 +1,106 @@
+"""Canal entre los hilos de trabajo y el bucle principal de Tk.
+
+Tkinter no admite que otros hilos toquen los widgets. Los hilos encolan
+llamadas y el bucle principal las ejecuta por lotes en un temporizador
+after(); las actualizaciones con la misma clave (por ejemplo, el estado de un
+trabajo) se agrupan y solo se aplica la última. El log se acumula en un
+búfer y se escribe de una vez en cada ciclo, conservando solo las últimas
+líneas en el widget.
+"""
+import queue
+import threading
+from collections import deque
+
+import tkinter as tk
+
+
+class UIBridge:
+    """Ejecuta en el hilo de Tk las llamadas que encolan otros hilos"""
+
+    def __init__(self, root, interval_ms=100, max_batch=500):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._latest = {}
+        self._lock = threading.Lock()
+        self._flushers = []
+        self._after_id = None
+
+    def call(self, func, *args):
+        """Programa func(*args) en el hilo de Tk (se puede llamar desde cualquier hilo)"""
+        self._queue.put((func, args))
+
+    def call_latest(self, key, func, *args):
+        """Como call, pero si ya hay una llamada pendiente con la misma clave se sustituye"""
+        with self._lock:
+            self._latest[key] = (func, args)
+
+    def add_flusher(self, func):
+        """Función que se ejecuta al final de cada ciclo (p. ej. volcar el log)"""
+        self._flushers.append(func)
+
+    def start(self):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _drain(self):
+        try:
+            # Como mucho max_batch llamadas por ciclo para no bloquear la interfaz
+            for _ in range(self.max_batch):
+                try:
+                    func, args = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._run(func, args)
+
+            with self._lock:
+                latest, self._latest = self._latest, {}
+            for func, args in latest.values():
+                self._run(func, args)
+
+            for flush in self._flushers:
+                self._run(flush, ())
+        finally:
+            self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def _run(self, func, args):
+        try:
+            func(*args)
+        except tk.TclError:
+            # El widget ya no existe (por ejemplo, al cerrar la ventana)
+            pass
+
+
+class LogBuffer:
+    """Log con un máximo de líneas: se escribe desde cualquier hilo y se vuelca en el hilo de Tk"""
+
+    def __init__(self, text_widget, max_lines=5000):
+        self.text_widget = text_widget
+        self.max_lines = max_lines
+        self._pending = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+
+    def write(self, line):
+        with self._lock:
+            self._pending.append(line)
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            lines = list(self._pending)
+            self._pending.clear()
+
+        widget = self.text_widget
+        widget.insert(tk.END, "\n".join(lines) + "\n")
+        # Quitar las líneas más antiguas si se supera el máximo
+        line_count = int(widget.index("end-1c").split(".")[0]) - 1
+        if line_count > self.max_lines:
+            widget.delete("1.0", f"{line_count - self.max_lines + 1}.0")
+        widget.see(tk.END)